@@ -0,0 +1,84 @@
+"""Crawler throughput benchmark against the local fake explorer.
+
+Starts :class:`loadtest.fake_explorer.FakeExplorer` on a synthetic (or
+recorded) book, runs ``python -m opening_book.crawler`` against it in a
+scratch directory with a fresh explorer cache, and reports positions/sec,
+wall time, and the requests wasted on repeated queries and 429 retries:
+
+    python benchmarks/bench_crawler.py                                  # one full crawl
+    python benchmarks/bench_crawler.py --shards 4                       # four shard processes in parallel
+    python benchmarks/bench_crawler.py --latency 0.02 0.1 --rate-limit 0.02 --retry-after 0.5
+    python benchmarks/bench_crawler.py --book opening_book.json --no-cache
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from loadtest.fake_explorer import add_server_arguments, server_from_args
+
+
+def run_crawl(base_url: str, workdir: str, shards: int, use_cache: bool) -> float:
+    env = dict(os.environ,
+               LICHESS_EXPLORER_URL=base_url,
+               EXPLORER_CACHE_PATH=os.path.join(workdir, "explorer_cache.sqlite3") if use_cache else "",
+               PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    base = [sys.executable, "-m", "opening_book.crawler"]
+    if shards > 1:
+        commands = [base + ["--shard", f"{i}/{shards}"] for i in range(shards)]
+    else:
+        commands = [base + ["--output", "opening_book.json"]]
+
+    start = time.perf_counter()
+    procs = [subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE) for cmd in commands]
+    failed = []
+    for proc in procs:
+        _, stderr = proc.communicate()
+        if proc.returncode:
+            failed.append(stderr.decode(errors="replace")[-2000:])
+    wall = time.perf_counter() - start
+    if failed:
+        raise RuntimeError("crawler failed:\n" + failed[0])
+    return wall
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark crawler throughput against a fake explorer.")
+    add_server_arguments(parser)
+    parser.add_argument("--shards", type=int, default=1, help="crawl with this many shard processes")
+    parser.add_argument("--no-cache", action="store_true", help="disable the explorer response cache")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    fake = server_from_args(args)
+    fake.start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            wall = run_crawl(fake.url(), workdir, args.shards, not args.no_cache)
+    finally:
+        fake.stop()
+
+    report = fake.report()
+    report.update({
+        "shards": args.shards,
+        "wall_s": round(wall, 3),
+        "positions_per_s": round(report["unique_positions"] / wall, 1) if wall else None,
+        "wasted_requests": report["duplicate_requests"] + report["rate_limited"],
+        "wasted_share": round((report["duplicate_requests"] + report["rate_limited"])
+                              / report["requests"], 4) if report["requests"] else 0.0,
+    })
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Per-move cost of the game loop's output: direct prints vs queued logging.
+
+Replays the output of one book move as the game thread produced it before
+``chess_trainer.game_log`` (banner, sequence, candidate list, variation and
+chosen move, all printed) and as it does now (one INFO record, plus the
+DEBUG dumps when enabled and sampled). Each mode is timed on the producing
+thread against a fast sink (``/dev/null``) and a slow one that blocks for
+``--stdout-delay`` ms per write, like a pipe nobody reads fast enough:
+
+    python benchmarks/bench_game_log.py
+    python benchmarks/bench_game_log.py --moves 2000 --stdout-delay 0.5
+
+"drain" is how long the background writer needed after the last move to
+catch up; the game thread never waits for it.
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer import game_log
+
+logger = logging.getLogger("chess_trainer.trainer")
+book_logger = logging.getLogger("opening_book.query_db")
+
+
+class SlowStream:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._devnull = open(os.devnull, "w")
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        return self._devnull.write(text)
+
+    def flush(self) -> None:
+        self._devnull.flush()
+
+
+def sample_move(rng: random.Random):
+    seq = [rng.choice(["e2e4", "e7e5", "g1f3", "b8c6", "f1b5", "a7a6"]) for _ in range(rng.randint(2, 16))]
+    candidates = {m: rng.randint(1, 50000) for m in ("a7a6", "g8f6", "f8c5", "d7d6", "f7f5")}
+    return seq, candidates, "Ruy Lopez: Morphy Defense", "a7a6"
+
+
+def print_move(seq, candidates, name, chosen) -> None:
+    print("*" * 20)
+    print("Using direct local DB lookup")
+    print(f"Current sequence: {seq}")
+    print(f"Candidate moves for position: {list(candidates)}")
+    print(f"Current variation: {name}")
+    print(f"Chosen move: {chosen}")
+    print(f"-> (book) {chosen}")
+
+
+@game_log.sampled_move()
+def log_move(seq, candidates, name, chosen) -> None:
+    if game_log.verbose(book_logger):
+        book_logger.debug("Candidate moves for position", extra={"fields": {"candidates": candidates}})
+    if game_log.verbose(book_logger):
+        book_logger.debug("Local book move", extra={"fields": {"sequence": seq, "variation": name, "move": chosen}})
+    logger.info(f"-> (book) {chosen}")
+
+
+def run(mode: str, moves: int, delay: float, sample_rate: float, log_dir: str):
+    rng = random.Random(0)
+    samples = [sample_move(rng) for _ in range(moves)]
+    stream = SlowStream(delay)
+    timings = []
+    if mode == "print":
+        sys.stdout, real_stdout = stream, sys.stdout
+        try:
+            for move in samples:
+                start = time.perf_counter()
+                print_move(*move)
+                timings.append(time.perf_counter() - start)
+        finally:
+            sys.stdout = real_stdout
+        return timings, 0.0
+
+    game_log.configure(level=mode, log_dir=log_dir, sample_rate=sample_rate, stream=stream)
+    try:
+        with game_log.game_context("bench"):
+            for move in samples:
+                start = time.perf_counter()
+                log_move(*move)
+                timings.append(time.perf_counter() - start)
+    finally:
+        start = time.perf_counter()
+        game_log.shutdown()
+        drain = time.perf_counter() - start
+    return timings, drain
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--moves", type=int, default=1000)
+    parser.add_argument("--stdout-delay", type=float, default=0.2,
+                        help="milliseconds each write blocks in the slow-stdout case (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    modes = [("print", "print", 1.0), ("INFO (queued)", "INFO", 1.0),
+             ("DEBUG, 10% sampled", "DEBUG", 0.1), ("DEBUG, every move", "DEBUG", 1.0)]
+    print(f"{'mode':22}{'stdout':>8}{'median/move':>14}{'p99/move':>12}{'drain':>10}")
+    with tempfile.TemporaryDirectory() as log_dir:
+        for label, mode, rate in modes:
+            for sink, delay in (("fast", 0.0), ("slow", args.stdout_delay / 1e3)):
+                timings, drain = run(mode, args.moves, delay, rate, log_dir)
+                timings.sort()
+                p99 = timings[int(len(timings) * 0.99) - 1]
+                print(f"{label:22}{sink:>8}{statistics.median(timings) * 1e6:>12.1f}us"
+                      f"{p99 * 1e6:>10.1f}us{drain:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
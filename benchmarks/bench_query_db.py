@@ -0,0 +1,163 @@
+"""Benchmarks for the opening-book query layer on synthetic books.
+
+Times the hot query_db / lichess_openings_explorer functions across book
+sizes and compares the medians against a stored baseline, so changes to the
+query layer show their cost in review:
+
+    python benchmarks/bench_query_db.py                  # run and compare to the baseline
+    python benchmarks/bench_query_db.py --save           # refresh the stored baseline
+    python benchmarks/bench_query_db.py --sizes small    # quick run
+
+Exit status is 1 when any benchmark is slower than the baseline by more than
+``--tolerance`` (relative).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import chess
+
+from opening_book import query_db
+from opening_book import lichess_openings_explorer as oe
+from opening_book.book_manager import BookManager
+from opening_book.synthetic import make_synthetic_book
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baselines", "query_db.json")
+SIZES = {
+    # name: (depth, branching, name_density)
+    "small": (4, 3, 0.3),
+    "medium": (6, 3, 0.3),
+    "large": (6, 5, 0.3),
+}
+
+
+def timeit(func, repeat: int, number: int) -> float:
+    # Median seconds per call over ``repeat`` rounds of ``number`` calls
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - start) / number)
+    return statistics.median(rounds)
+
+
+def sample_paths(trie: dict, n: int, rng: random.Random):
+    paths = []
+    for _ in range(n):
+        node, path = trie, []
+        while node.get("children"):
+            uci = rng.choice(sorted(node["children"]))
+            path.append(uci)
+            node = node["children"][uci]
+        paths.append(path)
+    return paths
+
+
+def run_size(name: str, repeat: int):
+    depth, branching, density = SIZES[name]
+    trie = make_synthetic_book(depth, branching, density, seed=1)
+    rng = random.Random(2)
+    paths = sample_paths(trie, 50, rng)
+    targets = sorted({child["opening_name"] for child in trie["children"].values()})[:2]
+    seq = paths[0][:2]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "book.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trie, f)
+
+        boards = []
+        for p in paths[:10]:
+            board = chess.Board()
+            for uci in p[: depth // 2]:
+                board.push_uci(uci)
+            boards.append(board)
+
+        saved_book = oe._BOOK_MANAGER
+        oe._BOOK_MANAGER = BookManager.from_trie(trie)
+        index = oe.current_book().index
+        compiled = query_db.compile_targets(trie, targets, index)
+        try:
+            results = {
+                "load_trie": timeit(lambda: query_db.load_trie(path), repeat, 3),
+                "find_matching_nodes": timeit(lambda: query_db.find_matching_nodes(trie, targets), repeat, 3),
+                "find_matching_nodes_indexed": timeit(
+                    lambda: query_db.find_matching_nodes(trie, targets, index), repeat, 3),
+                "build_name_index": timeit(lambda: query_db.build_name_index(trie), repeat, 3),
+                "candidate_moves_for_position": timeit(
+                    lambda: query_db.candidate_moves_for_position(trie, targets, seq), repeat, 3),
+                "choose_book_move": timeit(lambda: query_db.choose_book_move(trie, targets, seq), repeat, 3),
+                "choose_book_move_compiled": timeit(
+                    lambda: query_db.choose_book_move(trie, targets, seq, compiled=compiled), repeat, 3),
+                "compile_targets": timeit(lambda: query_db.compile_targets(trie, targets, index), repeat, 3),
+                "get_opening_name_for_moves": timeit(
+                    lambda: [query_db.get_opening_name_for_moves(trie, p) for p in paths], repeat, 10) / len(paths),
+                "get_local_book_moves": timeit(
+                    lambda: [oe.get_local_book_moves(b, 5) for b in boards], repeat, 10) / len(boards),
+            }
+        finally:
+            oe._BOOK_MANAGER = saved_book
+    return {f"{name}/{bench}": seconds for bench, seconds in results.items()}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", choices=sorted(SIZES), default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown vs the baseline before failing (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    # keep the report readable if anything on the query path prints
+    sys.stdout, real_stdout = open(os.devnull, "w"), sys.stdout
+    try:
+        results = {}
+        for name in args.sizes:
+            results.update(run_size(name, args.repeat))
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regressions = []
+    print(f"{'benchmark':45}{'median':>12}{'baseline':>12}{'change':>9}")
+    for bench, seconds in results.items():
+        base = baseline.get(bench)
+        change = ""
+        if base:
+            ratio = seconds / base - 1
+            change = f"{ratio:+.0%}"
+            if ratio > args.tolerance:
+                regressions.append(bench)
+                change += " !"
+        base_text = f"{base * 1e3:.3f}ms" if base else "-"
+        print(f"{bench:45}{seconds * 1e3:>10.3f}ms{base_text:>12}{change:>9}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
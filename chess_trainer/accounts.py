@@ -0,0 +1,126 @@
+"""Lichess bot logins: one API client, move submitter and rate-limit state each.
+
+The trainer plays as a single :class:`BotAccount` built from
+``LICHESS_BOT_TOKEN``/``LICHESS_BOT_NAME``; the supervisor
+(:mod:`chess_trainer.supervisor`) runs several side by side. Lichess rate
+limits per token, so every account counts its own API responses
+(``chess_trainer_api_responses_total{account,status}``). After a 429 the
+account pauses for ``RATE_LIMIT_PAUSE`` seconds, as Lichess asks, before it
+reconnects its event stream or answers challenges. The other accounts are
+not slowed down by this.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import berserk
+except ImportError:
+    berserk = None
+
+from chess_trainer import metrics
+from chess_trainer.bot_profile import BotProfile
+from chess_trainer.move_submitter import MoveSubmitter
+
+STREAM_POOL_SIZE = 16  # keep-alive connections shared by the event stream, game streams and API calls
+RATE_LIMIT_PAUSE = 60  # seconds; Lichess asks for a full minute after a 429
+WINDOW = 60  # seconds of request history kept for requests_last_minute()
+
+API_RESPONSES = metrics.REGISTRY.counter(
+    "chess_trainer_api_responses_total", "Lichess API responses by account and HTTP status")
+RATE_LIMIT_PAUSES = metrics.REGISTRY.counter(
+    "chess_trainer_rate_limit_pauses_total", "Times an account paused after a 429 from Lichess")
+
+
+def make_session(pool_size: int = STREAM_POOL_SIZE) -> requests.Session:
+    # Retries connection errors and 5xx/429 answers with backoff
+    session = requests.Session()
+    retry_strategy = Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["HEAD", "GET", "OPTIONS", "POST"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class BotAccount:
+    def __init__(self, name: str, token: str, base_url: str, profile: Optional[BotProfile] = None):
+        self.name = name
+        self.token = token
+        self.base_url = base_url
+        self.profile = profile if profile is not None else BotProfile()
+        self._lock = threading.Lock()
+        self._recent: deque = deque()
+        self.requests = 0
+        self.rate_limited = 0
+        self.paused_until = 0.0
+
+        # TokenSession wraps a plain session; swap in one with retries
+        token_sess = berserk.TokenSession(token)
+        token_sess.session = make_session()
+        token_sess.session.hooks["response"].append(self._on_response)
+        self.session = token_sess
+        self.client = berserk.Client(session=token_sess, base_url=base_url)
+        self.submitter = MoveSubmitter(base_url, token, account=name)
+        self.submitter.session.hooks["response"].append(self._on_response)
+
+    def _on_response(self, response, *args, **kwargs):
+        API_RESPONSES.inc(account=self.name, status=str(response.status_code))
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            self._recent.append(now)
+            while self._recent and self._recent[0] < now - WINDOW:
+                self._recent.popleft()
+            if response.status_code == 429:
+                self.rate_limited += 1
+                # another 429 while paused extends the pause
+                pause = self.paused_until <= now
+                self.paused_until = now + RATE_LIMIT_PAUSE
+        if response.status_code == 429 and pause:
+            RATE_LIMIT_PAUSES.inc(account=self.name)
+            print(f"[{self.name}] rate limited by Lichess; pausing for {RATE_LIMIT_PAUSE}s")
+        return response
+
+    def pause_remaining(self) -> float:
+        with self._lock:
+            return max(0.0, self.paused_until - time.monotonic())
+
+    def wait_if_limited(self, stop: Optional[threading.Event] = None) -> None:
+        """Block while the account is paused after a 429 (or until ``stop`` is set)."""
+        remaining = self.pause_remaining()
+        if remaining > 0:
+            if stop is not None:
+                stop.wait(remaining)
+            else:
+                time.sleep(remaining)
+
+    def requests_last_minute(self) -> int:
+        with self._lock:
+            cutoff = time.monotonic() - WINDOW
+            while self._recent and self._recent[0] < cutoff:
+                self._recent.popleft()
+            return len(self._recent)
+
+    def usage(self) -> Dict:
+        return {
+            "account": self.name,
+            "requests": self.requests,
+            "requests_last_minute": self.requests_last_minute(),
+            "rate_limited": self.rate_limited,
+            "paused_s": round(self.pause_remaining(), 1),
+        }
+
+    def close(self) -> None:
+        self.submitter.close()
+        self.session.session.close()
@@ -89,16 +89,17 @@ class BotProfile:
                 print(" -> Please enter a valid integer.")
                 continue
 
-    def determine_color_and_opp_rating(self, start: dict) -> None:
+    def determine_color_and_opp_rating(self, start: dict, our_name: Optional[str] = None) -> None:
         white_player = start["white"]
         black_player = start["black"]
 
-        # Import ``OUR_NAME`` lazily to avoid a circular import when
-        # ``trainer.py`` imports ``BotProfile`` at module load time.
-        from chess_trainer.trainer import OUR_NAME
+        # Default to the trainer's ``OUR_NAME``, imported lazily to avoid a
+        # circular import when ``trainer.py`` imports ``BotProfile`` at module load time.
+        if our_name is None:
+            from chess_trainer.trainer import OUR_NAME as our_name
         import chess
 
-        if white_player["id"] == OUR_NAME:
+        if white_player["id"] == our_name:
             self.our_color = chess.WHITE
             self.opp_rating = black_player["rating"]
         else:
@@ -0,0 +1,108 @@
+"""A fixed set of UCI engine processes shared between threads.
+
+Each engine process handles one search at a time, so parallel work needs
+several of them. :class:`EnginePool` starts up to ``size`` engines on demand
+and lends them out with :meth:`EnginePool.engine`. A caller that finds every
+engine busy waits for one to come back. An engine that crashes is dropped,
+and a fresh one is started the next time an engine is needed.
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import chess.engine
+
+POLL = 0.1  # seconds between checks for a free slot while waiting
+
+
+class NoEngineFree(TimeoutError):
+    """Every engine stayed busy for the whole wait."""
+
+
+class EnginePool:
+    def __init__(self, engine_path, size: int = 2, options: Optional[Dict] = None):
+        self.engine_path = engine_path
+        self.size = size
+        self.options = options or {}
+        self._idle: "queue.Queue[chess.engine.SimpleEngine]" = queue.Queue()
+        self._engines: List[chess.engine.SimpleEngine] = []
+        self._starting = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _start(self) -> chess.engine.SimpleEngine:
+        engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
+        if self.options:
+            engine.configure(self.options)
+        return engine
+
+    def _acquire(self, timeout: Optional[float]) -> chess.engine.SimpleEngine:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("engine pool is closed")
+                grow = len(self._engines) + self._starting < self.size
+                if grow:
+                    self._starting += 1
+            if grow:
+                try:
+                    engine = self._start()
+                    with self._lock:
+                        self._engines.append(engine)
+                    return engine
+                finally:
+                    with self._lock:
+                        self._starting -= 1
+            wait = POLL if deadline is None else min(POLL, deadline - time.monotonic())
+            if wait <= 0:
+                raise NoEngineFree("no engine became free in time")
+            try:
+                return self._idle.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+    @contextmanager
+    def engine(self, timeout: Optional[float] = None) -> Iterator[chess.engine.SimpleEngine]:
+        """Borrow an engine for the duration of the ``with`` block."""
+        engine = self._acquire(timeout)
+        healthy = True
+        try:
+            yield engine
+        except (chess.engine.EngineTerminatedError, chess.engine.EngineError):
+            healthy = False
+            raise
+        finally:
+            if healthy and not self._closed:
+                self._idle.put(engine)
+            else:
+                self._discard(engine)
+
+    def _discard(self, engine: chess.engine.SimpleEngine) -> None:
+        with self._lock:
+            if engine in self._engines:
+                self._engines.remove(engine)
+        try:
+            engine.quit()
+        except Exception:
+            pass
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._engines)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            engines, self._engines = self._engines, []
+        for engine in engines:
+            try:
+                engine.quit()
+            except Exception:
+                pass
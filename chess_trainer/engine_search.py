@@ -0,0 +1,163 @@
+"""Engine moves that stop thinking once the answer is clear.
+
+``engine.play(board, Limit(time=...))`` always uses the whole budget, even
+for recaptures and other obvious moves. :func:`search` runs the same search
+through ``engine.analysis`` instead and watches the info lines as they
+stream in. It stops the engine early in two cases:
+
+- the best move has stayed the same for ``STABLE_DEPTHS`` iterations
+- the best line is ``DOMINANCE_CP`` centipawns ahead of the second best
+
+Either way it first waits for ``MIN_DEPTH`` and ``MIN_TIME``. The move
+played is the engine's own ``bestmove``, so ``UCI_LimitStrength`` still
+applies. Positions with a single legal move are answered without searching.
+
+The budget is capped by the clock (:func:`clock_budget`): a share of the
+remaining time plus most of the increment, and never more than
+``TIME_PER_MOVE``. Time saved against the budget is recorded in
+``chess_trainer_engine_time_saved_seconds`` and summed per game in
+:class:`SearchStats`.
+"""
+import time
+from datetime import timedelta
+from typing import Dict, Optional
+
+import chess
+import chess.engine
+
+from chess_trainer import metrics
+
+STABLE_DEPTHS = 4  # consecutive iterations with the same best move
+DOMINANCE_CP = 150  # best line this far ahead of the second best
+MIN_DEPTH = 8
+MIN_TIME = 0.1  # seconds
+MIN_BUDGET = 0.05  # seconds, even when the clock is nearly out
+MULTIPV = 2  # the second line is needed to judge dominance
+MOVES_TO_GO = 30  # share of the remaining clock spent on one move
+INCREMENT_SHARE = 0.75
+MATE_SCORE = 100_000
+
+TIME_SAVED = metrics.REGISTRY.histogram(
+    "chess_trainer_engine_time_saved_seconds", "Engine budget left unused by an early stop")
+STOPS = metrics.REGISTRY.counter(
+    "chess_trainer_engine_stops_total", "Engine searches by how they ended (stable, dominant, forced, full)")
+
+
+def _seconds(value) -> Optional[float]:
+    # berserk converts clock fields to timedelta; raw Bot API JSON has milliseconds
+    if value is None:
+        return None
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return value / 1000
+
+
+def clock_budget(state: Dict, color: bool, max_time: float) -> float:
+    """Seconds to think for ``color`` given a gameState's clock fields."""
+    prefix = "w" if color == chess.WHITE else "b"
+    remaining = _seconds(state.get(f"{prefix}time"))
+    if remaining is None:
+        return max_time  # correspondence / unlimited games
+    increment = _seconds(state.get(f"{prefix}inc")) or 0.0
+    budget = remaining / MOVES_TO_GO + INCREMENT_SHARE * increment
+    # never plan to use more than half of what's left, whatever the increment
+    return max(MIN_BUDGET, min(max_time, budget, remaining / 2))
+
+
+class EarlyStop:
+    """Decides from streamed analysis info whether the search can stop."""
+
+    def __init__(self, stable_depths: int = STABLE_DEPTHS, dominance_cp: int = DOMINANCE_CP,
+                 min_depth: int = MIN_DEPTH):
+        self.stable_depths = stable_depths
+        self.dominance_cp = dominance_cp
+        self.min_depth = min_depth
+        self.best: Optional[chess.Move] = None
+        self.depth = 0
+        self.stable = 0
+        self._lines: Dict[int, tuple] = {}  # multipv -> (depth, cp)
+
+    def update(self, info: Dict) -> Optional[str]:
+        """Feed one info dict; returns why to stop ("stable" or "dominant"), else None."""
+        pv = info.get("pv")
+        depth = info.get("depth")
+        if not pv or depth is None or info.get("lowerbound") or info.get("upperbound"):
+            return None  # currmove updates and aspiration-window fail highs/lows
+        rank = info.get("multipv", 1)
+        score = info.get("score")
+        if score is not None:
+            self._lines[rank] = (depth, score.relative.score(mate_score=MATE_SCORE))
+        if rank == 1 and depth > self.depth:
+            self.stable = self.stable + 1 if pv[0] == self.best else 1
+            self.best = pv[0]
+            self.depth = depth
+        if self.depth < self.min_depth:
+            return None
+        if self.stable >= self.stable_depths:
+            return "stable"
+        first, second = self._lines.get(1), self._lines.get(2)
+        if first and second and first[0] == second[0] == self.depth and first[1] - second[1] >= self.dominance_cp:
+            return "dominant"
+        return None
+
+
+class SearchResult:
+    __slots__ = ("move", "elapsed", "budget", "depth", "reason")
+
+    def __init__(self, move: chess.Move, elapsed: float, budget: float, depth: int, reason: str):
+        self.move = move
+        self.elapsed = elapsed
+        self.budget = budget
+        self.depth = depth
+        self.reason = reason
+
+    @property
+    def saved(self) -> float:
+        return max(0.0, self.budget - self.elapsed)
+
+
+def search(engine: chess.engine.SimpleEngine, board: chess.Board, budget: float,
+           stop: Optional[EarlyStop] = None, min_time: float = MIN_TIME, multipv: int = MULTIPV) -> SearchResult:
+    started = time.perf_counter()
+    legal = list(board.legal_moves)
+    if len(legal) == 1:
+        result = SearchResult(legal[0], time.perf_counter() - started, budget, 0, "forced")
+    else:
+        stop = stop or EarlyStop()
+        reason = "full"  # the engine finished on its own: time limit, depth cap or mate
+        with engine.analysis(board, chess.engine.Limit(time=budget), multipv=multipv) as analysis:
+            for info in analysis:
+                why = stop.update(info)
+                if why and time.perf_counter() - started >= min_time:
+                    reason = why
+                    analysis.stop()
+                    break
+            best = analysis.wait()
+        move = best.move if best is not None and best.move is not None else stop.best
+        result = SearchResult(move, time.perf_counter() - started, budget, stop.depth, reason)
+    STOPS.inc(reason=result.reason)
+    TIME_SAVED.observe(result.saved)
+    return result
+
+
+class SearchStats:
+    """Per-game totals of engine time used and saved."""
+
+    def __init__(self):
+        self.moves = 0
+        self.used = 0.0
+        self.saved = 0.0
+        self.reasons: Dict[str, int] = {}
+
+    def add(self, result: SearchResult) -> None:
+        self.moves += 1
+        self.used += result.elapsed
+        self.saved += result.saved
+        self.reasons[result.reason] = self.reasons.get(result.reason, 0) + 1
+
+    def summary(self) -> str:
+        if not self.moves:
+            return "no engine moves"
+        reasons = ", ".join(f"{reason} {n}" for reason, n in sorted(self.reasons.items()))
+        return (f"{self.moves} engine moves, {self.used / self.moves:.2f}s used and "
+                f"{self.saved / self.moves:.2f}s saved per move ({reasons})")
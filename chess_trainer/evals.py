@@ -0,0 +1,140 @@
+"""Batched engine evaluations of opening-tree positions for the web UI.
+
+:func:`evaluate_children` takes a position in the book and evaluates every
+book move from it at once. The positions are spread over an
+:class:`~chess_trainer.engine_pool.EnginePool`, and results are yielded as
+each search finishes, so the UI can fill in the tree while slower positions
+are still being searched. Evaluations are stored in :class:`EvalCache`
+(sqlite, keyed by EPD), so a position reached by transposition or
+evaluated earlier is never searched again at the same or a lower depth.
+Scores are from White's point of view.
+"""
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+import chess
+import chess.engine
+
+from chess_trainer.engine_pool import EnginePool
+
+EVAL_CACHE_PATH = os.getenv(
+    "EVAL_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "eval_cache.sqlite3"),
+)
+DEPTH = 16
+MAX_DEPTH = 24
+MATE_SCORE = 100_000  # cp reported for positions that are already checkmate
+
+
+class EvalCache:
+    # Deepest evaluation seen per position; sqlite handles locking between processes
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS evals ("
+                " epd TEXT PRIMARY KEY,"
+                " depth INTEGER NOT NULL,"
+                " cp INTEGER,"
+                " mate INTEGER,"
+                " best TEXT,"
+                " evaluated_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, epd: str, min_depth: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT depth, cp, mate, best FROM evals WHERE epd = ? AND depth >= ?", (epd, min_depth)
+            ).fetchone()
+        if row is None:
+            return None
+        depth, cp, mate, best = row
+        return {"depth": depth, "cp": cp, "mate": mate, "best": best}
+
+    def put(self, epd: str, result: Dict) -> None:
+        # never replace a deeper evaluation with a shallower one
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO evals (epd, depth, cp, mate, best, evaluated_at) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(epd) DO UPDATE SET depth = excluded.depth, cp = excluded.cp,"
+                " mate = excluded.mate, best = excluded.best, evaluated_at = excluded.evaluated_at"
+                " WHERE excluded.depth >= evals.depth",
+                (epd, result["depth"], result["cp"], result["mate"], result["best"], time.time()),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def evaluate(engine: chess.engine.SimpleEngine, board: chess.Board, depth: int) -> Dict:
+    if board.is_game_over():
+        outcome = board.outcome()
+        cp = 0 if outcome.winner is None else (MATE_SCORE if outcome.winner == chess.WHITE else -MATE_SCORE)
+        return {"depth": depth, "cp": cp, "mate": None, "best": None}
+    info = engine.analyse(board, chess.engine.Limit(depth=depth))
+    score = info.get("score")
+    white = score.white() if score is not None else None
+    pv = info.get("pv") or []
+    return {
+        "depth": info.get("depth", depth),
+        "cp": white.score() if white is not None and not white.is_mate() else None,
+        "mate": white.mate() if white is not None and white.is_mate() else None,
+        "best": pv[0].uci() if pv else None,
+    }
+
+
+def evaluate_children(path: List[str], children: List[str], pool: EnginePool, cache: Optional[EvalCache],
+                      depth: int = DEPTH) -> Iterator[Dict]:
+    """Yield ``{"uci", "depth", "cp", "mate", "best", "cached"}`` for each child of ``path``, as they finish.
+
+    Cached results come first; the rest are searched ``pool.size`` at a time.
+    """
+    board = chess.Board()
+    for uci in path:
+        board.push_uci(uci)
+    todo = []
+    for uci in children:
+        move = chess.Move.from_uci(uci)
+        if move not in board.legal_moves:
+            continue
+        child = board.copy(stack=False)
+        child.push(move)
+        cached = cache.get(child.epd(), depth) if cache is not None else None
+        if cached is not None:
+            yield {"uci": uci, **cached, "cached": True}
+        else:
+            todo.append((uci, child))
+    if not todo:
+        return
+
+    def run(child: chess.Board) -> Dict:
+        with pool.engine() as engine:
+            return evaluate(engine, child, depth)
+
+    with ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="eval") as executor:
+        futures = {executor.submit(run, child): (uci, child) for uci, child in todo}
+        try:
+            for future in as_completed(futures):
+                uci, child = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:  # one failed search shouldn't cost the whole batch
+                    yield {"uci": uci, "error": str(e)}
+                    continue
+                if cache is not None:
+                    cache.put(child.epd(), result)
+                yield {"uci": uci, **result, "cached": False}
+        finally:
+            # the client went away: don't start searches nobody will read
+            for future in futures:
+                future.cancel()
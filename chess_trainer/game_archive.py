@@ -0,0 +1,453 @@
+"""Local archive of the games the bot has played.
+
+Every finished game is stored in a sqlite file (``game_archive.sqlite3``,
+``CHESS_TRAINER_ARCHIVE``; empty turns the archive off) with its players,
+ratings, result and opening, and per ply the move, where our moves came
+from (book, exit or engine), how long we took and the clocks.
+
+The game loop only fills in a :class:`GameRecord` and hands it over with
+:func:`archive_game`. A writer thread collects finished games and stores up
+to ``BATCH_SIZE`` of them per transaction, at most ``FLUSH_INTERVAL``
+seconds after they arrive. A slow disk therefore never holds up a move.
+Games are indexed by opening, opponent and date:
+
+    python -m chess_trainer.game_archive list --opponent someuser --since 2026-01-01
+    python -m chess_trainer.game_archive stats --opening "Sicilian Defense"
+    python -m chess_trainer.game_archive export games.pgn --opening "Ruy Lopez"
+
+The PGN export carries each move's source and clock as comments, for
+analysis or for reweighting the book from the bot's own results.
+"""
+import argparse
+import datetime
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+import chess
+import chess.pgn
+
+# When executed directly, add project root so absolute imports work
+if __package__ is None or __package__ == "":
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from opening_book import query_db
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PATH = os.getenv("CHESS_TRAINER_ARCHIVE", "game_archive.sqlite3")
+BATCH_SIZE = 32  # games written per transaction at most
+FLUSH_INTERVAL = 1.0  # seconds a finished game may wait for the rest of its batch
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS games ("
+    " id INTEGER PRIMARY KEY,"
+    " game_id TEXT NOT NULL,"
+    " account TEXT NOT NULL DEFAULT '',"
+    " played_at REAL NOT NULL,"
+    " duration_s REAL,"
+    " white TEXT, black TEXT, white_rating INTEGER, black_rating INTEGER,"
+    " our_color TEXT,"
+    " opponent TEXT,"
+    " opponent_rating INTEGER,"
+    " bot_rating INTEGER,"
+    " speed TEXT,"
+    " status TEXT, winner TEXT, result TEXT NOT NULL,"
+    " opening TEXT,"
+    " UNIQUE (account, game_id))",
+    "CREATE INDEX IF NOT EXISTS games_opening ON games (opening, played_at)",
+    "CREATE INDEX IF NOT EXISTS games_opponent ON games (opponent, played_at)",
+    "CREATE INDEX IF NOT EXISTS games_played_at ON games (played_at)",
+    "CREATE TABLE IF NOT EXISTS moves ("
+    " game INTEGER NOT NULL REFERENCES games (id) ON DELETE CASCADE,"
+    " ply INTEGER NOT NULL,"
+    " uci TEXT NOT NULL,"
+    " source TEXT NOT NULL,"  # book, exit, engine or fallback for ours; opponent for theirs
+    " think_ms REAL,"
+    " wtime INTEGER, btime INTEGER,"  # clocks in ms after this ply, when the stream sent them
+    " PRIMARY KEY (game, ply)) WITHOUT ROWID",
+)
+
+
+class GameRecord:
+    """What the game loop knows about one game, filled in as it goes (game thread only)."""
+
+    def __init__(self, game_id: str, account: Optional[str] = None):
+        self.game_id = game_id
+        self.account = account
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.players: Dict[str, Dict] = {}
+        self.our_color: Optional[bool] = None
+        self.bot_rating: Optional[int] = None
+        self.speed: Optional[str] = None
+        self.moves: List[str] = []
+        self.ours: Dict[int, Tuple[str, str, float]] = {}  # ply -> (uci, source, think seconds)
+        self.clocks: Dict[int, Tuple[Optional[int], Optional[int]]] = {}  # ply count -> (wtime, btime)
+        self.status: Optional[str] = None
+        self.winner: Optional[str] = None
+        self.book = None  # the game's book snapshot, to name the opening on the writer thread
+
+    def start(self, full: Dict, our_color: bool, bot_rating: int, book=None) -> None:
+        self.players = {"white": full.get("white") or {}, "black": full.get("black") or {}}
+        self.our_color = our_color
+        self.bot_rating = bot_rating
+        self.speed = full.get("speed")
+        self.book = book
+
+    def sync(self, moves: List[str], state: Dict) -> None:
+        self.moves = moves
+        if "wtime" in state or "btime" in state:
+            self.clocks[len(moves)] = (_ms(state.get("wtime")), _ms(state.get("btime")))
+
+    def our_move(self, ply: int, uci: str, source: str, think_s: float) -> None:
+        self.ours[ply] = (uci, source, think_s)
+
+    def finish(self, status: Optional[str], winner: Optional[str]) -> None:
+        self.status = status
+        self.winner = winner
+        self.finished_at = time.time()
+
+    def result(self) -> str:
+        if self.winner == "white":
+            return "1-0"
+        if self.winner == "black":
+            return "0-1"
+        # anything else that ended the game on the board is a draw
+        if self.status in ("draw", "stalemate", "outoftime") and not self.winner:
+            return "1/2-1/2"
+        return "*"
+
+
+def _ms(clock) -> Optional[int]:
+    # berserk turns the stream's clocks into timedeltas; the raw stream has milliseconds
+    if isinstance(clock, datetime.timedelta):
+        return round(clock.total_seconds() * 1000)
+    return clock
+
+
+class GameArchive:
+    def __init__(self, path: str = ARCHIVE_PATH, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()  # for the reading connection
+        self._conn = self._connect()
+        with self._lock:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+            self._conn.commit()
+        self.written = 0
+        self.batches = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="game-archive", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def add(self, record: GameRecord) -> None:
+        """Queue a finished game; returns at once."""
+        self._queue.put(record)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is written."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10) -> None:
+        self._queue.put(None)
+        self._writer.join(timeout)
+        with self._lock:
+            self._conn.close()
+
+    def _write_loop(self) -> None:
+        conn = self._connect()  # sqlite connections stay on the thread that writes
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write(conn, batch)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not archive {len(batch)} game(s) to {self.path}: {e}")
+                except Exception:
+                    # the writer must outlive any one batch, or later games and flush() would wait forever
+                    logger.exception(f"Could not archive {len(batch)} game(s) to {self.path}")
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List[GameRecord]) -> None:
+        rows = []
+        for record in batch:
+            try:
+                rows.append((_game_row(record), _move_rows(record)))
+            except Exception:
+                logger.exception(f"Could not archive game {record.game_id}")  # e.g. a malformed book
+        with conn:  # one transaction per batch
+            for game, moves in rows:
+                # a game replayed after a crash replaces its earlier, partial record
+                conn.execute("DELETE FROM games WHERE account = ? AND game_id = ?", (game[1], game[0]))
+                cursor = conn.execute(
+                    "INSERT INTO games (game_id, account, played_at, duration_s, white, black, white_rating,"
+                    " black_rating, our_color, opponent, opponent_rating, bot_rating, speed, status, winner,"
+                    " result, opening) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", game)
+                conn.executemany(
+                    "INSERT INTO moves (game, ply, uci, source, think_ms, wtime, btime) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid,) + move for move in moves])
+        self.written += len(rows)
+        self.batches += 1
+
+    # queries, from any thread
+
+    def games(self, opening: Optional[str] = None, opponent: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None, account: Optional[str] = None,
+              limit: Optional[int] = None) -> List[Dict]:
+        """Games, newest first. ``opening`` matches a name prefix (a family takes in its variations)."""
+        where, params = _filters(opening, opponent, since, until, account)
+        sql = f"SELECT * FROM games {where} ORDER BY played_at DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def moves(self, game: int) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ply, uci, source, think_ms, wtime, btime FROM moves WHERE game = ? ORDER BY ply",
+                (game,)).fetchall()
+        return [dict(zip(("ply", "uci", "source", "think_ms", "wtime", "btime"), row)) for row in rows]
+
+    def results_by_opening(self, **filters) -> List[Dict]:
+        """Our wins, draws and losses per opening, most played first."""
+        where, params = _filters(**filters)
+        sql = (
+            "SELECT opening, COUNT(*),"
+            " SUM(CASE WHEN winner = our_color THEN 1 ELSE 0 END),"
+            " SUM(CASE WHEN result = '1/2-1/2' THEN 1 ELSE 0 END),"
+            " SUM(CASE WHEN winner <> our_color THEN 1 ELSE 0 END)"
+            f" FROM games {where} GROUP BY opening ORDER BY COUNT(*) DESC, opening")
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{"opening": opening, "games": games, "wins": wins, "draws": draws, "losses": losses}
+                for opening, games, wins, draws, losses in rows]
+
+    def export_pgn(self, out: TextIO, **filters) -> int:
+        """Write the matching games to ``out`` as PGN, oldest first; returns how many."""
+        count = 0
+        for game in reversed(self.games(**filters)):
+            print(to_pgn(game, self.moves(game["id"])), file=out, end="\n\n")
+            count += 1
+        return count
+
+
+def _filters(opening: Optional[str] = None, opponent: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None, account: Optional[str] = None) -> Tuple[str, List]:
+    clauses, params = [], []
+    if opening:
+        # a range over the index rather than LIKE, which sqlite can't index case-sensitively
+        clauses.append("opening >= ? AND opening < ?")
+        params += [opening, opening + "\U0010ffff"]
+    if opponent:
+        clauses.append("opponent = ?")
+        params.append(opponent.lower())
+    if since is not None:
+        clauses.append("played_at >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("played_at < ?")
+        params.append(until)
+    if account is not None:
+        clauses.append("account = ?")
+        params.append(account)
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _game_row(record: GameRecord) -> tuple:
+    white, black = record.players.get("white", {}), record.players.get("black", {})
+    opponent = black if record.our_color else white
+    opening = None
+    if record.book is not None and record.moves:
+        opening = query_db.get_opening_name_for_moves(record.book.trie, record.moves)
+    finished = record.finished_at or time.time()
+    return (
+        record.game_id, record.account or "", record.started_at, round(finished - record.started_at, 3),
+        white.get("name") or white.get("id"), black.get("name") or black.get("id"),
+        white.get("rating"), black.get("rating"),
+        None if record.our_color is None else ("white" if record.our_color else "black"),
+        (opponent.get("id") or "").lower() or None, opponent.get("rating"), record.bot_rating,
+        record.speed, record.status, record.winner, record.result(), opening,
+    )
+
+
+def _move_rows(record: GameRecord) -> List[tuple]:
+    rows = []
+    for ply, uci in enumerate(record.moves):
+        ours = record.ours.get(ply)
+        if ours is not None and ours[0] == uci:
+            source, think_ms = ours[1], round(ours[2] * 1e3, 3)
+        else:
+            source, think_ms = "opponent", None
+        wtime, btime = record.clocks.get(ply + 1, (None, None))
+        rows.append((ply, uci, source, think_ms, wtime, btime))
+    return rows
+
+
+def to_pgn(game: Dict, moves: List[Dict]) -> str:
+    pgn = chess.pgn.Game()
+    played = datetime.datetime.fromtimestamp(game["played_at"], datetime.timezone.utc)
+    pgn.headers.update({
+        "Event": f"Training game{' (' + game['speed'] + ')' if game['speed'] else ''}",
+        "Site": f"https://lichess.org/{game['game_id']}",
+        "Date": played.strftime("%Y.%m.%d"),
+        "UTCTime": played.strftime("%H:%M:%S"),
+        "White": game["white"] or "?",
+        "Black": game["black"] or "?",
+        "Result": game["result"],
+    })
+    for tag, value in (("WhiteElo", game["white_rating"]), ("BlackElo", game["black_rating"]),
+                       ("Opening", game["opening"]), ("Termination", game["status"])):
+        if value is not None:
+            pgn.headers[tag] = str(value)
+    node = pgn
+    board = chess.Board()
+    for move in moves:
+        try:
+            node = node.add_variation(board.parse_uci(move["uci"]))
+        except ValueError:
+            break  # stop at anything that isn't legal here rather than write a broken game
+        board.push(node.move)
+        clock = move["wtime"] if board.turn == chess.BLACK else move["btime"]
+        comments = []
+        if move["source"] != "opponent":
+            comments.append(f"{move['source']} {move['think_ms']:.0f}ms")
+        if clock is not None:
+            comments.append(f"[%clk {datetime.timedelta(seconds=round(clock / 1000))}]")
+        node.comment = " ".join(comments)
+    return str(pgn)
+
+
+_archive: Optional[GameArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_archive() -> Optional[GameArchive]:
+    # Process-wide archive, opened on first use; None when archiving is off
+    global _archive
+    with _archive_lock:
+        if _archive is None and ARCHIVE_PATH:
+            try:
+                _archive = GameArchive(ARCHIVE_PATH)
+            except sqlite3.Error as e:
+                logger.warning(f"Game archive {ARCHIVE_PATH} unavailable: {e}")
+        return _archive
+
+
+def archive_game(record: GameRecord) -> None:
+    archive = get_archive()
+    if archive is not None:
+        archive.add(record)
+
+
+def close() -> None:
+    """Write out the queued games and close the archive (at exit)."""
+    global _archive
+    with _archive_lock:
+        archive, _archive = _archive, None
+    if archive is not None:
+        archive.close()
+
+
+def _parse_date(value: str) -> float:
+    try:
+        date = datetime.datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {value!r}")
+    return date.timestamp()
+
+
+def _rows(archive: GameArchive, args) -> Iterator[str]:
+    for game in archive.games(**_filter_args(args), limit=args.limit):
+        played = datetime.datetime.fromtimestamp(game["played_at"], datetime.timezone.utc).strftime("%Y-%m-%d %H:%M")
+        yield (f"{played}  {game['game_id']:10} {game['result']:8} {game['our_color'] or '?':6}"
+               f"vs {game['opponent'] or '?'} ({game['opponent_rating'] or '?'})  {game['opening'] or ''}")
+
+
+def _filter_args(args) -> Dict:
+    return {"opening": args.opening, "opponent": args.opponent, "since": args.since, "until": args.until,
+            "account": args.account}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Query and export the archive of games the bot has played.")
+    parser.add_argument("--db", default=ARCHIVE_PATH or "game_archive.sqlite3",
+                        help="archive file (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    commands = {
+        "list": sub.add_parser("list", help="list games, newest first"),
+        "stats": sub.add_parser("stats", help="our results per opening"),
+        "export": sub.add_parser("export", help="write games as PGN, with move sources and clocks as comments"),
+    }
+    commands["export"].add_argument("output", help="PGN file to write ('-' for stdout)")
+    for command in commands.values():
+        command.add_argument("--opening", help="opening name or family prefix, e.g. 'Sicilian Defense'")
+        command.add_argument("--opponent", help="opponent's Lichess username")
+        command.add_argument("--since", type=_parse_date, help="first day, YYYY-MM-DD (UTC)")
+        command.add_argument("--until", type=_parse_date, help="day after the last one, YYYY-MM-DD (UTC)")
+        command.add_argument("--account", help="only games of this bot account")
+    commands["list"].add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} doesn't exist yet; it is created when the bot finishes a game")
+    archive = GameArchive(args.db)
+    try:
+        if args.command == "list":
+            for line in _rows(archive, args):
+                print(line)
+        elif args.command == "stats":
+            print(f"{'games':>6}{'won':>6}{'drawn':>6}{'lost':>6}  opening")
+            for row in archive.results_by_opening(**_filter_args(args)):
+                print(f"{row['games']:>6}{row['wins']:>6}{row['draws']:>6}{row['losses']:>6}  "
+                      f"{row['opening'] or '(out of book)'}")
+        elif args.output == "-":
+            archive.export_pgn(sys.stdout, **_filter_args(args))
+        else:
+            with open(args.output, "w", encoding="utf-8") as f:
+                count = archive.export_pgn(f, **_filter_args(args))
+            print(f"Wrote {count} games to {args.output}")
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
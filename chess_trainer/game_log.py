@@ -0,0 +1,227 @@
+"""Queued, per-game logging for the bot.
+
+Printing from the game loop blocks the game thread whenever stdout is slow
+(a pipe nobody reads fast enough, a terminal under load, a full disk).
+:func:`configure` routes the ``chess_trainer`` and ``opening_book``
+loggers through a :class:`~logging.handlers.QueueHandler`. The producing
+thread then only formats the message and enqueues it, and a single
+:class:`~logging.handlers.QueueListener` thread does all of the writing:
+
+- to stdout, prefixed with the game id, at ``CHESS_TRAINER_LOG_LEVEL``
+  (default INFO);
+- to ``<CHESS_TRAINER_LOG_DIR>/<game id>.log`` for every record logged
+  inside :func:`game_context`. These files get DEBUG records as well when
+  the level allows them. An empty directory name turns them off.
+
+The per-move candidate dumps are DEBUG records, and only a sample of the
+moves log them. :func:`sampled_move` decides once per move whether it is
+among the sampled ``CHESS_TRAINER_LOG_SAMPLE`` fraction (default 1.0,
+every move), so a move logs either all of its dumps or none. Call sites
+guard them with :func:`verbose`, which returns False unless DEBUG is
+enabled and the current move was sampled. A suppressed dump therefore
+costs one level check and no formatting.
+
+The dumps carry their data as key/value fields (``extra={"fields": {...}}``)
+rather than inside the message. Both outputs append the fields as JSON,
+and any other handler can read them from ``record.fields``.
+
+Without :func:`configure` (in tests, or when the modules are used as a
+library) the loggers behave like any other and nothing is queued.
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+LOG_DIR = os.getenv("CHESS_TRAINER_LOG_DIR", "game_logs")
+LOG_LEVEL = os.getenv("CHESS_TRAINER_LOG_LEVEL", "INFO").upper()
+SAMPLE_RATE = float(os.getenv("CHESS_TRAINER_LOG_SAMPLE", "1.0"))
+LOGGERS = ("chess_trainer", "opening_book")
+MAX_OPEN_FILES = 64  # per-game files kept open at once; older ones are reopened on demand
+
+_local = threading.local()
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.handlers.QueueHandler] = None
+_lock = threading.Lock()
+# the current move's sampling decision; None outside sampled_move (decided per call)
+_sampled: "contextvars.ContextVar[Optional[bool]]" = contextvars.ContextVar("sampled", default=None)
+
+
+@contextmanager
+def game_context(game_id: str, account: Optional[str] = None) -> Iterator[str]:
+    """Tag every record logged on this thread with the game, until the block exits."""
+    tag = f"{account}-{game_id}" if account else game_id
+    previous = getattr(_local, "game", None)
+    _local.game = tag
+    try:
+        yield tag
+    finally:
+        _local.game = previous
+        handler = _handler
+        if handler is not None and previous is None:
+            # lets the writer close the game's file; sent whatever the log level
+            record = logging.LogRecord(__name__, logging.DEBUG, __file__, 0, "game log closed", None, None)
+            record.game, record.game_end = tag, True
+            handler.handle(record)
+
+
+def current_game() -> Optional[str]:
+    return getattr(_local, "game", None)
+
+
+@contextmanager
+def tagged(tag: Optional[str]) -> Iterator[None]:
+    """Log under ``tag`` (from :func:`current_game` on the game's thread) on a helper thread."""
+    previous = getattr(_local, "game", None)
+    _local.game = tag
+    try:
+        yield
+    finally:
+        _local.game = previous
+
+
+def _sample() -> bool:
+    return SAMPLE_RATE >= 1 or random.random() < SAMPLE_RATE
+
+
+@contextmanager
+def sampled_move() -> Iterator[bool]:
+    """Decide once whether the DEBUG dumps of the move (or lookup) in this block are logged."""
+    token = _sampled.set(_sample())
+    try:
+        yield _sampled.get()
+    finally:
+        _sampled.reset(token)
+
+
+def verbose(logger: logging.Logger) -> bool:
+    """True if a DEBUG dump on ``logger`` should be built for this move."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    sampled = _sampled.get()
+    return _sample() if sampled is None else sampled
+
+
+class _GameFilter(logging.Filter):
+    # Runs on the producing thread, where the game context is known
+    def filter(self, record: logging.LogRecord) -> bool:
+        game = getattr(record, "game", None) or current_game()
+        record.game = game
+        record.game_tag = f"[{game}] " if game else ""
+        return True
+
+
+class _FieldsFormatter(logging.Formatter):
+    # Appends a record's key/value fields, if any, to the formatted line as JSON
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line = f"{line} {json.dumps(fields, default=str)}"
+        return line
+
+
+class GameFileHandler(logging.Handler):
+    """Write each game's records to its own file (runs on the listener thread)."""
+
+    def __init__(self, directory: str, max_open: int = MAX_OPEN_FILES):
+        super().__init__()
+        self.directory = directory
+        self.max_open = max_open
+        self._files: "OrderedDict[str, object]" = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def _file(self, game: str):
+        f = self._files.get(game)
+        if f is None:
+            f = self._files[game] = open(os.path.join(self.directory, f"{game}.log"), "a", encoding="utf-8")
+            while len(self._files) > self.max_open:
+                self._files.popitem(last=False)[1].close()
+        else:
+            self._files.move_to_end(game)
+        return f
+
+    def emit(self, record: logging.LogRecord) -> None:
+        game = getattr(record, "game", None)
+        if not game:
+            return
+        try:
+            if getattr(record, "game_end", False):
+                f = self._files.pop(game, None)
+                if f is not None:
+                    f.close()
+                return
+            f = self._file(game)
+            f.write(self.format(record) + "\n")
+            f.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        super().close()
+
+
+class _NotGameEnd(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not getattr(record, "game_end", False)
+
+
+def configure(level: Optional[str] = None, log_dir: Optional[str] = None,
+              sample_rate: Optional[float] = None, stream=None) -> None:
+    """Start the background writer; safe to call more than once."""
+    global _listener, _handler, SAMPLE_RATE
+    with _lock:
+        if sample_rate is not None:
+            SAMPLE_RATE = sample_rate
+        if _listener is not None:
+            return
+        level = getattr(logging, (level or LOG_LEVEL).upper(), logging.INFO)
+        log_dir = LOG_DIR if log_dir is None else log_dir
+
+        console = logging.StreamHandler(stream or sys.stdout)
+        console.setFormatter(_FieldsFormatter("%(game_tag)s%(message)s"))
+        console.addFilter(_NotGameEnd())
+        handlers = [console]
+        if log_dir:
+            files = GameFileHandler(log_dir)
+            files.setFormatter(_FieldsFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+            handlers.append(files)
+
+        records: "queue.SimpleQueue" = queue.SimpleQueue()
+        _handler = logging.handlers.QueueHandler(records)
+        _handler.addFilter(_GameFilter())
+        for name in LOGGERS:
+            logger = logging.getLogger(name)
+            logger.addHandler(_handler)
+            logger.setLevel(level)
+            logger.propagate = False
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown() -> None:
+    """Flush the queue and stop the writer."""
+    global _listener, _handler
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        for name in LOGGERS:
+            logger = logging.getLogger(name)
+            logger.removeHandler(_handler)
+            logger.setLevel(logging.NOTSET)
+            logger.propagate = True
+        _listener = _handler = None
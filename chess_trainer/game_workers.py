@@ -0,0 +1,253 @@
+"""Play games in a pool of worker processes.
+
+In-process, every game shares one interpreter (and one GIL) with the event
+stream, so move generation, JSON decoding and book lookups of simultaneous
+games compete for a single core. :class:`GameWorkerPool` keeps
+``handle_events`` in the main process and hands each ``gameStart`` to one
+of ``size`` worker processes, so games spread over the cores of the host.
+
+- Each worker runs every game it is given on its own thread with
+  :func:`chess_trainer.trainer.play_game`. Engines come from the worker's
+  own :class:`~chess_trainer.engine_pool.EnginePool`, borrowed for one
+  engine move at a time, so an engine is started once and shared by all
+  of the worker's games.
+- A new game goes to the worker with the fewest games in progress.
+- Workers report every ``HEARTBEAT`` seconds over their pipe. A worker that
+  exits, or stays silent for ``HEARTBEAT_TIMEOUT``, is killed and started
+  again. Its games are handed to another worker, which resumes each one
+  from the ``gameFull`` state of a fresh game stream. A game is restarted at
+  most ``MAX_GAME_RESTARTS`` times.
+
+Workers use the ``spawn`` start method, so they never inherit the parent's
+threads or open connections.
+"""
+import multiprocessing
+import threading
+import time
+import traceback
+from multiprocessing.connection import wait
+from typing import Dict, List, Optional
+
+from chess_trainer.bot_profile import BotProfile
+
+HEARTBEAT = 1.0  # seconds between worker reports
+HEARTBEAT_TIMEOUT = 15.0  # a worker silent this long is considered hung
+MAX_GAME_RESTARTS = 2  # per game, across worker crashes
+RESPAWN_DELAY = 1.0  # doubled for each crash in a row, up to MAX_RESPAWN_DELAY
+MAX_RESPAWN_DELAY = 30.0
+ENGINES_PER_WORKER = 8  # engine moves beyond this at once on one worker wait for a free engine
+
+
+def _worker_main(index: int, conn, engines: int, profile_mode: Optional[str],
+                 profile_interval: Optional[float]) -> None:
+    # Imported here: the trainer module logs in to Lichess and locates the engine at import
+    from chess_trainer import game_archive, game_log, profiling, trainer
+    from chess_trainer.engine_pool import EnginePool
+    from opening_book import lichess_openings_explorer
+
+    profiling.configure(mode=profile_mode, interval=profile_interval)
+    game_log.configure()
+    lichess_openings_explorer.watch_book()
+    pool = EnginePool(trainer.STOCKFISH_PATH, size=engines)
+    send_lock = threading.Lock()
+    active: Dict[str, threading.Thread] = {}
+
+    def send(message) -> None:
+        with send_lock:
+            conn.send(message)
+
+    def run(game_id: str, bot_profile: BotProfile) -> None:
+        error = None
+        try:
+            trainer.play_game(game_id, bot_profile, engines=pool)
+        except Exception as e:
+            traceback.print_exc()
+            error = str(e)
+        finally:
+            active.pop(game_id, None)
+            try:
+                send(("finished", game_id, error))
+            except OSError:
+                pass  # the parent is gone
+
+    print(f"Game worker {index} ready")
+    try:
+        while True:
+            if conn.poll(HEARTBEAT):
+                message = conn.recv()
+                if message is None:
+                    break
+                game_id, bot_profile = message
+                thread = threading.Thread(target=run, args=(game_id, bot_profile),
+                                          name=f"game-{game_id}", daemon=True)
+                active[game_id] = thread
+                thread.start()
+            send(("heartbeat", len(active)))
+        # asked to stop: let running games finish
+        for thread in list(active.values()):
+            thread.join()
+    except (EOFError, OSError, KeyboardInterrupt):
+        pass  # the parent is gone; its games go down with it
+    finally:
+        pool.close()
+        game_archive.close()
+        game_log.shutdown()
+
+
+class _Worker:
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.games: Dict[str, BotProfile] = {}
+        self.last_seen = 0.0
+        self.crashes = 0  # in a row; reset once the worker has finished a game
+        self.respawn_at = 0.0
+
+
+class GameWorkerPool:
+    def __init__(self, size: int, engines_per_worker: int = ENGINES_PER_WORKER,
+                 profile_mode: Optional[str] = None, profile_interval: Optional[float] = None):
+        if size < 1:
+            raise ValueError("a worker pool needs at least one worker")
+        self.size = size
+        self.engines_per_worker = engines_per_worker
+        self.profile_mode = profile_mode
+        self.profile_interval = profile_interval
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._workers = [_Worker(i) for i in range(size)]
+        self._restarts: Dict[str, int] = {}
+        self._closed = threading.Event()
+        for worker in self._workers:
+            self._spawn(worker)
+        self._monitor = threading.Thread(target=self._watch, name="game-workers", daemon=True)
+        self._monitor.start()
+
+    def _spawn(self, worker: _Worker) -> None:
+        parent_conn, child_conn = self._ctx.Pipe()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.index, child_conn, self.engines_per_worker, self.profile_mode, self.profile_interval),
+            name=f"game-worker-{worker.index}", daemon=True)
+        worker.process.start()
+        child_conn.close()
+        worker.conn = parent_conn
+        worker.last_seen = time.monotonic()
+
+    def _alive(self) -> List[_Worker]:
+        return [w for w in self._workers if w.conn is not None]
+
+    def play(self, game_id: str, bot_profile: BotProfile) -> None:
+        """Hand a game to the least busy worker; usable as ``handle_events``' ``game_runner``."""
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError("game worker pool is closed")
+            self._assign(game_id, bot_profile)
+
+    def _assign(self, game_id: str, bot_profile: BotProfile) -> None:
+        # caller holds self._lock
+        candidates = self._alive()
+        if not candidates:
+            # every worker is waiting to be respawned; the first one back takes the game
+            worker = min(self._workers, key=lambda w: w.respawn_at)
+            worker.games[game_id] = bot_profile
+            return
+        worker = min(candidates, key=lambda w: (len(w.games), w.index))
+        worker.games[game_id] = bot_profile
+        try:
+            worker.conn.send((game_id, bot_profile))
+        except OSError:
+            pass  # the monitor notices the dead worker and moves its games on
+        print(f"Game {game_id} -> worker {worker.index} ({len(worker.games)} in progress)")
+
+    def loads(self) -> List[int]:
+        with self._lock:
+            return [len(w.games) for w in self._workers]
+
+    def _watch(self) -> None:
+        while not self._closed.is_set():
+            with self._lock:
+                conns = {w.conn: w for w in self._alive()}
+                sentinels = {w.process.sentinel: w for w in self._alive()}
+            ready = wait(list(conns) + list(sentinels), timeout=HEARTBEAT)
+            if self._closed.is_set():
+                break
+            with self._lock:
+                for obj in ready:
+                    worker = conns.get(obj)
+                    if worker is not None and worker.conn is obj:
+                        self._receive(worker)
+                now = time.monotonic()
+                for worker in self._workers:
+                    if worker.conn is None:
+                        if now >= worker.respawn_at:
+                            self._respawn(worker)
+                    elif not worker.process.is_alive():
+                        self._lost(worker, f"exited with code {worker.process.exitcode}")
+                    elif now - worker.last_seen > HEARTBEAT_TIMEOUT:
+                        self._lost(worker, f"no heartbeat for {now - worker.last_seen:.0f}s")
+
+    def _receive(self, worker: _Worker) -> None:
+        try:
+            while worker.conn.poll():
+                message = worker.conn.recv()
+                worker.last_seen = time.monotonic()
+                if message[0] == "finished":
+                    _, game_id, error = message
+                    worker.games.pop(game_id, None)
+                    self._restarts.pop(game_id, None)
+                    worker.crashes = 0
+                    if error:
+                        print(f"Game {game_id} on worker {worker.index} discontinued: {error}")
+        except (EOFError, OSError):
+            pass  # the process sentinel reports the exit
+
+    def _lost(self, worker: _Worker, reason: str) -> None:
+        # caller holds self._lock
+        print(f"Game worker {worker.index} (pid {worker.process.pid}) {reason}; restarting it")
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        worker.conn.close()
+        worker.conn = None
+        delay = min(RESPAWN_DELAY * 2 ** worker.crashes, MAX_RESPAWN_DELAY)
+        worker.crashes += 1
+        worker.respawn_at = time.monotonic() + (0 if worker.crashes == 1 else delay)
+        orphans, worker.games = worker.games, {}
+        for game_id, bot_profile in orphans.items():
+            restarts = self._restarts.get(game_id, 0) + 1
+            if restarts > MAX_GAME_RESTARTS:
+                print(f"Game {game_id} lost its worker {restarts} times; giving up on it")
+                self._restarts.pop(game_id, None)
+                continue
+            self._restarts[game_id] = restarts
+            self._assign(game_id, bot_profile)
+
+    def _respawn(self, worker: _Worker) -> None:
+        # caller holds self._lock
+        self._spawn(worker)
+        for game_id, bot_profile in worker.games.items():
+            worker.conn.send((game_id, bot_profile))
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop the workers, letting them finish their games for up to ``timeout`` seconds."""
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._closed.set()
+            workers = self._alive()
+            for worker in workers:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+        self._monitor.join()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in workers:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            worker.process.join(remaining)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
@@ -0,0 +1,254 @@
+"""In-process metrics for the bot: per-move timing spans, counters and histograms.
+
+Everything is recorded into a process-wide :data:`REGISTRY`, which the Flask
+UI exposes in the Prometheus text format at ``/metrics``. Each game also gets
+a :class:`GameMetrics` collector whose JSON summary is written to
+``METRICS_DIR`` when the game finishes.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+METRICS_DIR = os.getenv("CHESS_TRAINER_METRICS_DIR", "game_metrics")
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            data = self._values.get(_label_key(labels))
+            return data[-1] if data else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, data in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, data):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {data[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {data[-2]:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {data[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+MOVE_STAGE_SECONDS = REGISTRY.histogram(
+    "chess_trainer_move_stage_seconds", "Time spent per stage of handling a move")
+MOVES = REGISTRY.counter("chess_trainer_moves_total", "Moves played, by source (book or engine)")
+STREAM_RECONNECTS = REGISTRY.counter(
+    "chess_trainer_stream_reconnects_total", "Reconnects of the Lichess event/game streams")
+MOVE_RETRIES = REGISTRY.counter("chess_trainer_move_retries_total", "Retried move submissions")
+GAMES_FINISHED = REGISTRY.counter("chess_trainer_games_finished_total", "Games played to completion")
+
+
+class GameMetrics:
+    """Timing spans and counters for a single game."""
+
+    def __init__(self, game_id: str, account: Optional[str] = None):
+        self.game_id = game_id
+        self.account = account
+        # added to the process-wide series so several bot accounts can be told apart
+        self.labels = {"account": account} if account else {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, List[float]] = {}
+        self.moves: Dict[str, int] = {}
+        self.reconnects = 0
+        self.retries = 0
+        self.prefetch = {"hits": 0, "misses": 0}
+        self._reconnected_at: Optional[float] = None
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        MOVE_STAGE_SECONDS.observe(seconds, stage=stage, **self.labels)
+        with self._lock:
+            self.stages.setdefault(stage, []).append(seconds)
+
+    def move_played(self, source: str) -> None:
+        MOVES.inc(source=source, **self.labels)
+        with self._lock:
+            self.moves[source] = self.moves.get(source, 0) + 1
+
+    def played(self, source: str) -> int:
+        with self._lock:
+            return self.moves.get(source, 0)
+
+    def reconnected(self) -> None:
+        with self._lock:
+            self.reconnects += 1
+            if self._reconnected_at is None:
+                self._reconnected_at = time.perf_counter()
+
+    def resumed(self, stage: str) -> None:
+        """Record the time from the first stream drop until ``stage`` after resyncing."""
+        with self._lock:
+            started, self._reconnected_at = self._reconnected_at, None
+        if started is not None:
+            self.observe(stage, time.perf_counter() - started)
+
+    def retried(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def prefetched(self, hit: bool) -> None:
+        with self._lock:
+            self.prefetch["hits" if hit else "misses"] += 1
+
+    def summary(self) -> Dict:
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": len(times),
+                    "total_s": round(sum(times), 6),
+                    "mean_s": round(sum(times) / len(times), 6),
+                    "max_s": round(max(times), 6),
+                }
+                for stage, times in self.stages.items() if times
+            }
+            summary = {
+                "game_id": self.game_id,
+                "started_at": self.started_at,
+                "duration_s": round(time.time() - self.started_at, 3),
+                "moves": dict(self.moves),
+                "reconnects": self.reconnects,
+                "retries": self.retries,
+                "prefetch": dict(self.prefetch),
+                "stages": stages,
+            }
+            if self.account:
+                summary["account"] = self.account
+            return summary
+
+
+_active_games: Dict[Tuple[Optional[str], str], GameMetrics] = {}
+_recent_summaries: deque = deque(maxlen=100)
+_games_lock = threading.Lock()
+
+
+def start_game(game_id: str, account: Optional[str] = None) -> GameMetrics:
+    game = GameMetrics(game_id, account)
+    with _games_lock:
+        _active_games[(account, game_id)] = game
+    return game
+
+
+def active_game(game_id: str, account: Optional[str] = None) -> Optional[GameMetrics]:
+    with _games_lock:
+        return _active_games.get((account, game_id))
+
+
+def finish_game(game: GameMetrics) -> Dict:
+    """Drop ``game`` from the active set and persist its JSON summary."""
+    summary = game.summary()
+    GAMES_FINISHED.inc(**game.labels)
+    with _games_lock:
+        _active_games.pop((game.account, game.game_id), None)
+        _recent_summaries.append(summary)
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        # two of our accounts playing each other see the same game id
+        name = f"{game.account}-{game.game_id}" if game.account else game.game_id
+        with open(os.path.join(METRICS_DIR, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    except OSError as e:
+        print(f"Could not write metrics for game {game.game_id}: {e}")
+    return summary
+
+
+def recent_summaries() -> List[Dict]:
+    with _games_lock:
+        return list(_recent_summaries)
@@ -0,0 +1,154 @@
+"""Asynchronous move submission for the Lichess Bot API.
+
+Moves are posted from a small thread pool over a dedicated keep-alive
+session with strict timeouts, so the game loop never waits on an HTTP
+round trip: :meth:`MoveSubmitter.submit` returns a ``Future`` immediately
+and the loop keeps reading the game stream while the ack is pending.
+
+Each submission is keyed by ``(game_id, ply)``. Submitting the same key
+again while it is pending (or after it succeeded) returns the existing
+future instead of posting twice, and once the game stream shows the ply was
+played (:meth:`confirm`) any remaining retries for it are dropped. A retry
+answered with 400 after an attempt that timed out is treated as a
+duplicate of a move that already landed rather than as a failure.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from chess_trainer import metrics
+
+TIMEOUT = (2.0, 5.0)  # (connect, read) seconds
+MAX_ATTEMPTS = 3
+BACKOFF = 0.25  # seconds, doubled per retry
+MAX_BACKOFF = 2.0
+POOL_SIZE = 4
+
+SUBMIT_SECONDS = metrics.REGISTRY.histogram(
+    "chess_trainer_move_submit_seconds", "Round trip of a move submission until Lichess acked it")
+SUBMIT_RESULTS = metrics.REGISTRY.counter(
+    "chess_trainer_move_submits_total", "Move submissions by outcome (ok, duplicate, superseded, failed)")
+
+
+class MoveRejected(Exception):
+    """Lichess refused the move (illegal, not our turn, game over, ...)."""
+
+    def __init__(self, uci: str, status_code: int, detail: str):
+        super().__init__(f"Move {uci} rejected ({status_code}): {detail}")
+        self.uci = uci
+        self.status_code = status_code
+
+
+class MoveSubmitter:
+    def __init__(self, base_url: str, token: str, timeout=TIMEOUT, max_attempts: int = MAX_ATTEMPTS,
+                 pool_size: int = POOL_SIZE, session: Optional[requests.Session] = None,
+                 account: Optional[str] = None):
+        self.base_url = base_url.rstrip('/')
+        self._labels = {"account": account} if account else {}
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        session.headers["Authorization"] = f"Bearer {token}"
+        self.session = session
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="move-submit")
+        self._lock = threading.Lock()
+        self._submissions: Dict[Tuple[str, int], Future] = {}
+        self._confirmed: Dict[str, int] = {}  # game id -> plies seen on the game stream
+
+    def submit(self, game_id: str, ply: int, uci: str,
+               game_metrics: Optional[metrics.GameMetrics] = None) -> Future:
+        """Post ``uci`` as move number ``ply`` (0-based) of ``game_id`` in the background.
+
+        The future resolves to ``"ok"``, ``"duplicate"`` or ``"superseded"``
+        (the stream showed the ply before the ack), or raises
+        :class:`MoveRejected` / the last network error.
+        """
+        key = (game_id, ply)
+        with self._lock:
+            existing = self._submissions.get(key)
+            if existing is not None and (not existing.done() or existing.exception() is None):
+                return existing
+            future = self._submissions[key] = self._executor.submit(
+                self._send, game_id, ply, uci, game_metrics)
+        return future
+
+    def pending(self, game_id: str, ply: int) -> bool:
+        """True if a submission for this ply is in flight or already acked."""
+        with self._lock:
+            future = self._submissions.get((game_id, ply))
+        return future is not None and (not future.done() or future.exception() is None)
+
+    def confirm(self, game_id: str, plies: int) -> None:
+        """Record that the game stream shows ``plies`` moves played."""
+        with self._lock:
+            if plies > self._confirmed.get(game_id, -1):
+                self._confirmed[game_id] = plies
+
+    def forget(self, game_id: str) -> None:
+        # Drop the bookkeeping of a finished game
+        with self._lock:
+            self._confirmed.pop(game_id, None)
+            for key in [k for k in self._submissions if k[0] == game_id]:
+                del self._submissions[key]
+
+    def _landed(self, game_id: str, ply: int) -> bool:
+        with self._lock:
+            return self._confirmed.get(game_id, -1) > ply
+
+    def _send(self, game_id: str, ply: int, uci: str, game_metrics: Optional[metrics.GameMetrics]) -> str:
+        url = f"{self.base_url}/api/bot/game/{game_id}/move/{uci}"
+        start = time.perf_counter()
+        timed_out = False
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                if self._landed(game_id, ply):
+                    SUBMIT_RESULTS.inc(result="superseded", **self._labels)
+                    return "superseded"
+                metrics.MOVE_RETRIES.inc(**self._labels)
+                if game_metrics is not None:
+                    game_metrics.retried()
+                time.sleep(min(BACKOFF * 2 ** (attempt - 2), MAX_BACKOFF))
+            try:
+                response = self.session.post(url, timeout=self.timeout)
+            except requests.Timeout as e:
+                # the move may still have been applied; a later 400 means it was
+                timed_out, error = True, e
+                continue
+            except requests.ConnectionError as e:
+                error = e
+                continue
+
+            if response.status_code == 200:
+                self._observe(start, game_metrics)
+                SUBMIT_RESULTS.inc(result="ok", **self._labels)
+                return "ok"
+            if response.status_code == 400 and (timed_out or self._landed(game_id, ply)):
+                self._observe(start, game_metrics)
+                SUBMIT_RESULTS.inc(result="duplicate", **self._labels)
+                return "duplicate"
+            if response.status_code == 429 or response.status_code >= 500:
+                error = MoveRejected(uci, response.status_code, response.text[:200])
+                continue
+            SUBMIT_RESULTS.inc(result="failed", **self._labels)
+            raise MoveRejected(uci, response.status_code, response.text[:200])
+
+        SUBMIT_RESULTS.inc(result="failed", **self._labels)
+        raise error
+
+    def _observe(self, start: float, game_metrics: Optional[metrics.GameMetrics]) -> None:
+        elapsed = time.perf_counter() - start
+        SUBMIT_SECONDS.observe(elapsed, **self._labels)
+        if game_metrics is not None:
+            game_metrics.observe("move_ack", elapsed)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.session.close()
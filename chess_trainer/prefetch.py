@@ -0,0 +1,152 @@
+"""Speculative book lookups while the opponent is thinking.
+
+After the bot moves, the game loop would otherwise sit idle until the next
+gameState and only then walk the book. :class:`BookPrefetcher` uses that
+wait: :meth:`~BookPrefetcher.schedule` ranks the opponent's likely replies by
+book games and, on a background thread, works out our book answer to each of
+them. When the reply arrives, :meth:`~BookPrefetcher.take` hands back the
+ready decision, including "no book move". If the reply wasn't one of the
+prefetched ones, the game loop falls back to a normal lookup.
+
+When the local book has nothing at the current position, replies are ranked
+from the opening explorer instead. Hits and misses are counted in
+``chess_trainer_book_prefetch_total`` and in the per-game summary.
+"""
+import logging
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import chess
+
+from chess_trainer import game_log, metrics
+from opening_book import lichess_openings_explorer
+
+logger = logging.getLogger(__name__)
+
+REPLIES = 4  # opponent replies prefetched per position
+MAX_PLY = 20  # same cut-off as get_book_move
+WAIT_FOR_RUNNING = 1.0  # seconds to wait for a lookup that has already started
+
+PREFETCH_RESULTS = metrics.REGISTRY.counter(
+    "chess_trainer_book_prefetch_total", "Book lookups answered from the prefetch table (hit) or not (miss)")
+
+Key = Tuple[str, ...]
+
+
+def likely_replies(board: chess.Board, n: int, explorer: bool = True, book=None) -> List[str]:
+    """The ``n`` most played book moves at ``board``, most played first."""
+    moves = lichess_openings_explorer.get_local_book_moves(board, None, book=book)
+    if not moves and explorer:
+        play = ",".join(m.uci() for m in board.move_stack) or None
+        try:
+            moves = lichess_openings_explorer.fetch_book_moves(play, n)
+        except Exception as e:
+            logger.warning(f"Prefetch could not reach the opening explorer: {e}")
+            moves = []
+    moves = sorted(moves, key=lambda m: m["white"] + m["draws"] + m["black"], reverse=True)
+    return [m["uci"] for m in moves[:n]]
+
+
+class BookPrefetcher:
+    """Per-game table of book decisions for the positions after the opponent's likely replies."""
+
+    def __init__(self, bot_profile, game_metrics: Optional[metrics.GameMetrics] = None, replies: int = REPLIES,
+                 max_ply: int = MAX_PLY, explorer: bool = True, book=None,
+                 decide: Optional[Callable] = None, rank: Optional[Callable] = None):
+        self.bot_profile = bot_profile
+        self.game_metrics = game_metrics
+        self.replies = replies
+        self.max_ply = max_ply
+        self.explorer = explorer
+        self.book = book  # the game's book snapshot (see opening_book.book_manager)
+        self._decide = decide or (lambda board: lichess_openings_explorer.get_book_move(
+            board, self.bot_profile, max_ply=self.max_ply, book=self.book))
+        self._rank = rank or (lambda board, n: likely_replies(board, n, self.explorer, self.book))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="book-prefetch")
+        self._game = game_log.current_game()  # lookups log into the game's file
+        self._lock = threading.Lock()
+        self._parent: Optional[Key] = None  # position the current table was built for
+        self._table: Dict[Key, Future] = {}
+        self.hits = self.misses = 0
+
+    def schedule(self, board: chess.Board) -> None:
+        """Start prefetching our answers to the replies after ``board`` (our move just played)."""
+        parent = tuple(m.uci() for m in board.move_stack)
+        with self._lock:
+            for future in self._table.values():
+                future.cancel()
+            self._table = {}
+            self._parent = parent if len(parent) + 1 < self.max_ply else None
+            if self._parent is None:
+                return
+        self._executor.submit(self._plan, board.copy(), parent)
+
+    def _plan(self, board: chess.Board, parent: Key) -> None:
+        with game_log.tagged(self._game):
+            self._plan_replies(board, parent)
+
+    def _lookup(self, board: chess.Board) -> Optional[str]:
+        # the lookup runs ahead of its move, so it gets its own sampling decision
+        with game_log.tagged(self._game), game_log.sampled_move():
+            return self._decide(board)
+
+    def _plan_replies(self, board: chess.Board, parent: Key) -> None:
+        # Runs on the prefetch thread; queue one lookup per likely reply
+        for uci in self._rank(board, self.replies):
+            move = chess.Move.from_uci(uci)
+            if move not in board.legal_moves:
+                continue
+            after = board.copy()
+            after.push(move)
+            with self._lock:
+                if self._parent != parent:
+                    return  # the game moved on while we were ranking
+                self._table[parent + (uci,)] = self._executor.submit(self._lookup, after)
+
+    def take(self, board: chess.Board) -> Tuple[bool, Optional[str]]:
+        """Return ``(True, move_or_None)`` if the book decision for ``board`` is ready, else ``(False, None)``."""
+        key = tuple(m.uci() for m in board.move_stack)
+        with self._lock:
+            if self._parent is None or key[:-1] != self._parent:
+                return False, None  # nothing was prefetched for this position
+            future = self._table.pop(key, None)
+            self._parent = None
+            for other in self._table.values():
+                other.cancel()
+            self._table = {}
+        result = None
+        if future is not None and (future.done() or future.running()):
+            try:
+                result = (True, future.result(timeout=WAIT_FOR_RUNNING))
+            except CancelledError:
+                pass
+            except Exception as e:  # a failed or slow speculative lookup is just a miss
+                logger.warning(f"Prefetched book lookup failed: {e}")
+        elif future is not None:
+            future.cancel()
+        self._record(result is not None)
+        return result or (False, None)
+
+    def _record(self, hit: bool) -> None:
+        PREFETCH_RESULTS.inc(result="hit" if hit else "miss")
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if self.game_metrics is not None:
+            self.game_metrics.prefetched(hit)
+
+    def hit_rate(self) -> Optional[float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return self.hits / total if total else None
+
+    def close(self) -> None:
+        with self._lock:
+            for future in self._table.values():
+                future.cancel()
+            self._table = {}
+            self._parent = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,128 @@
+"""Opt-in profiling of games, the event loop and crawls.
+
+Disabled by default. Set ``CHESS_TRAINER_PROFILE=sample`` (or pass
+``--profile sample``) to run a stack sampler alongside each profiled call and
+write a collapsed-stack file (``frame;frame;frame count`` per line, ready for
+``flamegraph.pl`` or speedscope) per game/crawl into ``CHESS_TRAINER_PROFILE_DIR``.
+``cprofile`` uses the deterministic profiler instead and writes a ``.prof``
+file for ``pstats``/snakeviz. When profiling is off a wrapped call costs one
+global lookup.
+"""
+import cProfile
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+MODES = ("sample", "cprofile")
+_env_mode = os.getenv("CHESS_TRAINER_PROFILE", "").lower()
+# any other truthy value ("1", "true", ...) selects the sampler
+PROFILE_MODE = None if _env_mode in ("", "0", "false", "off") else (_env_mode if _env_mode in MODES else "sample")
+PROFILE_DIR = os.getenv("CHESS_TRAINER_PROFILE_DIR", "profiles")
+SAMPLE_INTERVAL = float(os.getenv("CHESS_TRAINER_PROFILE_INTERVAL", "0.005"))  # seconds
+
+_local = threading.local()
+
+
+def configure(mode: Optional[str] = None, interval: Optional[float] = None,
+              output_dir: Optional[str] = None) -> None:
+    """Override the environment settings, e.g. from command-line switches."""
+    global PROFILE_MODE, SAMPLE_INTERVAL, PROFILE_DIR
+    if mode is not None:
+        if mode and mode not in MODES:
+            raise ValueError(f"unknown profile mode {mode!r}; expected one of {MODES}")
+        PROFILE_MODE = mode or None
+    if interval is not None:
+        SAMPLE_INTERVAL = interval
+    if output_dir is not None:
+        PROFILE_DIR = output_dir
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """Samples one thread's Python stack every ``interval`` seconds."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        self._thread.join()
+        return dict(self.counts)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+
+def write_collapsed(counts: Dict[str, int], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in sorted(counts.items()):
+            f.write(f"{stack} {count}\n")
+
+
+def _output_path(kind: str, name: Optional[str], suffix: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    label = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{kind}-{name}" if name else kind)
+    return os.path.join(PROFILE_DIR, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}.{suffix}")
+
+
+def profiled(kind: str, name_from: Optional[Callable[..., str]] = None):
+    """Decorator: profile each outermost call of the function when enabled.
+
+    ``name_from`` receives the call's arguments and returns a label for the
+    output file (e.g. the game id). Recursive calls are profiled once; with
+    ``cprofile`` nested profiled calls (a game inside the event loop) are
+    folded into the outer profile since only one profiler can be active.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if PROFILE_MODE is None:
+                return func(*args, **kwargs)
+            active = _local.__dict__.setdefault("kinds", set())
+            if kind in active or (PROFILE_MODE == "cprofile" and active):
+                return func(*args, **kwargs)
+            name = name_from(*args, **kwargs) if name_from else None
+            active.add(kind)
+            try:
+                if PROFILE_MODE == "cprofile":
+                    profiler = cProfile.Profile()
+                    try:
+                        return profiler.runcall(func, *args, **kwargs)
+                    finally:
+                        path = _output_path(kind, name, "prof")
+                        profiler.dump_stats(path)
+                        print(f"Profile written to {path}")
+                sampler = StackSampler(threading.get_ident(), SAMPLE_INTERVAL)
+                sampler.start()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    path = _output_path(kind, name, "collapsed")
+                    write_collapsed(sampler.stop(), path)
+                    print(f"Profile written to {path}")
+            finally:
+                active.discard(kind)
+        return wrapper
+    return decorator
@@ -1,8 +1,18 @@
 // chess_trainer/static/ui/src/OpeningsTree.jsx
 import React, { useState, useEffect, Fragment } from "react";
 
-function TreeNode({ node, path, selectedOpenings, expandedPaths, onToggle }) {
+// Format a White‑POV eval from /api/openings/evals
+function formatEval(e) {
+  if (!e) return null;
+  if (e.error) return "?";
+  if (e.mate !== null && e.mate !== undefined) return `#${e.mate}`;
+  if (e.cp === null || e.cp === undefined) return null;
+  return (e.cp > 0 ? "+" : "") + (e.cp / 100).toFixed(2);
+}
+
+function TreeNode({ node, path, selectedOpenings, expandedPaths, onToggle, evaluation }) {
   const [kids, setKids] = useState([]);
+  const [evals, setEvals] = useState({});
   const [manualOpen, setManualOpen] = useState();
 
   // Should this node auto‑open because of a search “deep‑navigate”?
@@ -27,6 +37,35 @@ function TreeNode({ node, path, selectedOpenings, expandedPaths, onToggle }) {
       .then(d => setKids(d.children));
   }, [isOpen, path]);
 
+  // Stream engine evals of the children as each one finishes
+  useEffect(() => {
+    if (!isOpen) return;
+    const controller = new AbortController();
+    fetch(
+      `/api/openings/evals?` + path.map(p => `path[]=${p}`).join("&"),
+      { signal: controller.signal }
+    )
+      .then(async r => {
+        const reader = r.body.getReader();
+        const decoder = new TextDecoder();
+        let buf = "";
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buf += decoder.decode(value, { stream: true });
+          const lines = buf.split("\n");
+          buf = lines.pop();
+          for (const line of lines) {
+            if (!line) continue;
+            const e = JSON.parse(line);
+            if (e.uci) setEvals(prev => ({ ...prev, [e.uci]: e }));
+          }
+        }
+      })
+      .catch(() => {});
+    return () => controller.abort();
+  }, [isOpen, path.join(",")]);
+
   // Is this exact node selected?
   const isChecked = selectedOpenings.some(
     o => o.path.length === path.length && o.path.every((m,i) => m === path[i])
@@ -54,6 +93,7 @@ function TreeNode({ node, path, selectedOpenings, expandedPaths, onToggle }) {
         />
         {uci}
         {openingName && <small> ({openingName})</small>}
+        {formatEval(evaluation) && <small style={{ marginLeft: 6, color: "#888" }}>{formatEval(evaluation)}</small>}
       </label>
 
       {isOpen && (
@@ -66,6 +106,7 @@ function TreeNode({ node, path, selectedOpenings, expandedPaths, onToggle }) {
               selectedOpenings={selectedOpenings}
               expandedPaths={expandedPaths}
               onToggle={onToggle}
+              evaluation={evals[child.uci]}
             />
           ))}
         </ul>
@@ -0,0 +1,200 @@
+"""Run several Lichess bot accounts in one process.
+
+Each account listed in the config file gets its own event stream, API
+client, move submitter and rate-limit accounting (:class:`BotAccount`).
+The expensive parts are shared by all of them: the opening book (loaded
+once, with its name index, and reloaded in one place) and a single
+:class:`~chess_trainer.engine_pool.EnginePool`. A game borrows an engine only
+for each engine move, so book and exit moves never wait for one and more
+games can run than there are engines. Game metrics carry an ``account``
+label.
+
+The config is JSON::
+
+    {
+      "engines": 4,
+      "accounts": [
+        {"name": "trainerbot1", "token_env": "TRAINERBOT1_TOKEN",
+         "profile": {"chosen_white": ["e4 - King's Pawn Game"], "challenge": 100}},
+        {"name": "trainerbot2", "token_env": "TRAINERBOT2_TOKEN",
+         "profile": {"allowed_username": "someuser"}}
+      ]
+    }
+
+``token`` may be given instead of ``token_env``. ``profile`` takes any
+:class:`~chess_trainer.bot_profile.BotProfile` field.
+
+Run it with ``python -m chess_trainer.supervisor accounts.json``.
+"""
+import argparse
+import copy
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+# When executed directly, add project root so absolute imports work
+if __package__ is None or __package__ == "":
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from chess_trainer import game_archive, game_log, profiling, trainer
+from chess_trainer.accounts import BotAccount
+from chess_trainer.bot_profile import BotProfile
+from chess_trainer.engine_pool import EnginePool
+from opening_book import lichess_openings_explorer
+
+ENGINES = 4  # shared by every account's games, one engine move at a time
+RESTART_DELAY = 5  # seconds before an account's event loop is restarted after a crash
+REPORT_INTERVAL = 300  # seconds between per-account usage reports
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def load_config(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    accounts = config.get("accounts")
+    if not accounts:
+        raise ConfigError(f"{path}: no accounts configured")
+    names = set()
+    for entry in accounts:
+        name = entry.get("name")
+        if not name:
+            raise ConfigError(f"{path}: every account needs a name")
+        if name in names:
+            raise ConfigError(f"{path}: account {name} is listed twice")
+        names.add(name)
+        token = entry.get("token") or os.getenv(entry.get("token_env") or "")
+        if not token:
+            raise ConfigError(f"{path}: no token for account {name} (set token or token_env)")
+        entry["token"] = token
+        try:
+            entry["profile"] = BotProfile(**entry.get("profile", {}))
+        except TypeError as e:
+            raise ConfigError(f"{path}: bad profile for account {name}: {e}")
+    return config
+
+
+class Supervisor:
+    def __init__(self, accounts: List[BotAccount], engines: int = ENGINES, engine_path: Optional[str] = None):
+        self.accounts = accounts
+        self.engines = EnginePool(engine_path or trainer.STOCKFISH_PATH, size=engines)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._games: Dict[Tuple[str, str], threading.Thread] = {}  # by (account, game id)
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        lichess_openings_explorer.watch_book()
+        for account in self.accounts:
+            thread = threading.Thread(target=self._run_account, args=(account,),
+                                      name=f"events-{account.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run_account(self, account: BotAccount) -> None:
+        # an account whose event loop dies is restarted without touching the others
+        while not self._stop.is_set():
+            try:
+                trainer.handle_events(
+                    bot_profile=account.profile,
+                    stop_event=self._stop,
+                    game_runner=lambda game_id, profile: self._start_game(account, game_id, profile),
+                    account=account,
+                )
+            except Exception as e:
+                traceback.print_exc()
+                print(f"[{account.name}] event loop crashed ({e}); restarting in {RESTART_DELAY}s")
+            self._stop.wait(RESTART_DELAY)
+
+    def _start_game(self, account: BotAccount, game_id: str, bot_profile: BotProfile) -> None:
+        # each game gets its own copy: play_game fills in colour and ratings
+        thread = threading.Thread(target=self._play, args=(account, game_id, copy.deepcopy(bot_profile)),
+                                  name=f"game-{account.name}-{game_id}", daemon=True)
+        with self._lock:
+            self._games[(account.name, game_id)] = thread
+        thread.start()
+
+    def _play(self, account: BotAccount, game_id: str, bot_profile: BotProfile) -> None:
+        try:
+            trainer.play_game(game_id, bot_profile, account=account, engines=self.engines)
+        except Exception as e:
+            traceback.print_exc()
+            print(f"[{account.name}] game {game_id} discontinued: {e}")
+        finally:
+            with self._lock:
+                self._games.pop((account.name, game_id), None)
+
+    def games_in_progress(self) -> int:
+        with self._lock:
+            return len(self._games)
+
+    def usage(self) -> List[Dict]:
+        return [account.usage() for account in self.accounts]
+
+    def report(self) -> None:
+        print(f"Supervisor: {self.games_in_progress()} games in progress, "
+              f"{len(self.engines)}/{self.engines.size} engines running")
+        for usage in self.usage():
+            print(f"  [{usage['account']}] {usage['requests']} API requests "
+                  f"({usage['requests_last_minute']} in the last minute), "
+                  f"{usage['rate_limited']} rate limited"
+                  + (f", paused for {usage['paused_s']}s" if usage["paused_s"] else ""))
+
+    def wait(self, report_interval: float = REPORT_INTERVAL) -> None:
+        while not self._stop.wait(report_interval):
+            self.report()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        with self._lock:
+            games = list(self._games.values())
+        deadline = time.monotonic() + timeout
+        for thread in games:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self.engines.close()
+        for account in self.accounts:
+            account.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run several bot accounts sharing one book and engine pool.")
+    parser.add_argument("config", help="JSON file listing the accounts (see the module docstring)")
+    parser.add_argument("--engines", type=int,
+                        help=f"engine processes shared by all games (default: config value or {ENGINES})")
+    parser.add_argument("--report-interval", type=float, default=REPORT_INTERVAL,
+                        help="seconds between per-account usage reports")
+    trainer.add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+    profiling.configure(mode=args.profile, interval=args.profile_interval)
+    game_log.configure()
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    accounts = [BotAccount(entry["name"], entry["token"], trainer.LICHESS_BASE_URL, entry["profile"])
+                for entry in config["accounts"]]
+    supervisor = Supervisor(accounts, engines=args.engines or config.get("engines", ENGINES))
+    print(f"Supervising {', '.join(a.name for a in accounts)} with {supervisor.engines.size} shared engines")
+    signal.signal(signal.SIGTERM, trainer.interrupt)
+    supervisor.start()
+    try:
+        supervisor.wait(args.report_interval)
+    except KeyboardInterrupt:
+        print("Exiting")
+    finally:
+        supervisor.report()
+        supervisor.stop()
+        game_archive.close()
+        game_log.shutdown()
+
+
+if __name__ == "__main__":
+    main()
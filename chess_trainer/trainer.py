@@ -1,18 +1,18 @@
 #!/usr/bin/env python3
 import os
 import sys
+import argparse
+import copy
+import logging
+import queue
+import random
 import shutil
+import signal
 import threading
 import time
 import traceback
-from typing import Optional
-
-# ---- new imports for retry logic ----
-import requests
-from requests import HTTPError
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from tenacity import retry, stop_after_attempt, wait_random_exponential
+from contextlib import contextmanager
+from typing import Callable, Optional, Union
 
 import webbrowser
 from berserk.exceptions import ResponseError
@@ -39,13 +39,30 @@ try:
 except ImportError:
     chess = None
 
+from chess_trainer.accounts import BotAccount
 from chess_trainer.bot_profile import BotProfile
+from chess_trainer.engine_pool import EnginePool, NoEngineFree
+from chess_trainer import engine_search, game_archive, game_log, metrics, profiling
+from chess_trainer.game_workers import GameWorkerPool
+from chess_trainer.prefetch import BookPrefetcher
 from opening_book import lichess_openings_explorer
+from opening_book.exits import load_exit_table
+
+# named explicitly: run with ``-m`` this module is ``__main__``, outside the configured loggers
+logger = logging.getLogger("chess_trainer.trainer")
 
 load_dotenv()
 API_TOKEN = os.getenv("LICHESS_BOT_TOKEN")
 OUR_NAME = os.getenv("LICHESS_BOT_NAME")
+# Point at a local stand-in (see loadtest/fake_lichess.py) for offline load tests
+LICHESS_BASE_URL = os.getenv("LICHESS_BASE_URL", "https://lichess.org")
 TIME_PER_MOVE = 2
+ENGINE_WAIT = 5  # seconds to wait for a free engine from a shared pool before playing a random move
+# "fixed" thinks for TIME_PER_MOVE on every engine move; "analysis" stops once the
+# best move is clear and caps the budget by the clock (see engine_search.py)
+ENGINE_MODE = os.getenv("ENGINE_MODE", "fixed").lower()
+GAME_STREAM_BACKOFF = 0.25  # seconds before the second reconnect attempt, doubled after that
+GAME_STREAM_MAX_BACKOFF = 4
 
 def find_stockfish_binary() -> str:
     env_path = os.getenv("STOCKFISH_PATH")
@@ -63,150 +80,353 @@ def find_stockfish_binary() -> str:
 
 STOCKFISH_PATH = find_stockfish_binary()
 
-# ---- set up berserk with a retrying session ----
-if berserk is not None and API_TOKEN:
-    # create a requests.Session with retries
-    base_session = requests.Session()
-    retry_strategy = Retry(
-        total=5,
-        backoff_factor=0.5,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["HEAD", "GET", "OPTIONS", "POST"],
-        raise_on_status=False,
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    base_session.mount("http://", adapter)
-    base_session.mount("https://", adapter)
+# Precomputed moves for the first positions after the book (opening_book/exits.py)
+EXITS_PATH = os.getenv("OPENING_EXITS_PATH", "opening_exits.json")
+EXIT_MOVES = 3  # out-of-book moves per game answered from the table before the engine takes over
+try:
+    exit_table = load_exit_table(EXITS_PATH)
+except (OSError, ValueError) as e:
+    print(f"Ignoring exits table {EXITS_PATH}: {e}")
+    exit_table = None
 
-    # TokenSession wraps base_session internally; we monkey‑patch it:
-    token_sess = berserk.TokenSession(API_TOKEN)
-    token_sess.session = base_session
+# Book answers to the opponent's likely replies are worked out while they think
+PREFETCH_REPLIES = int(os.getenv("BOOK_PREFETCH_REPLIES", "4"))  # 0 disables prefetching
+PREFETCH_EXPLORER = os.getenv("BOOK_PREFETCH_EXPLORER", "1") == "1"  # rank from the explorer off-book
 
-    session = token_sess
-    client = berserk.Client(session=session)
+# ---- the Lichess login from the environment (see accounts.py) ----
+if berserk is not None and API_TOKEN:
+    default_account = BotAccount(OUR_NAME, API_TOKEN, LICHESS_BASE_URL)
+    session, client, submitter = default_account.session, default_account.client, default_account.submitter
 else:
-    session = client = None
+    default_account = session = client = submitter = None
 
 ###############################################
 #   Robust streaming helpers with backoff
 ###############################################
 
-def robust_stream_incoming_events():
+def _labels(account: Optional[BotAccount]) -> dict:
+    # metric labels for games of a supervised account; none for the default login
+    return {"account": account.name} if account is not None else {}
+
+def robust_stream_incoming_events(account: Optional[BotAccount] = None):
+    acct = account or default_account
     backoff = 5
     while True:
+        acct.wait_if_limited()
         try:
-            for event in client.bots.stream_incoming_events():
+            for event in acct.client.bots.stream_incoming_events():
                 yield event
             backoff = 5
         except Exception as e:
             print(f"[stream_incoming_events] error: {e}; reconnecting in {backoff}s")
+            metrics.STREAM_RECONNECTS.inc(stream="events", **_labels(account))
             time.sleep(backoff)
             backoff = min(backoff * 2, 60)
 
-def robust_stream_game_state(game_id):
-    backoff = 5
+def robust_stream_game_state(game_id, on_reconnect=None, account: Optional[BotAccount] = None):
+    # Game streams are time-critical: reconnect at once, then back off briefly
+    # with jitter so a flapping connection doesn't hammer the server
+    acct = account or default_account
+    attempt = 0
     while True:
         try:
-            for ev in client.bots.stream_game_state(game_id):
+            for ev in acct.client.bots.stream_game_state(game_id):
+                # every connection opens with a gameFull, so only a later event shows it stayed up
+                if ev.get("type") != "gameFull":
+                    attempt = 0
                 yield ev
-            backoff = 5
+            error = "stream closed"
         except Exception as e:
-            print(f"[stream_game_state] error: {e}; reconnecting in {backoff}s")
-            time.sleep(backoff)
-            backoff = min(backoff * 2, 60)
+            error = e
+        delay = 0 if attempt == 0 else random.uniform(0.5, 1.5) * min(
+            GAME_STREAM_BACKOFF * 2 ** (attempt - 1), GAME_STREAM_MAX_BACKOFF)
+        logger.warning(f"[stream_game_state] {game_id}: {error}; reconnecting in {delay:.2f}s")
+        metrics.STREAM_RECONNECTS.inc(stream="game", **_labels(account))
+        if on_reconnect:
+            on_reconnect()
+        time.sleep(delay)
+        attempt += 1
+
+def sync_board(board, moves) -> int:
+    # Bring ``board`` in line with the stream's move list without replaying the
+    # whole game: keep the common prefix (dropping optimistic moves the stream
+    # doesn't show yet) and push the rest. Returns the number of moves pushed.
+    stack = board.move_stack
+    common = 0
+    while common < len(stack) and common < len(moves) and stack[common].uci() == moves[common]:
+        common += 1
+    for _ in range(len(stack) - common):
+        board.pop()
+    for uci in moves[common:]:
+        board.push_uci(uci)
+    return len(moves) - common
 
 ###############################################
-#   Decorated move sender with retry
+#   Non-blocking move submission
 ###############################################
 
-@retry(stop=stop_after_attempt(3), wait=wait_random_exponential(multiplier=1, max=10))
-def make_move_on_board(board, game_id, chosen_move_uci):
+# Moves go out over each account's own pooled session with strict timeouts
+# (move_submitter.py); the game loop pushes the move locally and keeps
+# reading the stream meanwhile.
+MAX_SUBMIT_FAILURES = 2  # per ply, re-played at once; after that only every SUBMIT_RETRY_DELAY seconds
+SUBMIT_RETRY_DELAY = 1.0
+
+def stream_to_queue(stream, events: "queue.Queue", stop: threading.Event) -> None:
+    # Reader thread: forward game-stream events until the game is over or
+    # ``stop`` is set; None marks the end of the stream
     try:
-        client.bots.make_move(game_id, chosen_move_uci)
-    except ResponseError as e:
-        print(f"Could not make move {chosen_move_uci}: {e}; retrying...")
-        raise
-    except HTTPError as e:
-        print(f"Lichess returned error: {e}. Won't retry, moving on to the next game!")
-        return
-    board.push_uci(chosen_move_uci)
+        for ev in stream:
+            events.put(ev)
+            state = ev.get("state", ev) if ev.get("type") == "gameFull" else ev
+            if stop.is_set() or state.get("status", "started") != "started":
+                break
+    finally:
+        events.put(None)
 
 ###############################################
 #   Core Bot Logic
 ###############################################
 
-def play_game(game_id, bot_profile: BotProfile):
-    # print("in play_game, bot_profile=", bot_profile)
-    engine = chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH)
-    stream = robust_stream_game_state(game_id)
-
-    # handle initial state
-    start = next(stream)
-    bot_profile.determine_color_and_opp_rating(start) # TODO could be run implicitly before play_game?
-    print(f"Playing as {'White' if bot_profile.our_color else 'Black'} vs {bot_profile.opp_rating}")
-    bot_profile.opp_rating = max(1320, min(3190, bot_profile.opp_rating + bot_profile.challenge))
-    engine.configure({
-        "UCI_LimitStrength": True,
-        "UCI_Elo": bot_profile.opp_rating,
-        "Threads": 4
-    })
-
-    # rebuild board
-    init_moves = start.get("state", {}).get("moves", "").split()
-    board = chess.Board()
-    for idx, uci in enumerate(init_moves, start=1):
-        board.push_uci(uci)
+@contextmanager
+def engine_for_move(engine, engines: Optional[EnginePool], options: Optional[dict]):
+    # The game's own engine, or one borrowed from a shared pool for this move only
+    if engines is None:
+        yield engine
+        return
+    with engines.engine(timeout=ENGINE_WAIT) as borrowed:
+        if options:
+            borrowed.configure(options)  # the previous borrower may have played at another strength
+        yield borrowed
+
+@game_log.sampled_move()  # one sampling decision covers every DEBUG dump of the move
+def play_our_move(board, game_id, bot_profile: BotProfile, engine, game_metrics, events=None, prefetcher=None,
+                  book=None, clock=None, search_stats=None, account: Optional[BotAccount] = None,
+                  record: Optional[game_archive.GameRecord] = None, engines: Optional[EnginePool] = None,
+                  engine_options: Optional[dict] = None):
+    submitter = (account or default_account).submitter
+    ply = len(board.move_stack)
+    if submitter.pending(game_id, ply):
+        return  # already sent for this ply; the ack or the stream will catch up
+    started = time.perf_counter()
+    with game_metrics.span("book_lookup"):
+        ready, chosen = prefetcher.take(board) if prefetcher is not None else (False, None)
+        if not ready:
+            chosen = lichess_openings_explorer.get_book_move(board, bot_profile, book=book)
+    source = "book"
+    if not chosen and exit_table is not None and game_metrics.played("exit") < EXIT_MOVES \
+            and not game_metrics.played("engine"):
+        with game_metrics.span("exit_lookup"):
+            chosen = exit_table.choose_move(board, bot_profile.opp_rating)
+        source = "exit"
+    if not chosen:
+        source = "engine"
+        try:
+            with game_metrics.span("engine_play"), engine_for_move(engine, engines, engine_options) as move_engine:
+                if ENGINE_MODE == "analysis":
+                    budget = engine_search.clock_budget(clock or {}, board.turn, TIME_PER_MOVE)
+                    result = engine_search.search(move_engine, board, budget)
+                    if search_stats is not None:
+                        search_stats.add(result)
+                    chosen = result.move.uci()
+                else:
+                    # engine_move.move should always be valid here
+                    chosen = move_engine.play(board, limit=chess.engine.Limit(time=TIME_PER_MOVE)).move.uci()
+        except NoEngineFree:
+            # a weak move beats losing on time while every shared engine is busy
+            logger.warning(f"No engine free within {ENGINE_WAIT}s; playing a random move")
+            source = "fallback"
+            chosen = random.choice(list(board.legal_moves)).uci()
+    with game_metrics.span("make_move"):
+        future = submitter.submit(game_id, ply, chosen, game_metrics)
+        board.push_uci(chosen)
+    if events is not None:
+        def on_done(f, uci=chosen):
+            if f.exception() is not None:
+                events.put({"type": "moveFailed", "ply": ply, "uci": uci, "error": str(f.exception())})
+        future.add_done_callback(on_done)
+    # only worth guessing ahead while we're still in the book
+    if prefetcher is not None and source == "book":
+        prefetcher.schedule(board)
+    game_metrics.move_played(source)
+    if record is not None:
+        record.our_move(ply, chosen, source, time.perf_counter() - started)
+    logger.info(f"-> ({source}) {chosen}")
+
+@profiling.profiled("game", name_from=lambda game_id, *args, **kwargs: game_id)
+def play_game(game_id, bot_profile: BotProfile, engine=None, account: Optional[BotAccount] = None,
+              engines: Optional[EnginePool] = None):
+    # everything logged while the game runs goes to its own log file (see game_log.py)
+    with game_log.game_context(game_id, account.name if account is not None else None):
+        _play_game(game_id, bot_profile, engine, account, engines)
+
+def _play_game(game_id, bot_profile: BotProfile, engine, account: Optional[BotAccount],
+               engines: Optional[EnginePool] = None):
+    # a borrowed engine is left running afterwards; with a shared pool (``engines``, e.g. the
+    # supervisor's) an engine is borrowed for each engine move only, so book moves never wait for one
+    own_engine = engine is None and engines is None
+    acct = account or default_account
+    submitter = acct.submitter
+    game_metrics = metrics.start_game(game_id, account.name if account is not None else None)
+    if own_engine:
+        engine = chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH)
+    events: "queue.Queue" = queue.Queue()
+    stop_reading = threading.Event()
+    reader = threading.Thread(
+        target=stream_to_queue,
+        args=(robust_stream_game_state(game_id, on_reconnect=game_metrics.reconnected, account=account),
+              events, stop_reading),
+        name=f"game-stream-{game_id}", daemon=True)
+    reader.start()
+    failures = {}
+    prefetcher = None
+    clock = None  # latest gameState, for the clock-derived engine budget
+    book = None
+    search_stats = engine_search.SearchStats()
+    record = game_archive.GameRecord(game_id, account.name if account is not None else None)
 
-    # if it's our turn
-    if board.turn == bot_profile.our_color:
-        chosen = lichess_openings_explorer.get_book_move(board, bot_profile)
-        if not chosen:
-            move = engine.play(board, limit=chess.engine.Limit(time=TIME_PER_MOVE)).move.uci()
-            make_move_on_board(board, game_id, move)
-            print(f"-> (engine) {move}")
+    try:
+        # handle initial state
+        with game_metrics.span("stream_receive"):
+            start = events.get()
+        if start is None:
+            return
+        bot_profile.determine_color_and_opp_rating(start, our_name=acct.name) # TODO could be run implicitly before play_game?
+        logger.info(f"Playing as {'White' if bot_profile.our_color else 'Black'} vs {bot_profile.opp_rating}")
+        bot_profile.opp_rating = max(1320, min(3190, bot_profile.opp_rating + bot_profile.challenge))
+        # the book for the rating the bot plays at; the whole game uses it as it was at the start,
+        # even if it's reloaded meanwhile
+        book = lichess_openings_explorer.current_book(bot_profile.opp_rating)
+        record.start(start, bot_profile.our_color, bot_profile.opp_rating, book)
+        engine_options = {
+            "UCI_LimitStrength": True,
+            "UCI_Elo": bot_profile.opp_rating,
+            "Threads": 4
+        }
+        if engine is not None:
+            engine.configure(engine_options)
+        if PREFETCH_REPLIES > 0 and lichess_openings_explorer.book_available():
+            prefetcher = BookPrefetcher(bot_profile, game_metrics, replies=PREFETCH_REPLIES,
+                                        explorer=PREFETCH_EXPLORER, book=book)
+
+        # rebuild board
+        clock = start.get("state", {})
+        board = chess.Board()
+        moves = clock.get("moves", "").split()
+        with game_metrics.span("board_sync"):
+            sync_board(board, moves)
+        record.sync(moves, clock)
+        submitter.confirm(game_id, len(board.move_stack))
+
+        # if it's our turn
+        if board.turn == bot_profile.our_color:
+            play_our_move(board, game_id, bot_profile, engine, game_metrics, events, prefetcher, book,
+                          clock, search_stats, account, record, engines, engine_options)
         else:
-            make_move_on_board(board, game_id, chosen)
-            print(f"-> (book) {chosen}")
-    else:
-        print("Waiting for opponent...")
-
-    # main loop
-    for ev in stream:
-        # only care about game-state updates
-        if ev.get("type") != "gameState":
-            continue
-
-        # if the game is no longer 'started', stop here
-        status = ev.get("status")
-        if status != "started":
-            winner = ev.get("winner") or "none"
-            print(f"Game ended: status={status}, winner={winner}")
-            break
-
-        # rebuild the board from the moves string
-        board.reset()
-        for uci in ev["moves"].split():
-            board.push_uci(uci)
+            logger.info("Waiting for opponent...")
+
+        # main loop
+        while True:
+            with game_metrics.span("stream_receive"):
+                ev = events.get()
+            if ev is None:
+                break
+
+            if ev.get("type") == "moveFailed":
+                ply = ev["ply"]
+                logger.warning(f"Could not make move {ev['uci']}: {ev['error']}")
+                failures[ply] = failures.get(ply, 0) + 1
+                # take our optimistic move back, unless a gameState already did or the stream moved on
+                if len(board.move_stack) == ply + 1 and board.peek().uci() == ev["uci"]:
+                    board.pop()
+                if len(board.move_stack) == ply and board.turn == bot_profile.our_color:
+                    # nobody else will move here: the stream stays quiet until we do
+                    if failures[ply] < MAX_SUBMIT_FAILURES:
+                        play_our_move(board, game_id, bot_profile, engine, game_metrics, events, prefetcher, book,
+                                      clock, search_stats, account, record, engines, engine_options)
+                    else:
+                        logger.warning(f"Move {ply} failed {failures[ply]} times; trying again in "
+                                       f"{SUBMIT_RETRY_DELAY}s")
+                        retry = threading.Timer(SUBMIT_RETRY_DELAY, events.put, ({"type": "retryMove", "ply": ply},))
+                        retry.daemon = True
+                        retry.start()
+                continue
 
-        # if it’s our turn, pick and send a move
-        if board.turn == bot_profile.our_color:
-            chosen = lichess_openings_explorer.get_book_move(board, bot_profile)
-            if not chosen:
-                engine_move = engine.play(board, limit=chess.engine.Limit(time=TIME_PER_MOVE))
-                # engine_move.move should always be valid here
-                chosen = engine_move.move.uci()
-            make_move_on_board(board, game_id, chosen)
-            print(f"-> {chosen}")
+            if ev.get("type") == "retryMove":
+                if len(board.move_stack) == ev["ply"] and board.turn == bot_profile.our_color:
+                    play_our_move(board, game_id, bot_profile, engine, game_metrics, events, prefetcher, book,
+                                  clock, search_stats, account, record, engines, engine_options)
+                continue
 
-    engine.quit()
+            # a reconnected stream starts over with gameFull; resync from its state
+            resumed = ev.get("type") == "gameFull"
+            if resumed:
+                ev = ev.get("state", {})
+            elif ev.get("type") != "gameState":
+                continue
 
+            moves = ev["moves"].split()
+            record.sync(moves, ev)
+
+            # if the game is no longer 'started', stop here
+            status = ev.get("status")
+            if status != "started":
+                record.finish(status, ev.get("winner"))
+                winner = ev.get("winner") or "none"
+                logger.info(f"Game ended: status={status}, winner={winner}")
+                break
+
+            clock = ev
+            with game_metrics.span("board_sync"):
+                sync_board(board, moves)
+            submitter.confirm(game_id, len(board.move_stack))
+
+            # if it’s our turn, pick and send a move
+            if board.turn == bot_profile.our_color:
+                play_our_move(board, game_id, bot_profile, engine, game_metrics, events, prefetcher, book,
+                              clock, search_stats, account, record, engines, engine_options)
+                if resumed:
+                    game_metrics.resumed("resume_to_move")
+            elif resumed:
+                game_metrics.resumed("resume_to_sync")
+    finally:
+        stop_reading.set()
+        if prefetcher is not None:
+            if prefetcher.hit_rate() is not None:
+                logger.info(f"Book prefetch hit rate: {prefetcher.hit_rate():.0%} "
+                            f"({prefetcher.hits}/{prefetcher.hits + prefetcher.misses})")
+            prefetcher.close()
+        if search_stats.moves:
+            logger.info(f"Engine search: {search_stats.summary()}")
+        if own_engine:
+            engine.quit()
+        submitter.forget(game_id)
+        metrics.finish_game(game_metrics)
+        if record.players:
+            # stored by a background writer; unfinished games (e.g. a lost stream) are kept as "*"
+            game_archive.archive_game(record)
+
+@profiling.profiled("events")
 def handle_events(
-    bot_profile: BotProfile = BotProfile(),
+    bot_profile: Union[BotProfile, Callable[[], BotProfile]] = BotProfile(),
     on_game_start=None,
     stop_event: Optional[threading.Event] = None,
+    game_runner=None,
+    account: Optional[BotAccount] = None,
+    profile_for=None,
 ):
+    # game_runner(game_id, bot_profile) plays the game elsewhere (e.g. GameWorkerPool.play)
+    # and returns at once; by default each game is played here before the next event is read.
+    # profile_for(username) picks a per-trainee profile (or None) for challenges and games;
+    # bot_profile then only covers games against players without one. bot_profile may also
+    # be a callable returning the profile, for a default that changes while events are read.
+    def default_profile() -> BotProfile:
+        return bot_profile() if callable(bot_profile) else bot_profile
+
+    acct = account or default_account
+    client = acct.client
     print("Listening for events now...")
-    for event in robust_stream_incoming_events():
+    lichess_openings_explorer.watch_book()
+    for event in robust_stream_incoming_events(account):
         if stop_event and stop_event.is_set():
             break
         t = event["type"]
@@ -220,9 +440,15 @@ def handle_events(
                 print("Received challenge event without an ID; skipping")
                 continue
 
-            if not bot_profile.is_challenge_allowed(challenger_id):
+            if acct.pause_remaining() > 0:
+                # rate limited: leave it for now rather than spend more requests
+                print(f"Ignoring challenge {challenge_id} while rate limited")
+                continue
+
+            profile = profile_for(challenger_id) if profile_for is not None else default_profile()
+            if profile is None or not profile.is_challenge_allowed(challenger_id):
                 name = challenger_id or "unknown"
-                allowed_display = bot_profile.allowed_username or "specified user"
+                allowed_display = (profile.allowed_username if profile else None) or "specified user"
                 print(
                     f"Declining challenge from {name}; "
                     f"only accepting challenges from {allowed_display}."
@@ -242,36 +468,77 @@ def handle_events(
         elif t == "gameStart":
             game_id = event["game"]["id"]
             print(f"Game started: {game_id}")
+            game_profile = default_profile()
+            if profile_for is not None:
+                # each game gets its own copy: play_game fills in colour and ratings
+                opponent = (event["game"].get("opponent") or {}).get("id")
+                game_profile = copy.deepcopy(profile_for(opponent) or game_profile)
             if on_game_start:
                 try:
                     on_game_start(game_id)
                 except Exception:
                     pass
             try:
-                play_game(game_id, bot_profile)
+                if game_runner is not None:
+                    game_runner(game_id, game_profile)
+                else:
+                    play_game(game_id, game_profile, account=account)
             except Exception as e:
                 traceback.print_exc()
                 print(f"Game discontinued, moving on: {e}")
 
-def main() -> None:
+def add_profiling_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--profile", choices=profiling.MODES,
+                        help="write a profile per game (sample: collapsed stacks, cprofile: .prof)")
+    parser.add_argument("--profile-interval", type=float,
+                        help="seconds between stack samples (default: 0.005)")
+
+def interrupt(signum, frame):
+    # SIGTERM ends the bot like Ctrl-C, so queued games and log records are still written
+    raise KeyboardInterrupt
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run the chess training bot on Lichess.")
+    parser.add_argument("--non-interactive", action="store_true",
+                        help="skip the prompts and browser, using the default profile (e.g. for load tests)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("GAME_WORKERS", "0")),
+                        help="play games in this many worker processes (default: 0, in this process)")
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+    profiling.configure(mode=args.profile, interval=args.profile_interval)
+    game_log.configure()
+
     profile = BotProfile()
-    try:
-        profile.get_openings_choice_from_user()
-    except KeyboardInterrupt:
-        print("Exiting"); return
+    if not args.non_interactive:
+        try:
+            profile.get_openings_choice_from_user()
+        except KeyboardInterrupt:
+            print("Exiting"); return
 
     white, black = profile.get_clean_openings()
     print(f"As White -> {', '.join(white)}; as Black -> {', '.join(black)}")
 
-    try:
-        webbrowser.open(f"https://lichess.org/@/{OUR_NAME}", new=2)
-    except Exception as e:
-        print(f"Couldn't open browser: {e}")
+    if not args.non_interactive:
+        try:
+            webbrowser.open(f"https://lichess.org/@/{OUR_NAME}", new=2)
+        except Exception as e:
+            print(f"Couldn't open browser: {e}")
 
+    workers = None
+    if args.workers > 0:
+        workers = GameWorkerPool(args.workers, profile_mode=args.profile, profile_interval=args.profile_interval)
+        print(f"Playing games in {args.workers} worker processes")
+    signal.signal(signal.SIGTERM, interrupt)
     try:
-        handle_events(bot_profile=profile)
+        handle_events(bot_profile=profile, game_runner=workers.play if workers else None)
     except KeyboardInterrupt:
         print("Exiting")
+    finally:
+        if workers is not None:
+            workers.close(timeout=5)
+        game_archive.close()
+        game_log.shutdown()
 
 if __name__ == "__main__":
     main()
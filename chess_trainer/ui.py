@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import dataclasses
 import threading
+import time
+import traceback
 import webbrowser
-from typing import List, Optional
+from typing import Dict, List, Optional
 import sys
 import os
 
@@ -11,7 +14,7 @@ import os
 if __package__ is None or __package__ == "":
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, Response, request, render_template, jsonify, stream_with_context
 import requests
 import html
 
@@ -25,14 +28,32 @@ import json
 from chess_trainer.trainer import (
     API_TOKEN,
     handle_events,
-    OUR_NAME
+    OUR_NAME,
+    play_game,
+    STOCKFISH_PATH
 )
 from chess_trainer.bot_profile import BotProfile, white_openings, black_openings
+from chess_trainer import evals, game_archive, game_log, metrics
+from chess_trainer.engine_pool import EnginePool
+from opening_book import analytics, lichess_openings_explorer
 
 app = Flask(__name__)
+# Used for challengers without a profile of their own, when it allows anyone
 PROFILE = BotProfile()
+# One profile per trainee, keyed by lowercased Lichess username and applied when
+# their game starts; kept across restarts in TRAINEE_PROFILES_PATH
+TRAINEE_PROFILES_PATH = os.getenv("TRAINEE_PROFILES_PATH", "trainee_profiles.json")
+PROFILES: Dict[str, BotProfile] = {}
+PROFILES_LOCK = threading.Lock()
 EVENT_THREAD: Optional[threading.Thread] = None
 STOP_EVENT: Optional[threading.Event] = None
+# Engines for evaluating the opening tree, started on the first request
+EVAL_ENGINES = int(os.getenv("EVAL_ENGINES", "2"))
+_EVAL_POOL: Optional[EnginePool] = None
+_EVAL_CACHE: Optional[evals.EvalCache] = None
+_EVAL_LOCK = threading.Lock()
+# Most rows a list endpoint returns, whatever ?limit= asks for
+MAX_LIMIT = 1000
 
 def build_options(name_list: List[str], field: str, selected: Optional[List[str]] = None) -> str:
     out = []
@@ -46,6 +67,106 @@ def build_options(name_list: List[str], field: str, selected: Optional[List[str]
         )
     return "\n".join(out)
 
+def load_profiles(path: str = TRAINEE_PROFILES_PATH) -> None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        print(f"Ignoring trainee profiles in {path}: {e}")
+        return
+    with PROFILES_LOCK:
+        for username, fields in saved.items():
+            PROFILES[username] = BotProfile(**fields)
+
+def save_profile(username: str, profile: BotProfile, path: str = TRAINEE_PROFILES_PATH) -> None:
+    with PROFILES_LOCK:
+        PROFILES[username.lower()] = profile
+        saved = {name: dataclasses.asdict(p) for name, p in PROFILES.items()}
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(saved, f, indent=2)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not save trainee profiles to {path}: {e}")
+
+def profile_for(username: Optional[str]) -> Optional[BotProfile]:
+    # The trainee's own profile, else the default one if it takes this challenge
+    with PROFILES_LOCK:
+        profile = PROFILES.get((username or "").lower())
+    if profile is not None:
+        return profile
+    return PROFILE if PROFILE.is_challenge_allowed(username) else None
+
+def profile_from_form(form) -> BotProfile:
+    profile = BotProfile()
+    openings = form.getlist("openings")
+    if openings:
+        profile.chosen_white = openings
+        profile.chosen_black = openings
+    else:
+        profile.chosen_white = form.getlist("white")
+        profile.chosen_black = form.getlist("black")
+    profile.challenge = int(form.get("challenge", "0") or 0)
+    username = (form.get("username", "") or "").strip()
+    profile.allow_all_challengers = bool(form.get("allow_all"))
+    profile.allowed_username = username or None
+
+    color = form.get("color", "random")
+    if color not in {"white", "black", "random"}:
+        color = "random"
+    profile.preferred_color = color
+    return profile
+
+def store_profile(profile: BotProfile) -> None:
+    global PROFILE
+    if profile.allowed_username:
+        save_profile(profile.allowed_username, profile)
+    if profile.allow_all_challengers or not profile.allowed_username:
+        PROFILE = profile
+
+def run_game(game_id: str, bot_profile: BotProfile) -> None:
+    # every trainee's game on its own thread, so one game doesn't hold up the next
+    def play() -> None:
+        try:
+            play_game(game_id, bot_profile)
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Game discontinued, moving on: {e}")
+
+    threading.Thread(target=play, name=f"game-{game_id}", daemon=True).start()
+
+def ensure_listener(on_game_start=None) -> None:
+    # One event stream serves every trainee; saving a profile no longer restarts it, and
+    # the listener reads PROFILE as it is when each challenge or game arrives
+    global EVENT_THREAD, STOP_EVENT
+    if EVENT_THREAD is not None and EVENT_THREAD.is_alive():
+        return
+    STOP_EVENT = threading.Event()
+    EVENT_THREAD = threading.Thread(
+        target=handle_events,
+        kwargs=dict(bot_profile=lambda: PROFILE, on_game_start=on_game_start, stop_event=STOP_EVENT,
+                    game_runner=run_game, profile_for=profile_for),
+        daemon=True,
+    )
+    EVENT_THREAD.start()
+
+def render_index(profile: BotProfile, message: Optional[str] = None) -> str:
+    white = build_options(white_openings, "white", profile.chosen_white)
+    black = build_options(black_openings, "black", profile.chosen_black)
+    return render_template(
+        "index.html",
+        white_options=white,
+        black_options=black,
+        message=message,
+        challenge=profile.challenge,
+        username=profile.allowed_username or "",
+        allow_all=profile.allow_all_challengers,
+        color=profile.preferred_color,
+    )
+
 def create_challenge(username: str, color: str) -> Optional[str]:
     """Send a challenge to ``username`` using the Lichess API."""
     if not API_TOKEN:
@@ -91,10 +212,42 @@ def api_openings():
         "children": get_subtree(node)
     })
 
+def eval_backend():
+    global _EVAL_POOL, _EVAL_CACHE
+    with _EVAL_LOCK:
+        if _EVAL_POOL is None:
+            _EVAL_POOL = EnginePool(STOCKFISH_PATH, size=EVAL_ENGINES, options={"Threads": 1, "Hash": 64})
+            _EVAL_CACHE = evals.EvalCache(evals.EVAL_CACHE_PATH)
+    return _EVAL_POOL, _EVAL_CACHE
+
+@app.route("/api/openings/evals")
+def api_opening_evals():
+    # Engine evals of every child of a tree node, streamed as NDJSON as they finish
+    path = request.args.getlist("path[]")
+    depth = max(1, min(evals.MAX_DEPTH, request.args.get("depth", evals.DEPTH, type=int)))
+    node = load_trie()
+    for move in path:
+        node = node.get("children", {}).get(move, {})
+    children = list(node.get("children", {}))
+    pool, cache = eval_backend()
+
+    def generate():
+        started = time.perf_counter()
+        counts = {"cached": 0, "evaluated": 0, "errors": 0}
+        for result in evals.evaluate_children(path, children, pool, cache, depth):
+            if "error" in result:
+                counts["errors"] += 1
+            else:
+                counts["cached" if result["cached"] else "evaluated"] += 1
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"done": True, **counts, "seconds": round(time.perf_counter() - started, 3)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 @app.route("/api/openings/search")
 def api_search():
     q = request.args.get("q", "")
-    limit = int(request.args.get("limit", 50))
+    limit = max(1, min(MAX_LIMIT, request.args.get("limit", 50, type=int)))
     # reuse your query_db.find_matching_nodes
     from opening_book.query_db import load_trie, find_matching_nodes
     trie = load_trie(OPENING_BOOK_FILE)
@@ -107,91 +260,71 @@ def api_search():
         })
     return jsonify({ "matches": results })
 
+_ANALYTICS_CACHE: dict = {}
+
+def load_analytics() -> List[dict]:
+    # Rows of ``python -m opening_book.analytics``, re-read when the file changes
+    mtime = os.path.getmtime(analytics.ANALYTICS_FILE)
+    if _ANALYTICS_CACHE.get("mtime") != mtime:
+        _ANALYTICS_CACHE.update(mtime=mtime, rows=analytics.read_csv(analytics.ANALYTICS_FILE))
+    return _ANALYTICS_CACHE["rows"]
+
+@app.route("/api/openings/analytics")
+def api_analytics():
+    if not os.path.exists(analytics.ANALYTICS_FILE):
+        return jsonify({"error": "run python -m opening_book.analytics first"}), 404
+    rows = load_analytics()
+    q = request.args.get("q", "").lower()
+    if q:
+        rows = [r for r in rows if q in r["opening"].lower()]
+    sort = request.args.get("sort")
+    if sort in analytics.COLUMNS:
+        rows = sorted((r for r in rows if r[sort] is not None), key=lambda r: r[sort],
+                      reverse=request.args.get("order") == "desc")
+    limit = max(1, min(MAX_LIMIT, request.args.get("limit", 100, type=int)))
+    return jsonify({"openings": rows[:limit]})
+
+@app.route("/metrics")
+def prometheus_metrics():
+    # Prometheus text exposition of the bot's timings and counters
+    return Response(metrics.REGISTRY.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/metrics/games")
+def api_game_metrics():
+    # JSON summaries of the most recently finished games
+    return jsonify({"games": metrics.recent_summaries()})
+
 @app.route("/", methods=["GET", "POST"])
 def index() -> str:
     message: Optional[str] = None
     if request.method == "POST":
-        global EVENT_THREAD, STOP_EVENT
-        openings = request.form.getlist("openings")
-        if openings:
-            PROFILE.chosen_white = openings
-            PROFILE.chosen_black = openings
-        else:
-            PROFILE.chosen_white = request.form.getlist("white")
-            PROFILE.chosen_black = request.form.getlist("black")
-        PROFILE.challenge = int(request.form.get("challenge", "0") or 0)
-        username = (request.form.get("username", "") or "").strip()
-        PROFILE.allow_all_challengers = bool(request.form.get("allow_all"))
-        PROFILE.allowed_username = username or None
-
-        color = request.form.get("color", "random")
-        if color not in {"white", "black", "random"}:
-            color = "random"
-        PROFILE.preferred_color = color
-
+        profile = profile_from_form(request.form)
+        username = profile.allowed_username
         if not username:
             message = "Please provide a username to challenge."
         else:
-            print(PROFILE)
-            url = create_challenge(username, PROFILE.preferred_color)
+            print(profile)
+            store_profile(profile)
+            url = create_challenge(username, profile.preferred_color)
             if not url:
                 message = "Failed to create challenge"
             else:
                 webbrowser.open(url)
-
-                if EVENT_THREAD is not None and EVENT_THREAD.is_alive():
-                    if STOP_EVENT is not None:
-                        STOP_EVENT.set()
-                    EVENT_THREAD.join(timeout=0.1)
-
-                STOP_EVENT = threading.Event()
-
-                def on_game_start(game_id: str) -> None:
-                    # webbrowser.open(f"https://lichess.org/{game_id}")
-                    pass # we already open the challenge above when we get the url back, so no need to open twice
-
-                EVENT_THREAD = threading.Thread(
-                    target=handle_events,
-                    args=(PROFILE, on_game_start, STOP_EVENT),
-                    daemon=True,
-                )
-                EVENT_THREAD.start()
+                # we already open the challenge above when we get the url back, so no need
+                # to open the game again when it starts
+                ensure_listener()
                 message = "Challenge sent!"
+        return render_index(profile, message)
 
-    white = build_options(white_openings, "white", PROFILE.chosen_white)
-    black = build_options(black_openings, "black", PROFILE.chosen_black)
-    return render_template(
-        "index.html",
-        white_options=white,
-        black_options=black,
-        message=message,
-        challenge=PROFILE.challenge,
-        username=PROFILE.allowed_username or "",
-        allow_all=PROFILE.allow_all_challengers,
-        color=PROFILE.preferred_color,
-    )
+    # ?username= shows that trainee's saved settings
+    profile = profile_for(request.args.get("username")) or PROFILE
+    return render_index(profile, message)
 
 @app.route("/profile", methods=["POST"])
 def profile() -> str:
     """Save settings and open the bot profile page in the user's browser."""
-    global EVENT_THREAD, STOP_EVENT
-
-    openings = request.form.getlist("openings")
-    if openings:
-        PROFILE.chosen_white = openings
-        PROFILE.chosen_black = openings
-    else:
-        PROFILE.chosen_white = request.form.getlist("white")
-        PROFILE.chosen_black = request.form.getlist("black")
-    PROFILE.challenge = int(request.form.get("challenge", "0") or 0)
-    username = (request.form.get("username", "") or "").strip()
-    PROFILE.allow_all_challengers = bool(request.form.get("allow_all"))
-    PROFILE.allowed_username = username or None
-
-    color = request.form.get("color", "random")
-    if color not in {"white", "black", "random"}:
-        color = "random"
-    PROFILE.preferred_color = color
+    profile = profile_from_form(request.form)
+    store_profile(profile)
 
     url = f"https://lichess.org/@/{OUR_NAME}"
     try:
@@ -199,38 +332,27 @@ def profile() -> str:
     except Exception:
         pass
 
-    if EVENT_THREAD is not None and EVENT_THREAD.is_alive():
-        if STOP_EVENT is not None:
-            STOP_EVENT.set()
-        EVENT_THREAD.join(timeout=0.1)
-
-    STOP_EVENT = threading.Event()
+    ensure_listener()
+    return render_index(profile, "Bot profile saved, ready for challenges!")
 
-    EVENT_THREAD = threading.Thread(
-        target=handle_events,
-        args=(PROFILE, None, STOP_EVENT),
-        daemon=True,
-    )
-    EVENT_THREAD.start()
-
-    white = build_options(white_openings, "white", PROFILE.chosen_white)
-    black = build_options(black_openings, "black", PROFILE.chosen_black)
-    return render_template(
-        "index.html",
-        white_options=white,
-        black_options=black,
-        message="Bot profile saved, ready for challenges!",
-        challenge=PROFILE.challenge,
-        username=PROFILE.allowed_username or "",
-        allow_all=PROFILE.allow_all_challengers,
-        color=PROFILE.preferred_color,
-    )
+@app.route("/api/profiles")
+def api_profiles():
+    # Saved trainee profiles and the compiled-repertoire cache they share
+    with PROFILES_LOCK:
+        profiles = {name: {"white": p.chosen_white, "black": p.chosen_black, "challenge": p.challenge,
+                           "color": p.preferred_color} for name, p in PROFILES.items()}
+    return jsonify({"profiles": profiles, "compiled_cache": lichess_openings_explorer.compiled_cache_info()})
 
 def run_server() -> None:
     """Start the frontend server and launch the default browser."""
+    game_log.configure()
+    load_profiles()
     threading.Timer(1, lambda: webbrowser.open("http://localhost:8000/")).start() # timer of 1 so we don't see a "connection refused" before Flask starts serving
 
-    app.run(host="localhost", port=8000)
+    try:
+        app.run(host="localhost", port=8000)
+    finally:
+        game_archive.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+"""Local stand-in for the Lichess opening explorer.
+
+Serves ``/masters`` (and ``/lichess``) from an opening-book trie, either a
+recorded book written by the crawler (plain, gzipped or compact) or a
+synthetic one, so the crawler can be run and timed offline. Responses can be
+delayed and a share of requests answered with ``429`` plus a ``Retry-After``
+header. The server counts every request by query and by position, which is
+how the crawler benchmark measures wasted work. Point clients at it with
+``LICHESS_EXPLORER_URL=http://127.0.0.1:<port>``.
+
+    python -m loadtest.fake_explorer --book opening_book.json --latency 0.05 0.2 --rate-limit 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import chess
+
+from opening_book.query_db import load_trie
+from opening_book.synthetic import make_synthetic_book
+
+ENDPOINTS = ("/masters", "/lichess")
+
+
+def explorer_response(trie: Dict, play: Optional[str], top_n: Optional[int]) -> Dict:
+    """Build an explorer-shaped response for the position after ``play``."""
+    node = trie
+    for uci in play.split(',') if play else []:
+        node = node.get('children', {}).get(uci)
+        if node is None:
+            return {'white': 0, 'draws': 0, 'black': 0, 'moves': [], 'topGames': [], 'opening': None}
+
+    board = chess.Board()
+    for uci in play.split(',') if play else []:
+        board.push_uci(uci)
+    moves = []
+    for uci, child in node.get('children', {}).items():
+        white, draws, black = child.get('stats') or (0, 0, 0)
+        opening = {'eco': child['eco'], 'name': child['opening_name']} if child.get('opening_name') else None
+        moves.append({'uci': uci, 'san': board.san(chess.Move.from_uci(uci)),
+                      'white': white, 'draws': draws, 'black': black,
+                      'averageRating': 2400, 'opening': opening})
+    moves.sort(key=lambda m: m['white'] + m['draws'] + m['black'], reverse=True)
+    if top_n is not None:
+        moves = moves[:top_n]
+    white, draws, black = node.get('stats') or (
+        sum(m['white'] for m in moves), sum(m['draws'] for m in moves), sum(m['black'] for m in moves))
+    opening = {'eco': node['eco'], 'name': node['opening_name']} if node.get('opening_name') else None
+    return {'white': white, 'draws': draws, 'black': black, 'moves': moves, 'topGames': [], 'opening': opening}
+
+
+class FakeExplorer:
+    def __init__(self, trie: Dict, latency: Tuple[float, float] = (0.0, 0.0), rate_limit: float = 0.0,
+                 retry_after: float = 1.0, seed: int = 0):
+        self.trie = trie
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.queries: Counter = Counter()  # (endpoint, play, moves) -> successful responses
+        self.positions: Dict[str, str] = {}  # EPD -> first play that reached it
+        self.requests = 0
+        self.rate_limited = 0
+        self.transpositions = 0
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _serve(self, endpoint: str, params: Dict) -> Tuple[int, Dict, Dict]:
+        play = params.get('play', [None])[0]
+        moves = params.get('moves', [None])[0]
+        with self.lock:
+            self.requests += 1
+            limited = self.rate_limit and self.rng.random() < self.rate_limit
+            if limited:
+                self.rate_limited += 1
+        if limited:
+            return 429, {'Retry-After': f'{self.retry_after:g}'}, {'error': 'Too many requests'}
+
+        low, high = self.latency
+        if high > 0:
+            time.sleep(self.rng.uniform(low, high))
+        try:
+            body = explorer_response(self.trie, play, int(moves) if moves else None)
+            board = chess.Board()
+            for uci in play.split(',') if play else []:
+                board.push_uci(uci)
+        except ValueError as e:
+            return 400, {}, {'error': str(e)}
+
+        epd = board.epd()
+        with self.lock:
+            self.queries[(endpoint, play, moves)] += 1
+            first = self.positions.setdefault(epd, play)
+            if first != play:
+                self.transpositions += 1
+        return 200, {}, body
+
+    def report(self) -> Dict:
+        with self.lock:
+            served = sum(self.queries.values())
+            return {
+                'requests': self.requests,
+                'served': served,
+                'unique_queries': len(self.queries),
+                'unique_positions': len(self.positions),
+                # repeats of a query that was already answered successfully
+                'duplicate_requests': served - len(self.queries),
+                # distinct move orders reaching a position already served
+                'transposition_requests': self.transpositions,
+                'rate_limited': self.rate_limited,
+            }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body are separate writes
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path in ENDPOINTS:
+                    status, headers, body = fake._serve(url.path, parse_qs(url.query))
+                else:
+                    status, headers, body = 404, {}, {'error': 'Not found'}
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--book', help='serve this recorded book (default: a synthetic one)')
+    parser.add_argument('--synthetic-depth', type=int, default=5)
+    parser.add_argument('--synthetic-branching', type=int, default=4)
+    parser.add_argument('--latency', type=float, nargs=2, default=(0.0, 0.0), metavar=('MIN', 'MAX'),
+                        help='response delay range in seconds')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='share of requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0,
+                        help='Retry-After seconds sent with each 429')
+
+
+def server_from_args(args: argparse.Namespace) -> FakeExplorer:
+    if args.book:
+        trie = load_trie(args.book)
+    else:
+        trie = make_synthetic_book(depth=args.synthetic_depth, branching=args.synthetic_branching)
+    return FakeExplorer(trie, tuple(args.latency), args.rate_limit, args.retry_after)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Run a local fake of the Lichess opening explorer.')
+    parser.add_argument('--port', type=int, default=8766)
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fake = server_from_args(args)
+    port = fake.start(port=args.port)
+    print(f"Fake explorer listening on http://127.0.0.1:{port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(fake.report(), indent=2))
+    fake.stop()
+
+
+if __name__ == '__main__':
+    main()
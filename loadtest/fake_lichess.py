@@ -0,0 +1,330 @@
+"""Local stand-in for the parts of the Lichess Bot API the trainer uses.
+
+Implements the incoming event stream, the per-game ndjson state stream, move
+submission and challenge accept/decline. A scripted opponent challenges the
+bot ``games`` times at once and answers every bot move with a random legal
+move after a configurable think time; streams can be cut at random to
+exercise the bot's reconnect logic. Point the bot at it with
+``LICHESS_BASE_URL=http://127.0.0.1:<port>``.
+
+    python -m loadtest.fake_lichess --games 4 --think 0.2 1.0 --disconnect-rate 0.05
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import chess
+
+KEEPALIVE_SECONDS = 5
+CLOCK_MS = 600_000
+INCREMENT_MS = 5_000
+
+
+class FakeGame:
+    def __init__(self, game_id: str, bot_id: str, bot_white: bool, opponent: Dict):
+        self.id = game_id
+        self.board = chess.Board()
+        self.bot_color = chess.WHITE if bot_white else chess.BLACK
+        me = {"id": bot_id, "name": bot_id, "rating": 2000}
+        self.white, self.black = (me, opponent) if bot_white else (opponent, me)
+        self.status = "started"
+        self.winner: Optional[str] = None
+        self.version = 0
+        self.cond = threading.Condition()
+        # when it became the bot's turn (None while the opponent is thinking)
+        self.bot_turn_since: Optional[float] = time.perf_counter() if bot_white else None
+
+    def state(self) -> Dict:
+        state = {
+            "type": "gameState",
+            "moves": " ".join(m.uci() for m in self.board.move_stack),
+            "wtime": CLOCK_MS, "btime": CLOCK_MS, "winc": INCREMENT_MS, "binc": INCREMENT_MS,
+            "status": self.status,
+        }
+        if self.winner:
+            state["winner"] = self.winner
+        return state
+
+    def full(self) -> Dict:
+        return {"type": "gameFull", "id": self.id, "rated": False, "initialFen": "startpos",
+                "white": self.white, "black": self.black, "state": self.state()}
+
+    def push(self, move: chess.Move, max_plies: int) -> None:
+        # caller holds ``cond``
+        self.board.push(move)
+        outcome = self.board.outcome()
+        if outcome is not None:
+            self.status = "mate" if outcome.termination == chess.Termination.CHECKMATE else "draw"
+            self.winner = None if outcome.winner is None else ("white" if outcome.winner else "black")
+        elif len(self.board.move_stack) >= max_plies:
+            self.status = "aborted"
+        self.bot_turn_since = time.perf_counter() if self.board.turn == self.bot_color else None
+        self.version += 1
+        self.cond.notify_all()
+
+
+class FakeLichess:
+    def __init__(self, bot_id: str = "trainerbot", games: int = 4, think_time: Tuple[float, float] = (0.2, 1.0),
+                 disconnect_rate: float = 0.0, max_plies: int = 60, seed: int = 0):
+        self.bot_id = bot_id
+        self.num_games = games
+        self.think_time = think_time
+        self.disconnect_rate = disconnect_rate
+        self.max_plies = max_plies
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.events: List[Dict] = []
+        self.events_cond = threading.Condition(self.lock)
+        self.challenges: Dict[str, Dict] = {}
+        self.games: Dict[str, FakeGame] = {}
+        self.move_latencies: List[float] = []
+        self.rejected_moves = 0
+        self.disconnects = 0
+        self.stream_connects = 0
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    # ---- scenario ------------------------------------------------------------------
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        for i in range(self.num_games):
+            cid = f"c{i:07d}"
+            self.challenges[cid] = {"id": f"sparring{i}", "name": f"Sparring{i}", "rating": 1500 + 50 * i}
+            self._emit({"type": "challenge", "challenge": {
+                "id": cid, "challenger": self.challenges[cid], "rated": False,
+                "variant": {"key": "standard"}, "speed": "rapid", "color": "random"}})
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def all_finished(self) -> bool:
+        with self.lock:
+            return len(self.games) == self.num_games and all(
+                g.status != "started" for g in self.games.values())
+
+    def _emit(self, event: Dict) -> None:
+        with self.events_cond:
+            self.events.append(event)
+            self.events_cond.notify_all()
+
+    def _accept(self, cid: str) -> bool:
+        with self.lock:
+            opponent = self.challenges.pop(cid, None)
+            if opponent is None:
+                return False
+            game = FakeGame(f"g{cid[1:]}", self.bot_id, self.rng.random() < 0.5, opponent)
+            self.games[game.id] = game
+        self._emit({"type": "gameStart", "game": {"id": game.id, "gameId": game.id,
+                                                  "opponent": {"id": opponent["id"], "username": opponent["name"],
+                                                               "rating": opponent["rating"]}}})
+        threading.Thread(target=self._opponent, args=(game,), daemon=True).start()
+        return True
+
+    def _opponent(self, game: FakeGame) -> None:
+        while True:
+            with game.cond:
+                while game.status == "started" and game.board.turn == game.bot_color:
+                    game.cond.wait()
+                if game.status != "started":
+                    break
+            time.sleep(self.rng.uniform(*self.think_time))
+            with game.cond:
+                move = self.rng.choice(list(game.board.legal_moves))
+                game.push(move, self.max_plies)
+        with self.lock:
+            if self.finished_at is None and all(g.status != "started" for g in self.games.values()) \
+                    and len(self.games) == self.num_games:
+                self.finished_at = time.perf_counter()
+
+    def _bot_move(self, game_id: str, uci: str) -> Tuple[int, Dict]:
+        game = self.games.get(game_id)
+        if game is None:
+            return 404, {"error": "Not found"}
+        with game.cond:
+            if game.status != "started" or game.board.turn != game.bot_color:
+                self.rejected_moves += 1
+                return 400, {"error": "Not your turn, or game already over"}
+            try:
+                move = chess.Move.from_uci(uci)
+            except ValueError:
+                move = None
+            if move is None or move not in game.board.legal_moves:
+                self.rejected_moves += 1
+                return 400, {"error": f"Illegal move {uci}"}
+            self.move_latencies.append(time.perf_counter() - game.bot_turn_since)
+            game.push(move, self.max_plies)
+        return 200, {"ok": True}
+
+    # ---- reporting -----------------------------------------------------------------
+
+    def report(self) -> Dict:
+        latencies = sorted(self.move_latencies)
+        end = self.finished_at or time.perf_counter()
+        wall = end - self.started_at
+
+        def pct(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            "games": self.num_games,
+            "finished": sum(1 for g in self.games.values() if g.status != "started"),
+            "bot_moves": len(latencies),
+            "wall_s": round(wall, 2),
+            "moves_per_s": round(len(latencies) / wall, 2) if wall else None,
+            "move_latency_ms": {
+                "p50": pct(0.50), "p99": pct(0.99),
+                "mean": round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+                "max": round(latencies[-1] * 1000, 1) if latencies else None,
+            },
+            "rejected_moves": self.rejected_moves,
+            "stream_connects": self.stream_connects,
+            "injected_disconnects": self.disconnects,
+        }
+
+    # ---- HTTP ----------------------------------------------------------------------
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body are separate writes
+
+            def log_message(self, format, *args):  # keep the harness output readable
+                pass
+
+            def _json(self, status: int, body: Dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _start_stream(self) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def _chunk(self, line: str) -> None:
+                data = line.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _end_stream(self) -> None:
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                with fake.lock:
+                    fake.stream_connects += 1
+                if self.path == "/api/stream/event":
+                    return self._event_stream()
+                m = re.fullmatch(r"/api/bot/game/stream/(\w+)", self.path)
+                if m and m.group(1) in fake.games:
+                    return self._game_stream(fake.games[m.group(1)])
+                self._json(404, {"error": "Not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                m = re.fullmatch(r"/api/bot/game/(\w+)/move/(\w+)", self.path)
+                if m:
+                    return self._json(*fake._bot_move(m.group(1), m.group(2)))
+                m = re.fullmatch(r"/api/challenge/(\w+)/(accept|decline)", self.path)
+                if m:
+                    if m.group(2) == "decline":
+                        with fake.lock:
+                            fake.challenges.pop(m.group(1), None)
+                        return self._json(200, {"ok": True})
+                    ok = fake._accept(m.group(1))
+                    return self._json(200 if ok else 404, {"ok": ok})
+                self._json(404, {"error": "Not found"})
+
+            def _event_stream(self) -> None:
+                self._start_stream()
+                sent = 0
+                try:
+                    while True:
+                        with fake.events_cond:
+                            if sent == len(fake.events):
+                                fake.events_cond.wait(KEEPALIVE_SECONDS)
+                            pending = fake.events[sent:]
+                            sent = len(fake.events)
+                        for event in pending:
+                            self._chunk(json.dumps(event) + "\n")
+                        if not pending:
+                            self._chunk("\n")
+                except OSError:
+                    pass
+
+            def _game_stream(self, game: FakeGame) -> None:
+                self._start_stream()
+                try:
+                    with game.cond:
+                        line, seen, status = game.full(), game.version, game.status
+                    self._chunk(json.dumps(line) + "\n")
+                    while status == "started":
+                        with game.cond:
+                            if game.version == seen:
+                                game.cond.wait(KEEPALIVE_SECONDS)
+                            changed = game.version != seen
+                            if changed:
+                                line, seen, status = game.state(), game.version, game.status
+                        if not changed:
+                            self._chunk("\n")
+                            continue
+                        if fake.disconnect_rate and fake.rng.random() < fake.disconnect_rate:
+                            with fake.lock:
+                                fake.disconnects += 1
+                            self.close_connection = True
+                            return  # drop the stream without the terminating chunk
+                        self._chunk(json.dumps(line) + "\n")
+                    self._end_stream()
+                except OSError:
+                    pass
+
+        return Handler
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run a local fake of the Lichess Bot API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--bot-id", default="trainerbot", help="must match LICHESS_BOT_NAME of the bot")
+    parser.add_argument("--games", type=int, default=4)
+    parser.add_argument("--think", type=float, nargs=2, default=(0.2, 1.0), metavar=("MIN", "MAX"))
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--max-plies", type=int, default=60)
+    args = parser.parse_args(argv)
+
+    fake = FakeLichess(args.bot_id, args.games, tuple(args.think), args.disconnect_rate, args.max_plies)
+    port = fake.start(port=args.port)
+    print(f"Fake Lichess listening on http://127.0.0.1:{port}")
+    try:
+        while not fake.all_finished():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(fake.report(), indent=2))
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
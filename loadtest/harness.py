@@ -0,0 +1,124 @@
+"""End-to-end load test: the real bot process against the fake Lichess server.
+
+Starts :class:`loadtest.fake_lichess.FakeLichess`, launches
+``python -m chess_trainer.trainer --non-interactive`` pointed at it, waits
+until every scripted game is over (or ``--timeout``) and reports moves/sec,
+p50/p99 move latency as seen by the server, and the bot process's CPU time
+and peak RSS (including its Stockfish children once they have exited).
+``--engine random`` swaps Stockfish for :mod:`loadtest.random_engine` so the
+numbers show the bot's own overhead.
+
+    python -m loadtest.harness --games 4 --think 0.1 0.5 --disconnect-rate 0.02
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, Optional
+
+from loadtest.fake_lichess import FakeLichess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RANDOM_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "random_engine.py")
+
+
+def _proc_sample(pid: int) -> Optional[Dict]:
+    # Linux only: CPU seconds and RSS of ``pid`` from /proc
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    except (OSError, StopIteration, IndexError):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return {"cpu_s": (int(fields[11]) + int(fields[12])) / ticks, "rss_mb": rss_kb / 1024}
+
+
+def run(games: int, think: tuple, disconnect_rate: float, max_plies: int, timeout: float,
+        engine: str = "stockfish", bot_args: Optional[list] = None, bot_log: Optional[str] = None) -> Dict:
+    bot_id = "loadtestbot"
+    fake = FakeLichess(bot_id=bot_id, games=games, think_time=think,
+                       disconnect_rate=disconnect_rate, max_plies=max_plies)
+    port = fake.start()
+
+    env = dict(os.environ,
+               LICHESS_BASE_URL=f"http://127.0.0.1:{port}",
+               LICHESS_BOT_TOKEN="loadtest-token",
+               LICHESS_BOT_NAME=bot_id,
+               PYTHONUNBUFFERED="1")
+    if engine == "random":
+        env["STOCKFISH_PATH"] = RANDOM_ENGINE
+    cmd = [sys.executable, "-m", "chess_trainer.trainer", "--non-interactive"] + (bot_args or [])
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    log = open(bot_log, "w") if bot_log else subprocess.DEVNULL
+    bot = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.PIPE)
+
+    peak_rss = 0.0
+    last_cpu = None
+    deadline = time.time() + timeout
+    try:
+        while time.time() < deadline and not fake.all_finished():
+            if bot.poll() is not None:
+                break
+            sample = _proc_sample(bot.pid)
+            if sample:
+                peak_rss = max(peak_rss, sample["rss_mb"])
+                last_cpu = sample["cpu_s"]
+            time.sleep(0.25)
+    finally:
+        exited_early = bot.poll() is not None
+        if not exited_early:
+            bot.terminate()
+        try:
+            _, stderr = bot.communicate(timeout=10)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+            _, stderr = bot.communicate()
+        fake.stop()
+        if bot_log:
+            log.close()
+
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    report = fake.report()
+    report["timed_out"] = not fake.all_finished() and not exited_early
+    report["bot"] = {
+        "exit_code": bot.returncode if exited_early else None,
+        "cpu_s": round(last_cpu, 2) if last_cpu is not None else None,
+        "peak_rss_mb": round(peak_rss, 1),
+        # bot plus every engine it reaped
+        "cpu_s_incl_children": round((usage_after.ru_utime + usage_after.ru_stime)
+                                     - (usage_before.ru_utime + usage_before.ru_stime), 2),
+    }
+    if exited_early:
+        report["bot"]["stderr_tail"] = stderr.decode(errors="replace")[-2000:]
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test the bot against a local fake Lichess.")
+    parser.add_argument("--games", type=int, default=4, help="simultaneous games the opponent starts")
+    parser.add_argument("--think", type=float, nargs=2, default=(0.2, 1.0), metavar=("MIN", "MAX"),
+                        help="opponent think time range in seconds")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0,
+                        help="probability of dropping a game stream on each state update")
+    parser.add_argument("--max-plies", type=int, default=60, help="games are aborted after this many plies")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--engine", choices=("stockfish", "random"), default="stockfish",
+                        help="random: instant random-move engine, to measure the bot without engine think time")
+    parser.add_argument("--bot-log", help="write the bot's stdout to this file")
+    parser.add_argument("bot_args", nargs=argparse.REMAINDER,
+                        help="extra arguments for the bot after '--' (e.g. -- --profile sample)")
+    args = parser.parse_args(argv)
+
+    bot_args = args.bot_args[1:] if args.bot_args[:1] == ["--"] else args.bot_args
+    report = run(args.games, tuple(args.think), args.disconnect_rate, args.max_plies, args.timeout,
+                 args.engine, bot_args, args.bot_log)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Minimal UCI engine that plays a random legal move.
+
+Lets the load-test harness measure the bot's own overhead without Stockfish's
+think time (or without Stockfish installed at all). It advertises the options
+``play_game`` configures and ignores their values. Before ``bestmove`` it
+reports ``MultiPV`` (default 1) random moves with made-up scores as
+analysis lines. ``RANDOM_ENGINE_DELAY`` (seconds) adds a fixed
+think time per move.
+"""
+import os
+import random
+import sys
+import time
+
+import chess
+
+DELAY = float(os.getenv("RANDOM_ENGINE_DELAY", "0"))
+OPTIONS = (
+    "option name Threads type spin default 1 min 1 max 1024",
+    "option name UCI_LimitStrength type check default false",
+    "option name UCI_Elo type spin default 1320 min 1320 max 3190",
+    "option name Hash type spin default 16 min 1 max 33554432",
+    "option name MultiPV type spin default 1 min 1 max 500",
+)
+
+
+def main() -> None:
+    board = chess.Board()
+    rng = random.Random()
+    multipv = 1
+
+    def send(line: str) -> None:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    for line in sys.stdin:
+        parts = line.split()
+        if not parts:
+            continue
+        cmd = parts[0]
+        if cmd == "uci":
+            send("id name RandomMover")
+            for option in OPTIONS:
+                send(option)
+            send("uciok")
+        elif cmd == "setoption" and len(parts) >= 5 and parts[2].lower() == "multipv":
+            multipv = int(parts[4])
+        elif cmd == "isready":
+            send("readyok")
+        elif cmd == "position":
+            if parts[1] == "startpos":
+                board = chess.Board()
+                rest = parts[2:]
+            else:
+                board = chess.Board(" ".join(parts[2:8]))
+                rest = parts[8:]
+            if rest[:1] == ["moves"]:
+                for uci in rest[1:]:
+                    board.push_uci(uci)
+        elif cmd == "go":
+            if DELAY:
+                time.sleep(DELAY)
+            moves = list(board.legal_moves)
+            rng.shuffle(moves)
+            for i, move in enumerate(moves[:multipv], start=1):
+                board.push(move)
+                replies = list(board.legal_moves)
+                pv = f"{move.uci()} {rng.choice(replies).uci()}" if replies else move.uci()
+                board.pop()
+                send(f"info depth 2 multipv {i} score cp {-10 * (i - 1)} pv {pv}")
+            send(f"bestmove {moves[0].uci() if moves else '0000'}")
+        elif cmd == "quit":
+            break
+
+
+if __name__ == "__main__":
+    main()
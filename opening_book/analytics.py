@@ -0,0 +1,229 @@
+"""Per-opening statistics for the whole book, computed in parallel.
+
+Every position belongs to the nearest named opening on its path: its own
+``opening_name`` or the one it inherits from its parent. For each opening the
+command adds up:
+
+- the games and results at the positions where the opening starts
+- how many positions and full lines it spans
+- how deep its lines go, as a leaf-depth distribution
+- how much it branches: average children per inner position
+
+The book is split into the subtrees below ``--split-plies`` and they are
+handed to a process pool; the partial results are merged in the parent. The
+output is a flat CSV (one row per opening) that the web UI serves at
+``/api/openings/analytics``.
+
+    python -m opening_book.analytics --workers 4
+    python -m opening_book.analytics --worst-for black --top 15
+"""
+import argparse
+import csv
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+if __package__ is None or __package__ == "":
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from opening_book import query_db
+from opening_book.crawler import OPENING_BOOK_FILE
+
+ANALYTICS_FILE = "opening_analytics.csv"
+SPLIT_PLIES = 2
+COLUMNS = (
+    "opening", "eco", "entry_ply", "games", "white_score_pct", "black_score_pct", "draw_pct",
+    "positions", "lines", "depth_min", "depth_mean", "depth_max", "depth_hist", "branching_mean",
+)
+
+_TRIE: Optional[dict] = None
+
+
+class Aggregate:
+    """Running totals for one opening; partial aggregates from workers are merged."""
+
+    def __init__(self):
+        self.eco: Optional[str] = None
+        self.entry_ply: Optional[int] = None
+        self.white = self.draws = self.black = 0
+        self.positions = 0
+        self.inner_positions = 0
+        self.children = 0
+        self.leaf_depths: Counter = Counter()
+
+    def merge(self, other: 'Aggregate') -> None:
+        self.eco = self.eco or other.eco
+        if other.entry_ply is not None and (self.entry_ply is None or other.entry_ply < self.entry_ply):
+            self.entry_ply = other.entry_ply
+        self.white += other.white
+        self.draws += other.draws
+        self.black += other.black
+        self.positions += other.positions
+        self.inner_positions += other.inner_positions
+        self.children += other.children
+        self.leaf_depths.update(other.leaf_depths)
+
+    def row(self, name: str) -> Dict:
+        games = self.white + self.draws + self.black
+        lines = sum(self.leaf_depths.values())
+        depths = sorted(self.leaf_depths)
+        return {
+            "opening": name,
+            "eco": self.eco or "",
+            "entry_ply": self.entry_ply,
+            "games": games,
+            "white_score_pct": round(100 * (self.white + self.draws / 2) / games, 2) if games else "",
+            "black_score_pct": round(100 * (self.black + self.draws / 2) / games, 2) if games else "",
+            "draw_pct": round(100 * self.draws / games, 2) if games else "",
+            "positions": self.positions,
+            "lines": lines,
+            "depth_min": depths[0] if depths else "",
+            "depth_mean": round(sum(d * n for d, n in self.leaf_depths.items()) / lines, 2) if lines else "",
+            "depth_max": depths[-1] if depths else "",
+            "depth_hist": ";".join(f"{d}:{self.leaf_depths[d]}" for d in depths),
+            "branching_mean": round(self.children / self.inner_positions, 3) if self.inner_positions else "",
+        }
+
+
+def aggregate_subtree(node: dict, ply: int, inherited: Optional[str], stop_ply: Optional[int] = None,
+                      out: Optional[Dict[str, Aggregate]] = None) -> Dict[str, Aggregate]:
+    """Fold ``node`` (at ``ply``) and everything below it into per-opening aggregates.
+
+    Nodes at ``stop_ply`` and deeper are left out (they are counted as
+    children of their parent but not visited).
+    """
+    out = {} if out is None else out
+    stack: List[Tuple[dict, int, Optional[str]]] = [(node, ply, inherited)]
+    while stack:
+        n, depth, parent_name = stack.pop()
+        own = n.get("opening_name")
+        name = own or parent_name
+        children = n.get("children") or {}
+        if name is not None:
+            agg = out.get(name)
+            if agg is None:
+                agg = out[name] = Aggregate()
+            agg.positions += 1
+            if own and own != parent_name:
+                # the opening starts here: count its games once, not again for every descendant
+                white, draws, black = n.get("stats") or (0, 0, 0)
+                agg.white += white
+                agg.draws += draws
+                agg.black += black
+                agg.eco = agg.eco or n.get("eco")
+                if agg.entry_ply is None or depth < agg.entry_ply:
+                    agg.entry_ply = depth
+            if children:
+                agg.inner_positions += 1
+                agg.children += len(children)
+            else:
+                agg.leaf_depths[depth] += 1
+        if stop_ply is None or depth + 1 < stop_ply:
+            for child in children.values():
+                stack.append((child, depth + 1, name))
+    return out
+
+
+def split_points(trie: dict, plies: int) -> Iterator[Tuple[List[str], Optional[str]]]:
+    # (path, inherited opening name) of every node exactly ``plies`` deep
+    def walk(node: dict, path: List[str], inherited: Optional[str]):
+        if len(path) == plies:
+            yield path, inherited
+            return
+        name = node.get("opening_name") or inherited
+        for uci, child in (node.get("children") or {}).items():
+            yield from walk(child, path + [uci], name)
+
+    yield from walk(trie, [], None)
+
+
+def _init_worker(book_path: str) -> None:
+    # With the fork start method the parent's trie is inherited; otherwise load it
+    global _TRIE
+    if _TRIE is None:
+        _TRIE = query_db.load_trie(book_path)
+
+
+def _aggregate_path(path: List[str], inherited: Optional[str]) -> Dict[str, Aggregate]:
+    return aggregate_subtree(query_db.get_node_by_path(_TRIE, path), len(path), inherited)
+
+
+def analyse_book(trie: dict, book_path: str, workers: int = 1, split_plies: int = SPLIT_PLIES) -> List[Dict]:
+    """Return one row per opening, most played first."""
+    global _TRIE
+    split_plies = max(1, split_plies)
+    totals = aggregate_subtree(trie, 0, None, stop_ply=split_plies)
+    tasks = list(split_points(trie, split_plies))
+    if workers <= 1:
+        partials = [aggregate_subtree(query_db.get_node_by_path(trie, path), len(path), inherited)
+                    for path, inherited in tasks]
+    else:
+        _TRIE = trie
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(book_path,)) as pool:
+                partials = list(pool.map(_aggregate_path, *zip(*tasks),
+                                         chunksize=max(1, len(tasks) // (workers * 4)))) if tasks else []
+        finally:
+            _TRIE = None
+    for partial in partials:
+        for name, agg in partial.items():
+            totals.setdefault(name, Aggregate()).merge(agg)
+
+    rows = [agg.row(name) for name, agg in totals.items()]
+    rows.sort(key=lambda r: (-r["games"], r["opening"]))
+    return rows
+
+
+def write_csv(rows: List[Dict], path: str) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def read_csv(path: str) -> List[Dict]:
+    # Numbers come back as numbers; empty cells (no games, no lines) as None
+    ints = {"entry_ply", "games", "positions", "lines", "depth_min", "depth_max"}
+    floats = {"white_score_pct", "black_score_pct", "draw_pct", "depth_mean", "branching_mean"}
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            for key in ints | floats:
+                value = row.get(key)
+                row[key] = None if value in ("", None) else (int(value) if key in ints else float(value))
+            rows.append(row)
+    return rows
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Compute per-opening statistics for the opening book.')
+    parser.add_argument('--book', default=OPENING_BOOK_FILE)
+    parser.add_argument('--output', default=ANALYTICS_FILE)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--split-plies', type=int, default=SPLIT_PLIES,
+                        help='depth at which the book is split into tasks (default: %(default)s)')
+    parser.add_argument('--worst-for', choices=('white', 'black'),
+                        help='print the openings with the lowest score for this color')
+    parser.add_argument('--min-games', type=int, default=1000, help='with --worst-for: ignore rarer openings')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    trie = query_db.load_trie(args.book)
+    rows = analyse_book(trie, args.book, workers=args.workers, split_plies=args.split_plies)
+    write_csv(rows, args.output)
+    print(f"{len(rows)} openings written to {args.output}")
+
+    if args.worst_for:
+        column = f"{args.worst_for}_score_pct"
+        ranked = sorted((r for r in rows if r["games"] >= args.min_games), key=lambda r: r[column])
+        for r in ranked[:args.top]:
+            print(f"{r[column]:6.2f}%  {r['games']:>9}  {r['opening']}")
+
+
+if __name__ == '__main__':
+    main()
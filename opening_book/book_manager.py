@@ -0,0 +1,166 @@
+"""Hot reloading of the local opening book.
+
+:class:`BookManager` owns the loaded book. A daemon thread polls the book
+file's mtime and size. When they change, it loads the new file and builds its
+name index on a background thread, then swaps it in with a single reference
+assignment, so readers never see a half-built book.
+
+A game calls :meth:`BookManager.current` once at its start and uses that
+:class:`BookSnapshot` until it ends. Games in progress therefore keep a
+consistent book while new games get the refreshed one. Once the last game
+holding an old snapshot finishes, nothing references its trie any more and
+the memory is released.
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Optional, Tuple
+
+from opening_book import query_db
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 5.0  # seconds between mtime checks
+SETTLE_DELAY = 0.2  # seconds to wait before re-reading a book that changed during the initial load
+
+
+class BookSnapshot:
+    """One loaded version of the book: the trie plus the indexes built from it."""
+
+    __slots__ = ("trie", "index", "path", "version", "stat", "loaded_at", "__weakref__")
+
+    def __init__(self, trie: dict, path: Optional[str] = None, version: int = 1,
+                 stat: Optional[Tuple[float, int]] = None):
+        self.trie = trie
+        self.index = query_db.build_name_index(trie)
+        self.path = path
+        self.version = version
+        self.stat = stat
+        self.loaded_at = time.time()
+
+
+def _stat(path: str) -> Optional[Tuple[float, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+class BookManager:
+    def __init__(self, path: str, poll_interval: float = POLL_INTERVAL,
+                 loader: Callable[[str], dict] = query_db.load_trie):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.loader = loader
+        self._snapshot: Optional[BookSnapshot] = None
+        self._lock = threading.Lock()
+        self._loading: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._retired: Dict[int, weakref.ref] = {}  # version -> old snapshot, while games still hold it
+        self._failed_stat: Optional[Tuple[float, int]] = None
+        self.reloads = 0
+
+    @classmethod
+    def from_trie(cls, trie: dict) -> 'BookManager':
+        # A fixed in-memory book (tests, benchmarks); check() never reloads it
+        manager = cls(path="")
+        manager._snapshot = BookSnapshot(trie)
+        return manager
+
+    def current(self) -> Optional[BookSnapshot]:
+        return self._snapshot
+
+    def load(self) -> Optional[BookSnapshot]:
+        """Load the book synchronously (e.g. at startup) and install it.
+
+        A file that is replaced while it loads is read again once it stops
+        changing, so None means the book is missing or unreadable as it stands.
+        """
+        while True:
+            stat = _stat(self.path)
+            snapshot = self._build(stat)
+            if snapshot is not None:
+                self._install(snapshot)
+                return snapshot
+            if stat is None or _stat(self.path) == stat:
+                return None
+            time.sleep(SETTLE_DELAY)
+
+    def _build(self, stat: Optional[Tuple[float, int]]) -> Optional[BookSnapshot]:
+        if stat is None:
+            return None
+        started = time.perf_counter()
+        try:
+            trie = self.loader(self.path)
+        except (OSError, ValueError) as e:
+            # most likely caught the file while it was being written; retried once it changes again
+            logger.warning(f"Could not load opening book {self.path}: {e}")
+            self._failed_stat = stat
+            return None
+        if _stat(self.path) != stat:
+            return None  # changed again while loading; the next poll picks up the final version
+        with self._lock:
+            version = self._snapshot.version + 1 if self._snapshot else 1
+        snapshot = BookSnapshot(trie, self.path, version, stat)
+        logger.info(f"Loaded opening book {self.path} v{version} in {time.perf_counter() - started:.2f}s")
+        return snapshot
+
+    def _install(self, snapshot: BookSnapshot) -> None:
+        with self._lock:
+            old, self._snapshot = self._snapshot, snapshot
+            if old is not None:
+                self.reloads += 1
+                self._retired[old.version] = weakref.ref(old)
+                weakref.finalize(old, logger.info, f"Released opening book v{old.version}")
+
+    def check(self) -> bool:
+        """Start a background reload if the file changed; returns whether one was started."""
+        if not self.path:
+            return False
+        stat = _stat(self.path)
+        with self._lock:
+            current = self._snapshot.stat if self._snapshot else None
+            if stat is None or stat == current or stat == self._failed_stat:
+                return False
+            if self._loading is not None and self._loading.is_alive():
+                return False
+            self._loading = threading.Thread(target=self._reload, args=(stat,),
+                                             name="book-reload", daemon=True)
+            self._loading.start()
+        return True
+
+    def _reload(self, stat: Tuple[float, int]) -> None:
+        snapshot = self._build(stat)
+        if snapshot is not None:
+            self._install(snapshot)
+
+    def wait_loaded(self, timeout: Optional[float] = None) -> None:
+        loading = self._loading
+        if loading is not None:
+            loading.join(timeout)
+
+    def retired_versions(self) -> List[int]:
+        """Versions that have been swapped out but are still held by a running game."""
+        with self._lock:
+            self._retired = {v: ref for v, ref in self._retired.items() if ref() is not None}
+            return sorted(self._retired)
+
+    def start(self) -> None:
+        if self._watcher is not None or not self.path or self.poll_interval <= 0:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="book-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:  # keep watching whatever happens
+                logger.warning(f"Opening book watcher error: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,268 @@
+"""Several opening books, one per opponent rating band, with shared storage.
+
+The Masters book suits strong opponents only; weaker ones play other lines.
+A registry loads one book per rating band, listed in a manifest (by default
+``opening_books.json``)::
+
+    {
+      "books": [
+        {"name": "1600", "path": "opening_book.1600.json", "min_rating": 1600},
+        {"name": "2000", "path": "opening_book.2000.json", "min_rating": 2000},
+        {"name": "masters", "path": "opening_book.json", "min_rating": 2200, "default": true}
+      ]
+    }
+
+A game uses the band with the highest ``min_rating`` at or below the bot's
+playing rating (``BotProfile.opp_rating``). Ratings below every band get the
+lowest one. The ``default`` book (the last one listed, unless marked) serves
+callers that have no rating, such as the web UI.
+
+Books of neighbouring bands mostly differ near the root, where the game
+counts are large. Deeper down, many subtrees are identical: the same
+moves, counts and names. :class:`Interner` hash-conses the tries while they
+load, so every distinct subtree is stored once for all books, and opening
+names, ECO codes and moves are interned strings. Memory therefore grows
+with what the books do not have in common.
+
+Each band is reloaded on its own by a
+:class:`~opening_book.book_manager.BookManager`, sharing storage with the
+bands already loaded. Nodes are shared, so code reading a trie must not
+modify it. ``fetched_at`` is dropped, since it would keep otherwise
+identical nodes apart; the crawler's refresh works on the book files.
+
+Build the bands and the manifest, and see how much they share, with::
+
+    python -m opening_book.book_registry --band 1600 --band 2000 --band masters=opening_book.json:2200 --crawl
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+from typing import Dict, List, Optional
+
+if __package__ is None or __package__ == "":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from opening_book import query_db
+from opening_book.book_manager import POLL_INTERVAL, BookManager, BookSnapshot
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "opening_books.json"
+
+
+class Interner:
+    """Hash-conses trie nodes and interns their strings, for as long as it is kept."""
+
+    def __init__(self):
+        self._nodes: Dict[tuple, dict] = {}
+        self.seen = 0  # nodes passed in, including repeats of the same subtree
+
+    def share(self, node: dict) -> dict:
+        self.seen += 1
+        children = {}
+        unchanged = node.get('fetched_at') is None
+        for uci, child in (node.get('children') or {}).items():
+            shared = children[sys.intern(uci)] = self.share(child)
+            unchanged = unchanged and shared is child
+        stats = node.get('stats')
+        name = _intern(node.get('opening_name'))
+        eco = _intern(node.get('eco'))
+        # children are canonical already, so their identity stands for their contents
+        key = (tuple(stats) if stats is not None else None, name, eco,
+               tuple((uci, id(child)) for uci, child in children.items()))
+        canonical = self._nodes.get(key)
+        if canonical is None:
+            if unchanged and name is node.get('opening_name') and eco is node.get('eco'):
+                canonical = node  # e.g. a band that is already shared, registered again on a reload
+            else:
+                canonical = {'stats': stats, 'opening_name': name, 'eco': eco, 'fetched_at': None,
+                             'children': children}
+            self._nodes[key] = canonical
+        return canonical
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+class Band:
+    __slots__ = ("name", "path", "min_rating", "manager")
+
+    def __init__(self, name: str, path: str, min_rating: int, manager: BookManager):
+        self.name = name
+        self.path = path
+        self.min_rating = min_rating
+        self.manager = manager
+
+
+class BookRegistry:
+    def __init__(self, books: List[Dict], poll_interval: float = POLL_INTERVAL):
+        if not books:
+            raise ValueError("a book registry needs at least one book")
+        self._lock = threading.Lock()
+        self._interner: Optional[Interner] = None  # only kept while the bands first load
+        self.bands = sorted(
+            (Band(entry["name"], entry["path"], int(entry.get("min_rating", 0)),
+                  BookManager(entry["path"], poll_interval=poll_interval, loader=self._load))
+             for entry in books),
+            key=lambda band: band.min_rating)
+        marked = [entry["name"] for entry in books if entry.get("default")]
+        default = marked[0] if marked else books[-1]["name"]
+        self.default = next(band for band in self.bands if band.name == default)
+
+    @classmethod
+    def from_manifest(cls, path: str, poll_interval: float = POLL_INTERVAL) -> 'BookRegistry':
+        with open(path, encoding="utf-8") as f:
+            books = json.load(f)["books"]
+        # book paths are relative to the manifest
+        base = os.path.dirname(os.path.abspath(path))
+        for entry in books:
+            entry["path"] = os.path.join(base, entry["path"])
+        return cls(books, poll_interval)
+
+    def _load(self, path: str) -> dict:
+        trie = query_db.load_trie(path)
+        with self._lock:
+            interner = self._interner
+            if interner is None:
+                # a reload: share with the bands as loaded now, so the replaced version can be freed
+                interner = Interner()
+                for band in self.bands:
+                    snapshot = band.manager.current()
+                    if snapshot is not None and band.path != path:
+                        interner.share(snapshot.trie)
+            return interner.share(trie)
+
+    def load(self) -> bool:
+        """Load every band; False if the default book could not be loaded."""
+        with self._lock:
+            self._interner = Interner()
+        try:
+            for band in self.bands:
+                band.manager.load()
+        finally:
+            with self._lock:
+                self._interner = None
+        return self.default.manager.current() is not None
+
+    def band(self, rating: Optional[int] = None) -> Band:
+        if rating is None:
+            return self.default
+        chosen = self.bands[0]
+        for band in self.bands:
+            if band.min_rating <= rating:
+                chosen = band
+        return chosen
+
+    def current(self, rating: Optional[int] = None) -> Optional[BookSnapshot]:
+        """The snapshot for ``rating``'s band, or the default book if that band isn't loaded."""
+        snapshot = self.band(rating).manager.current()
+        return snapshot if snapshot is not None else self.default.manager.current()
+
+    def start(self) -> None:
+        for band in self.bands:
+            band.manager.start()
+
+    def stop(self) -> None:
+        for band in self.bands:
+            band.manager.stop()
+
+    def sharing(self) -> Dict:
+        """Nodes in all books as stored separately vs actually stored, with shared subtrees once."""
+        stored, total = set(), 0
+        per_book = {}
+        for band in self.bands:
+            snapshot = band.manager.current()
+            if snapshot is None:
+                continue
+            nodes = 0
+            stack = [snapshot.trie]
+            while stack:
+                node = stack.pop()
+                nodes += 1
+                stored.add(id(node))
+                stack.extend(node['children'].values())
+            per_book[band.name] = nodes
+            total += nodes
+        return {"books": per_book, "nodes": total, "stored_nodes": len(stored)}
+
+
+def write_manifest(path: str, books: List[Dict]) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"books": books}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def parse_band(value: str) -> Dict:
+    # "1600" (a crawled band: opening_book.1600.json, from 1600 up) or NAME=PATH:MIN_RATING
+    if "=" not in value:
+        try:
+            rating = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected a rating bucket or NAME=PATH:MIN_RATING, got {value!r}")
+        return {"name": value, "path": f"opening_book.{rating}.json", "min_rating": rating, "ratings": [rating]}
+    name, _, rest = value.partition("=")
+    path, _, rating = rest.rpartition(":")
+    if not name or not path or not rating.isdigit():
+        raise argparse.ArgumentTypeError(f"expected NAME=PATH:MIN_RATING, got {value!r}")
+    return {"name": name, "path": path, "min_rating": int(rating)}
+
+
+def crawl_band(ratings: List[int], crawler_args: List[str]) -> None:
+    cmd = [sys.executable, "-m", "opening_book.crawler", "--ratings", *map(str, ratings), *crawler_args]
+    logger.info(f"Crawling rating band {ratings}: {' '.join(cmd)}")
+    subprocess.run(cmd, check=True)
+
+
+def main(argv=None) -> None:
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the rating-band books and report their shared storage.")
+    parser.add_argument("--band", type=parse_band, action="append", default=[], metavar="BAND",
+                        help="a rating bucket to crawl (e.g. 1600), or NAME=PATH:MIN_RATING for an existing "
+                             "book; repeat for each band")
+    parser.add_argument("--default", help="band used when no rating is known (default: the last one given)")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="manifest to write (default: %(default)s)")
+    parser.add_argument("--crawl", action="store_true",
+                        help="crawl rating buckets whose book doesn't exist yet (or --refresh them)")
+    parser.add_argument("--refresh", action="store_true", help="with --crawl: refresh existing band books too")
+    args = parser.parse_args(argv)
+    if not args.band:
+        parser.error("give at least one --band")
+
+    books = []
+    for band in args.band:
+        ratings = band.pop("ratings", None)
+        exists = os.path.exists(band["path"])
+        if ratings and args.crawl and (not exists or args.refresh):
+            crawl_band(ratings, ["--refresh"] if exists else [])
+        elif not exists:
+            parser.error(f"{band['path']} doesn't exist (crawl it with --crawl)")
+        # the manifest lists paths relative to itself
+        band["path"] = os.path.relpath(os.path.abspath(band["path"]),
+                                       os.path.dirname(os.path.abspath(args.manifest)))
+        books.append(band)
+    if args.default:
+        for band in books:
+            band["default"] = band["name"] == args.default
+    write_manifest(args.manifest, books)
+
+    registry = BookRegistry.from_manifest(args.manifest, poll_interval=0)
+    registry.load()
+    report = registry.sharing()
+    for name, nodes in report["books"].items():
+        print(f"{name:>12}: {nodes} nodes")
+    saved = 1 - report["stored_nodes"] / report["nodes"] if report["nodes"] else 0.0
+    print(f"{'stored':>12}: {report['stored_nodes']} of {report['nodes']} nodes ({saved:.0%} shared)")
+    print(f"Manifest written to {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Read-only opening-book service shared by many bot processes.
+
+Loads the book once and answers queries over local HTTP (TCP or a Unix
+socket), so the bots and the web UI don't each keep their own copy of the
+trie in memory. The endpoints are bulk so that one round trip can cover many
+positions:
+
+- ``POST /candidates`` ``{"queries": [{"targets": [...], "moves": [...]}, ...]}``
+  returns ``candidate_moves_for_position`` for each query
+- ``POST /names`` ``{"sequences": [[...], ...]}`` returns the opening name of each line
+- ``POST /moves`` ``{"sequences": [[...], ...], "top_n": 5}`` returns the book moves after each line
+- ``GET /subtree?moves=e2e4,e7e5&depth=2`` returns part of the trie
+- ``GET /health``
+
+Responses are gzip-compressed when the client accepts it. With
+``--workers N`` the listening socket is shared by N forked processes, which
+all share the parent's copy of the book pages.
+
+    python -m opening_book.book_service --port 8770 --workers 4
+    python -m opening_book.book_service --unix /tmp/book.sock
+
+Bots use it when ``BOOK_SERVICE_URL`` is set (``http://127.0.0.1:8770`` or
+``unix:///tmp/book.sock``); see :class:`BookServiceClient`.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+if __package__ is None or __package__ == "":
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from opening_book import query_db
+from opening_book.crawler import OPENING_BOOK_FILE
+
+DEFAULT_PORT = 8770
+GZIP_MIN_BYTES = 1024
+CANDIDATE_CACHE_SIZE = 4096
+COMPILED_CACHE_SIZE = 256  # distinct repertoires whose target lines are kept compiled
+MAX_SUBTREE_DEPTH = 6
+TIMEOUT = 5.0
+
+
+class BookServiceError(Exception):
+    """The service could not be reached or returned an error."""
+
+
+class BookService:
+    """Query logic over one loaded trie; shared by every request thread."""
+
+    def __init__(self, trie: dict, cache_size: int = CANDIDATE_CACHE_SIZE):
+        self.trie = trie
+        # named nodes, so resolving a repertoire scans those instead of the whole trie
+        self.index = query_db.build_name_index(trie)
+        self.loaded_at = time.time()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._compiled: "OrderedDict[Tuple[str, ...], query_db.CompiledTargets]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compiled(self, targets: Sequence[str]) -> query_db.CompiledTargets:
+        # target order doesn't change the candidates, so differently ordered lists share an entry
+        key = tuple(sorted(set(targets)))
+        with self._lock:
+            if key in self._compiled:
+                self._compiled.move_to_end(key)
+                return self._compiled[key]
+        compiled = query_db.compile_targets(self.trie, list(key), self.index)
+        with self._lock:
+            self._compiled[key] = compiled
+            if len(self._compiled) > COMPILED_CACHE_SIZE:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def candidates(self, targets: Sequence[str], moves: Sequence[str]) -> Dict[str, Any]:
+        # The book never changes while we serve it, so results can be memoized
+        key = (tuple(targets), tuple(moves))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = query_db.candidate_moves_for_position(self.trie, list(targets), list(moves), self.index,
+                                                       self.compiled(targets))
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def name(self, moves: Sequence[str]) -> Optional[str]:
+        return query_db.get_opening_name_for_moves(self.trie, list(moves))
+
+    def moves(self, moves: Sequence[str], top_n: Optional[int]) -> List[Dict]:
+        return query_db.book_moves_at(self.trie, list(moves), top_n)
+
+    def subtree(self, moves: Sequence[str], depth: int) -> dict:
+        def cut(node: dict, remaining: int) -> dict:
+            out = {k: v for k, v in node.items() if k != 'children'}
+            out['children'] = ({uci: cut(child, remaining - 1) for uci, child in node.get('children', {}).items()}
+                               if remaining > 0 else {})
+            return out
+
+        return cut(query_db.get_node_by_path(self.trie, list(moves)), min(depth, MAX_SUBTREE_DEPTH))
+
+
+def _strings(value: Any, field: str) -> List[str]:
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"{field} must be a list of strings")
+    return value
+
+
+def _query(query: Any) -> Tuple[List[str], List[str]]:
+    # One /candidates query, checked before any lookup so bad input is a 400, not a 500
+    if not isinstance(query, dict):
+        raise ValueError("each query must be an object")
+    return _strings(query.get('targets', []), 'targets'), _strings(query.get('moves', []), 'moves')
+
+
+def _make_handler(service: BookService):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: Dict) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode()
+            compressed = len(data) >= GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', '')
+            if compressed:
+                data = gzip.compress(data, compresslevel=5)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if compressed:
+                self.send_header("Content-Encoding", "gzip")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            if url.path == '/health':
+                return self._reply(200, {'status': 'ok', 'loaded_at': service.loaded_at, 'pid': os.getpid()})
+            if url.path == '/subtree':
+                moves = [m for m in params.get('moves', [''])[0].split(',') if m]
+                try:
+                    depth = int(params.get('depth', ['1'])[0])
+                except ValueError as e:
+                    return self._reply(400, {'error': f'bad request: {e}'})
+                if depth < 0:
+                    return self._reply(400, {'error': 'bad request: depth must be at least 0'})
+                return self._reply(200, {'node': service.subtree(moves, depth)})
+            self._reply(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if self.path == '/candidates':
+                    queries = [_query(q) for q in body['queries']]
+                    results = [service.candidates(targets, moves) for targets, moves in queries]
+                    return self._reply(200, {'results': results})
+                if self.path == '/names':
+                    return self._reply(200, {'names': [service.name(seq) for seq in body['sequences']]})
+                if self.path == '/moves':
+                    top_n = body.get('top_n')
+                    return self._reply(200, {'moves': [service.moves(seq, top_n) for seq in body['sequences']]})
+            except (KeyError, TypeError, ValueError) as e:
+                return self._reply(400, {'error': f'bad request: {e}'})
+            self._reply(404, {'error': 'Not found'})
+
+    return Handler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: BookService, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                unix_path: Optional[str] = None):
+    handler = _make_handler(service)
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        # TCP_NODELAY doesn't apply to Unix sockets
+        return UnixHTTPServer(unix_path, type('UnixHandler', (handler,), {'disable_nagle_algorithm': False}))
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(service: BookService, host: str, port: int, unix_path: Optional[str], workers: int) -> None:
+    server = make_server(service, host, port, unix_path)
+    children = []
+    for _ in range(max(0, workers - 1)):
+        pid = os.fork()
+        if pid == 0:  # worker: accept on the inherited socket until killed
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    where = unix_path or f"http://{host}:{server.server_address[1]}"
+    print(f"Book service on {where} with {workers} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        server.server_close()
+        if unix_path and os.path.exists(unix_path):
+            os.unlink(unix_path)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class BookServiceClient:
+    """Keep-alive client for the book service; one connection per thread."""
+
+    def __init__(self, url: str, timeout: float = TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        parts = urlsplit(url)
+        if parts.scheme == 'unix':
+            self._unix_path, self._host, self._port = parts.path, None, None
+        else:
+            self._unix_path, self._host, self._port = None, parts.hostname, parts.port or DEFAULT_PORT
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self._unix_path:
+                conn = _UnixHTTPConnection(self._unix_path, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method: str, path: str, body: Optional[Dict] = None) -> Dict:
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Accept-Encoding': 'gzip'}
+        if payload is not None:
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                # a kept-alive connection may have been closed by the server; retry once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise BookServiceError(f"book service at {self.url} unavailable: {e}") from e
+        if response.getheader('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        result = json.loads(data)
+        if response.status != 200:
+            raise BookServiceError(result.get('error', f'HTTP {response.status}'))
+        return result
+
+    def candidates(self, queries: List[Tuple[List[str], List[str]]]) -> List[Dict[str, Any]]:
+        """``candidate_moves_for_position`` for each ``(targets, moves)`` pair."""
+        body = {'queries': [{'targets': list(t), 'moves': list(m)} for t, m in queries]}
+        return self._request('POST', '/candidates', body)['results']
+
+    def names(self, sequences: List[List[str]]) -> List[Optional[str]]:
+        return self._request('POST', '/names', {'sequences': sequences})['names']
+
+    def moves(self, sequences: List[List[str]], top_n: Optional[int] = None) -> List[List[Dict]]:
+        return self._request('POST', '/moves', {'sequences': sequences, 'top_n': top_n})['moves']
+
+    def subtree(self, moves: List[str], depth: int = 1) -> dict:
+        return self._request('GET', f"/subtree?moves={','.join(moves)}&depth={depth}")['node']
+
+    def choose_book_move(self, targets: List[str], seq: List[str]) -> Optional[str]:
+        # Same choice as query_db.choose_book_move, with the candidates computed remotely
+        return query_db.pick_weighted(self.candidates([(targets, seq)])[0])
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Serve the opening book to bot processes.')
+    parser.add_argument('--book', default=os.getenv('OPENING_BOOK_PATH', OPENING_BOOK_FILE))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=1, help='forked server processes sharing the socket')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    service = BookService(query_db.load_trie(args.book))
+    print(f"Loaded {args.book} in {time.perf_counter() - started:.2f}s")
+    serve(service, args.host, args.port, args.unix, args.workers)
+
+
+if __name__ == '__main__':
+    main()
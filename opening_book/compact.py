@@ -0,0 +1,164 @@
+"""Prune and compress the opening book.
+
+The crawler keeps every move above ``MIN_GAMES`` and writes indented JSON.
+This tool drops low-value branches, stores names/ECO codes only where they
+differ from the parent, writes gzipped compact JSON and reports file size and
+lookup latency before and after. ``query_db.load_trie`` reads the result
+transparently, returning exactly the same nodes for every retained line.
+
+    python -m opening_book.compact --min-games 500 --min-share 0.02 --output opening_book.json.gz
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional
+
+if __package__ is None or __package__ == "":
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from opening_book import query_db
+from opening_book.crawler import OPENING_BOOK_FILE
+
+COMPACT_BOOK_FILE = "opening_book.json.gz"
+
+
+def _total(node: dict) -> int:
+    return sum(node.get('stats') or [0, 0, 0])
+
+
+def prune(node: dict, min_games: int = 0, min_share: float = 0.0,
+          max_depth_per_opening: Optional[int] = None, _since_name: int = 0) -> dict:
+    """Return a pruned copy of ``node``.
+
+    A child is dropped (with its subtree) when it has fewer than ``min_games``
+    games, less than ``min_share`` of its parent's games, or lies more than
+    ``max_depth_per_opening`` plies below the last node that named an opening.
+    """
+    children = node.get('children') or {}
+    parent_total = _total(node) or sum(_total(c) for c in children.values())
+    kept = {}
+    for uci, child in children.items():
+        total = _total(child)
+        if total < min_games:
+            continue
+        if parent_total and total / parent_total < min_share:
+            continue
+        since_name = 0 if child.get('opening_name') else _since_name + 1
+        if max_depth_per_opening is not None and since_name > max_depth_per_opening:
+            continue
+        kept[uci] = prune(child, min_games, min_share, max_depth_per_opening, since_name)
+
+    out = {k: v for k, v in node.items() if k != 'children'}
+    out['children'] = kept
+    return out
+
+
+def to_compact(node: dict, parent_name: Optional[str] = None, parent_eco: Optional[str] = None) -> dict:
+    out: Dict = {}
+    if node.get('stats') is not None:
+        out['s'] = list(node['stats'])
+    name, eco = node.get('opening_name'), node.get('eco')
+    if name != parent_name:
+        out['n'] = name
+    if eco != parent_eco:
+        out['e'] = eco
+    if node.get('fetched_at') is not None:
+        out['t'] = node['fetched_at']
+    children = node.get('children') or {}
+    if children:
+        out['c'] = {uci: to_compact(child, name, eco) for uci, child in children.items()}
+    return out
+
+
+def write_compact(trie: dict, output_path: str) -> None:
+    data = {'format': query_db.COMPACT_FORMAT, 'root': to_compact(trie)}
+    tmp_path = output_path + '.tmp'
+    opener = gzip.open if output_path.endswith('.gz') else open
+    with opener(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, output_path)
+
+
+def count_nodes(node: dict) -> int:
+    return 1 + sum(count_nodes(c) for c in (node.get('children') or {}).values())
+
+
+def sample_lines(trie: dict, n: int, seed: int = 0) -> List[List[str]]:
+    # Random root-to-node walks through the (pruned) trie
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(n):
+        node, path = trie, []
+        while node.get('children') and rng.random() < 0.9:
+            uci = rng.choice(sorted(node['children']))
+            path.append(uci)
+            node = node['children'][uci]
+        lines.append(path)
+    return lines
+
+
+def measure(path: str, lines: List[List[str]], targets: List[str]) -> Dict:
+    start = time.perf_counter()
+    trie = query_db.load_trie(path)
+    load_s = time.perf_counter() - start
+
+    name_times, candidate_times, names = [], [], []
+    for line in lines:
+        t0 = time.perf_counter()
+        names.append(query_db.get_opening_name_for_moves(trie, line))
+        name_times.append(time.perf_counter() - t0)
+    for line in lines[:20]:
+        t0 = time.perf_counter()
+        query_db.candidate_moves_for_position(trie, targets, line[:-1])
+        candidate_times.append(time.perf_counter() - t0)
+
+    return {
+        'bytes': os.path.getsize(path),
+        'nodes': count_nodes(trie),
+        'load_ms': round(load_s * 1000, 2),
+        'name_lookup_us': round(statistics.median(name_times) * 1e6, 2) if name_times else None,
+        'candidates_ms': round(statistics.median(candidate_times) * 1000, 3) if candidate_times else None,
+        '_names': names,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Prune and compress the opening book.')
+    parser.add_argument('--input', default=OPENING_BOOK_FILE)
+    parser.add_argument('--output', default=COMPACT_BOOK_FILE,
+                        help='.gz outputs are gzipped (default: %(default)s)')
+    parser.add_argument('--min-games', type=int, default=0, help='drop moves with fewer games')
+    parser.add_argument('--min-share', type=float, default=0.0,
+                        help="drop moves with less than this fraction of the parent's games")
+    parser.add_argument('--max-depth-per-opening', type=int,
+                        help='drop moves more than this many plies past the last named opening')
+    parser.add_argument('--samples', type=int, default=200, help='retained lines used for the latency check')
+    args = parser.parse_args(argv)
+
+    original = query_db.load_trie(args.input)
+    pruned = prune(original, args.min_games, args.min_share, args.max_depth_per_opening)
+    write_compact(pruned, args.output)
+    del original
+
+    lines = sample_lines(pruned, args.samples)
+    named = [n for n in (query_db.get_opening_name_for_moves(pruned, line) for line in lines) if n]
+    targets = sorted(set(named))[:3]
+    before = measure(args.input, lines, targets)
+    after = measure(args.output, lines, targets)
+    preserved = before.pop('_names') == after.pop('_names')
+
+    print(f"{'':16}{'before':>14}{'after':>14}")
+    for key in ('bytes', 'nodes', 'load_ms', 'name_lookup_us', 'candidates_ms'):
+        print(f"{key:16}{before[key]!s:>14}{after[key]!s:>14}")
+    print(f"names preserved for {len(lines)} retained lines: {'yes' if preserved else 'NO'}")
+    if not preserved:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
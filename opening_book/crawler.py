@@ -1,20 +1,27 @@
 import os
 import time
 import json
-import requests
+import argparse
 import chess
 import logging
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, List, Iterator
+
+from opening_book.explorer_client import get_client
+from chess_trainer import profiling
 
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-SLEEP_TIME = 45
-EXPLORER_URL = "https://explorer.lichess.ovh/masters"
 DEPTH = 8
 TOP_N = 8
 MIN_GAMES = 100
 OPENING_BOOK_FILE = "opening_book.json"
+REFRESH_TTL_DAYS = 28
+REFRESH_CHANGE_THRESHOLD = 0.02
+REFRESH_REPORT_FILE = "opening_book.refresh-report.json"
+# Rating buckets of the Lichess games database (the explorer's "lichess" endpoint)
+RATING_BUCKETS = (0, 1000, 1200, 1400, 1600, 1800, 2000, 2200, 2500)
+RATINGS: Optional[List[int]] = None  # set by --ratings: crawl those buckets instead of Masters games
 
 
 class Node:
@@ -24,6 +31,8 @@ class Node:
         self.stats: Optional[Tuple[int, int, int]] = None
         self.opening_name: Optional[str] = None
         self.eco: Optional[str] = None
+        # When this node's children were last fetched from the explorer
+        self.fetched_at: Optional[float] = None
 
     def to_dict(self) -> Dict:
         # Recursively convert trie to a serializable dict
@@ -31,6 +40,7 @@ class Node:
             'stats': self.stats,
             'opening_name': self.opening_name,
             'eco': self.eco,
+            'fetched_at': self.fetched_at,
             'children': {uci: node.to_dict() for uci, node in self.children.items()}
         }
 
@@ -41,53 +51,48 @@ class Node:
         node.stats = tuple(data.get('stats')) if data.get('stats') is not None else None
         node.opening_name = data.get('opening_name')
         node.eco = data.get('eco')
+        node.fetched_at = data.get('fetched_at')
         for uci, child_data in data.get('children', {}).items():
             node.children[uci] = cls.from_dict(child_data)
         return node
 
 
-def fetch_book_moves(play: Optional[str], top_n: int) -> list:
-    params = {}
-    if play:
-        params['play'] = play
-    params['moves'] = top_n
-
-    response = requests.get(EXPLORER_URL, params=params)
-    if response.status_code == 429:
-        logger.warning(f'Rate limit hit, sleeping {SLEEP_TIME}s and retrying')
-        time.sleep(SLEEP_TIME)
-        response = requests.get(EXPLORER_URL, params=params)
-    response.raise_for_status()
-    return response.json().get('moves', [])
-
+def fetch_book_moves(play: Optional[str], top_n: int, max_age: Optional[float] = None) -> Tuple[list, float]:
+    # Return (moves, fetched_at). The shared client handles pooling, timeouts,
+    # rate limits and the on-disk cache; ``max_age`` bounds how old a cached
+    # response may be.
+    if RATINGS:
+        return get_client().fetch(play, top_n, endpoint='lichess', max_age=max_age, ratings=RATINGS)
+    return get_client().fetch(play, top_n, max_age=max_age)
 
-def crawl(node: Node, board: chess.Board, ply: int, max_ply: int, top_n: int,
-          min_games: int, cache: Dict[Tuple[Optional[str], int], list]) -> None:
-    if ply >= max_ply:
-        return
 
-    play = ','.join(m.uci() for m in board.move_stack) if board.move_stack else None
-    cache_key = (play, top_n)
+def band_book_file(ratings: List[int]) -> str:
+    # e.g. opening_book.1600.json, or opening_book.1600-1800.json for a two-bucket band
+    return f"opening_book.{'-'.join(str(r) for r in sorted(set(ratings)))}.json"
 
-    if cache_key in cache:
-        moves = cache[cache_key]
-        logger.debug(f'Cache hit for play: {play}')
-    else:
-        logger.info(f'Fetching ply {ply}, play: {play}')
-        moves = fetch_book_moves(play, top_n)
-        cache[cache_key] = moves
 
+def book_children(moves: list, min_games: int) -> Iterator[Tuple[str, Tuple[int, int, int], Optional[str], Optional[str]]]:
+    # Yield (uci, stats, opening_name, eco) for explorer moves with enough games
     for m in moves:
         total = m.get('white', 0) + m.get('draws', 0) + m.get('black', 0)
         if total < min_games:
             continue
-
-        uci = m['uci']
-        stats = (m.get('white', 0), m.get('draws', 0), m.get('black', 0))
         opening = m.get('opening') or {}
-        opening_name = opening.get('name')
-        eco = opening.get('eco')
+        stats = (m.get('white', 0), m.get('draws', 0), m.get('black', 0))
+        yield m['uci'], stats, opening.get('name'), opening.get('eco')
+
+
+@profiling.profiled("crawl")
+def crawl(node: Node, board: chess.Board, ply: int, max_ply: int, top_n: int,
+          min_games: int) -> None:
+    if ply >= max_ply:
+        return
+
+    play = ','.join(m.uci() for m in board.move_stack) if board.move_stack else None
+    logger.info(f'Fetching ply {ply}, play: {play}')
+    moves, node.fetched_at = fetch_book_moves(play, top_n)
 
+    for uci, stats, opening_name, eco in book_children(moves, min_games):
         if uci not in node.children:
             node.children[uci] = Node()
         child = node.children[uci]
@@ -96,13 +101,92 @@ def crawl(node: Node, board: chess.Board, ply: int, max_ply: int, top_n: int,
         child.eco = eco
 
         board.push_uci(uci)
-        crawl(child, board, ply + 1, max_ply, top_n, min_games, cache)
+        crawl(child, board, ply + 1, max_ply, top_n, min_games)
         board.pop()
 
 
+def refresh(node: Node, board: chess.Board, ply: int, max_ply: int, top_n: int, min_games: int,
+            ttl: float, change_threshold: float, report: Dict, force: bool = False) -> None:
+    # Re-query only nodes whose data is older than ``ttl`` or whose game count
+    # moved by at least ``change_threshold`` (relative) when their parent was
+    # re-queried; new children are crawled in full.
+    if ply >= max_ply:
+        return
+
+    path = [m.uci() for m in board.move_stack]
+    now = time.time()
+    stale = force or node.fetched_at is None or now - node.fetched_at >= ttl
+    if not stale:
+        report['skipped'] += 1
+        for uci, child in node.children.items():
+            board.push_uci(uci)
+            refresh(child, board, ply + 1, max_ply, top_n, min_games, ttl, change_threshold, report)
+            board.pop()
+        return
+
+    # Only accept cached responses that are newer than what this node already has
+    max_age = ttl if node.fetched_at is None else min(ttl, now - node.fetched_at)
+    play = ','.join(path) if path else None
+    logger.info(f'Refreshing ply {ply}, play: {play}')
+    moves, node.fetched_at = fetch_book_moves(play, top_n, max_age=max_age)
+    report['refreshed'] += 1
+
+    seen = set()
+    for uci, stats, opening_name, eco in book_children(moves, min_games):
+        seen.add(uci)
+        child = node.children.get(uci)
+        line = ' '.join(path + [uci])
+        board.push_uci(uci)
+        if child is None:
+            child = node.children[uci] = Node()
+            child.stats, child.opening_name, child.eco = stats, opening_name, eco
+            report['new'].append(line)
+            crawl(child, board, ply + 1, max_ply, top_n, min_games)
+        else:
+            old_total = sum(child.stats) if child.stats else 0
+            new_total = sum(stats)
+            changed = old_total == 0 or abs(new_total - old_total) / old_total >= change_threshold
+            if child.stats is None or tuple(child.stats) != stats:
+                report['changed'].append({'line': line, 'old': child.stats, 'new': stats})
+            child.stats, child.opening_name, child.eco = stats, opening_name, eco
+            refresh(child, board, ply + 1, max_ply, top_n, min_games, ttl, change_threshold, report,
+                    force=changed)
+        board.pop()
+
+    # Children the explorer no longer reports (e.g. now below top_n) are kept
+    for uci, child in node.children.items():
+        if uci in seen:
+            continue
+        report['missing_upstream'].append(' '.join(path + [uci]))
+        board.push_uci(uci)
+        refresh(child, board, ply + 1, max_ply, top_n, min_games, ttl, change_threshold, report)
+        board.pop()
+
+
+def refresh_book(root: Node, ttl: float, change_threshold: float) -> Dict:
+    report = {
+        'started_at': time.time(),
+        'ttl': ttl,
+        'change_threshold': change_threshold,
+        'refreshed': 0,
+        'skipped': 0,
+        'new': [],
+        'changed': [],
+        'missing_upstream': [],
+    }
+    # The root is always re-queried; everything below it follows the TTL/change rules
+    refresh(root, chess.Board(), 0, max_ply=DEPTH, top_n=TOP_N, min_games=MIN_GAMES,
+            ttl=ttl, change_threshold=change_threshold, report=report, force=True)
+    report['finished_at'] = time.time()
+    return report
+
+
 def save_trie(root: Node, output_path: str) -> None:
-    with open(output_path, 'w', encoding='utf-8') as f:
+    # Write then rename, so a running bot reloading the book never reads half a file
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(root.to_dict(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output_path)
     logger.info(f'Trie saved to {output_path}')
 
 
@@ -112,11 +196,140 @@ def load_trie(input_path: str) -> Node:
     return Node.from_dict(data)
 
 
-def main():
+def shard_prefixes(plies: int, top_n: int, min_games: int) -> Tuple[Node, List[List[Tuple[str, Node]]]]:
+    # Enumerate every root subtree ``plies`` deep, in sorted order. Each prefix is
+    # the chain of (uci, node-without-children) from the root down to the subtree;
+    # the root itself is returned without children as well. Lines that end before
+    # ``plies`` (no move below them has enough games) are prefixes of their own,
+    # so the shards together still cover the whole book.
+    prefixes: List[List[Tuple[str, Node]]] = []
+    root = Node()
+    board = chess.Board()
+
+    def walk(chain: List[Tuple[str, Node]]):
+        if len(chain) == plies:
+            prefixes.append(chain.copy())
+            return
+        play = ','.join(m.uci() for m in board.move_stack) if board.move_stack else None
+        moves, fetched_at = fetch_book_moves(play, top_n)
+        (chain[-1][1] if chain else root).fetched_at = fetched_at
+        children = list(book_children(moves, min_games))
+        if not children and chain:
+            prefixes.append(chain.copy())
+        for uci, stats, opening_name, eco in children:
+            node = Node()
+            node.stats, node.opening_name, node.eco = stats, opening_name, eco
+            chain.append((uci, node))
+            board.push_uci(uci)
+            walk(chain)
+            board.pop()
+            chain.pop()
+
+    walk([])
+    prefixes.sort(key=lambda chain: [uci for uci, _ in chain])
+    return root, prefixes
+
+
+def crawl_shard(shard: int, num_shards: int, plies: int, output_path: str) -> None:
+    # Crawl every ``num_shards``-th root subtree and write it as sorted NDJSON lines
+    # of {"path": [...], "node": {...}} so ``opening_book.merge`` can stream them.
+    # the full crawl stops at DEPTH, so splitting deeper would fetch nodes it never does
+    root, prefixes = shard_prefixes(min(plies, DEPTH), TOP_N, MIN_GAMES)
+    prefixes = prefixes[shard::num_shards]
+    logger.info(f'Shard {shard}/{num_shards}: {len(prefixes)} subtrees at ply {plies}')
+
+    emitted = set()
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'path': [], 'node': root.to_dict()}, ensure_ascii=False) + '\n')
+        for chain in prefixes:
+            path = [uci for uci, _ in chain]
+            # Ancestors go first (and once) so the file stays sorted by path
+            for i in range(1, len(chain)):
+                key = tuple(path[:i])
+                if key not in emitted:
+                    emitted.add(key)
+                    line = {'path': path[:i], 'node': chain[i - 1][1].to_dict()}
+                    f.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+            board = chess.Board()
+            for uci in path:
+                board.push_uci(uci)
+            subtree = chain[-1][1]
+            crawl(subtree, board, len(path), max_ply=DEPTH, top_n=TOP_N, min_games=MIN_GAMES)
+            f.write(json.dumps({'path': path, 'node': subtree.to_dict()}, ensure_ascii=False) + '\n')
+            f.flush()
+    os.replace(tmp_path, output_path)
+    logger.info(f'Shard written to {output_path}')
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    try:
+        index, total = (int(x) for x in value.split('/', 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected INDEX/COUNT, e.g. 0/4')
+    if total < 1 or not 0 <= index < total:
+        raise argparse.ArgumentTypeError(f'shard index must be in [0, {total})')
+    return index, total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Crawl the Lichess Masters explorer into a local opening book.')
+    parser.add_argument('--shard', type=parse_shard, metavar='INDEX/COUNT',
+                        help='only crawl this partition of the root subtrees and write a partial book')
+    parser.add_argument('--shard-plies', type=int, default=1,
+                        help='depth at which root subtrees are split between shards (default: 1)')
+    parser.add_argument('--output', help='output file (default: opening_book.json, or a per-shard .ndjson)')
+    parser.add_argument('--refresh', action='store_true',
+                        help='re-query only stale or changed nodes of the existing book')
+    parser.add_argument('--ttl-days', type=float, default=REFRESH_TTL_DAYS,
+                        help='with --refresh: re-query nodes fetched longer ago than this (default: %(default)s)')
+    parser.add_argument('--change-threshold', type=float, default=REFRESH_CHANGE_THRESHOLD,
+                        help='with --refresh: relative change in a node\'s game count that forces '
+                             'its subtree to be re-queried (default: %(default)s)')
+    parser.add_argument('--report', default=REFRESH_REPORT_FILE,
+                        help='with --refresh: where to write the change report (default: %(default)s)')
+    parser.add_argument('--ratings', type=int, nargs='+', choices=RATING_BUCKETS, metavar='BUCKET',
+                        help='crawl Lichess games of these rating buckets (e.g. 1600 1800) into a rating-band '
+                             'book, opening_book.<buckets>.json, instead of Masters games')
+    parser.add_argument('--profile', choices=profiling.MODES,
+                        help='write a profile per crawl (sample: collapsed stacks, cprofile: .prof)')
+    parser.add_argument('--profile-interval', type=float, help='seconds between stack samples')
+    args = parser.parse_args(argv)
+    profiling.configure(mode=args.profile, interval=args.profile_interval)
+    if args.shard_plies < 1:
+        parser.error('--shard-plies must be at least 1')
+    global RATINGS
+    RATINGS = args.ratings
+    book_file = band_book_file(RATINGS) if RATINGS else OPENING_BOOK_FILE
+    if args.refresh and not os.path.exists(book_file):
+        parser.error(f'--refresh needs an existing {book_file}; run the crawler first')
+    run(args)
+
+
+@profiling.profiled("crawl", name_from=lambda args: 'shard-{}-of-{}'.format(*args.shard) if args.shard else None)
+def run(args: argparse.Namespace) -> None:
+    book_file = band_book_file(RATINGS) if RATINGS else OPENING_BOOK_FILE
+    if args.shard is not None:
+        index, total = args.shard
+        output = args.output or f'opening_book.shard-{index}-of-{total}.ndjson'
+        crawl_shard(index, total, args.shard_plies, output)
+        return
+
+    if args.refresh:
+        root = load_trie(book_file)
+        report = refresh_book(root, ttl=args.ttl_days * 24 * 3600, change_threshold=args.change_threshold)
+        save_trie(root, args.output or book_file)
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"Refresh done: {report['refreshed']} re-queried, {report['skipped']} skipped, "
+                    f"{len(report['new'])} new, {len(report['changed'])} changed; report at {args.report}")
+        return
+
     # Load existing trie if present, else start fresh
-    if os.path.exists(OPENING_BOOK_FILE):
-        logger.info(f'Loading existing trie from {OPENING_BOOK_FILE}')
-        root = load_trie(OPENING_BOOK_FILE)
+    if os.path.exists(book_file):
+        logger.info(f'Loading existing trie from {book_file}')
+        root = load_trie(book_file)
     else:
         root = Node()
 
@@ -132,7 +345,6 @@ def main():
     logger.info(f'Existing trie reaches depth={existing}')
 
     board = chess.Board()
-    cache: Dict[Tuple[Optional[str], int], list] = {}
 
     if existing < DEPTH:
         logger.info(f'Resuming crawl from depth {existing} to {DEPTH}')
@@ -140,7 +352,7 @@ def main():
         # Traverse to each frontier node and resume crawling there
         def resume(node: Node, board: chess.Board, ply: int):
             if ply == existing:
-                crawl(node, board, ply, max_ply=DEPTH, top_n=TOP_N, min_games=MIN_GAMES, cache=cache)
+                crawl(node, board, ply, max_ply=DEPTH, top_n=TOP_N, min_games=MIN_GAMES)
             else:
                 for uci, child in node.children.items():
                     board.push_uci(uci)
@@ -151,7 +363,7 @@ def main():
     else:
         logger.info('Nothing to do—already at or beyond desired depth')
 
-    save_trie(root, OPENING_BOOK_FILE)
+    save_trie(root, args.output or book_file)
 
 
 if __name__ == '__main__':
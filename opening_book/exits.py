@@ -0,0 +1,231 @@
+"""Precomputed engine moves for the positions where the repertoire ends.
+
+The first move after leaving the book is played in roughly the same handful
+of positions every game, so instead of running the engine cold there this
+module analyses them offline. :func:`build_exit_table` walks the leaves of
+the target repertoire lines, runs multi-PV Stockfish on each (and on the
+positions along the best lines, to cover the next few moves) in a process
+pool, and stores the candidate moves with their scores. Per Elo band it keeps
+the candidates within that band's centipawn margin of the best move, so
+weaker settings pick from a wider set. The trainer looks positions up by EPD
+via :class:`ExitTable` and only calls the engine when the table has no entry.
+
+    python -m opening_book.exits --targets "Italian Game" "Sicilian Defense" --depth 18 --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import util as mp_util
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import chess
+import chess.engine
+
+if __package__ is None or __package__ == "":
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from opening_book import query_db
+from opening_book.crawler import OPENING_BOOK_FILE
+
+EXITS_FORMAT = "exits-v1"
+EXITS_FILE = "opening_exits.json"
+DEPTH = 18
+MULTIPV = 4
+FOLLOW_PLIES = 2  # also analyse this many plies along each stored line
+FOLLOW_LINES = 2  # ... of the best this many lines
+# Elo band -> largest centipawn loss against the best move still offered
+BAND_MARGINS = {1400: 120, 1800: 60, 2200: 25, 2600: 0}
+MATE_SCORE = 100_000
+
+_engine: Optional[chess.engine.SimpleEngine] = None
+
+
+def find_engine() -> str:
+    path = os.getenv("STOCKFISH_PATH") or shutil.which("stockfish") or "/usr/games/stockfish"
+    if not (os.path.isfile(path) and os.access(path, os.X_OK)):
+        raise FileNotFoundError("Could not locate the Stockfish binary! Please install it or set STOCKFISH_PATH.")
+    return path
+
+
+def repertoire_leaves(trie: dict, targets: List[str]) -> List[List[str]]:
+    """Every distinct full line of the book that passes through a target opening."""
+    seen = set()
+    leaves = []
+    for path, node, _ in query_db.find_matching_nodes(trie, targets):
+        for line in query_db.collect_full_continuations(path, node):
+            key = tuple(line)
+            if key not in seen:
+                seen.add(key)
+                leaves.append(line)
+    return leaves
+
+
+def _init_worker(engine_path: str, threads: int, hash_mb: int) -> None:
+    global _engine
+    _engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+    _engine.configure({"Threads": threads, "Hash": hash_mb})
+    # multiprocessing finalizers run when the worker exits; atexit would wait on
+    # the engine's (non-daemon) I/O thread first and hang
+    mp_util.Finalize(None, _engine.quit, exitpriority=10)
+
+
+def _analyse(fen: str, depth: int, multipv: int, pv_plies: int) -> Tuple[str, List[Dict]]:
+    # Runs in a worker process: multi-PV analysis of one position
+    board = chess.Board(fen)
+    infos = _engine.analyse(board, chess.engine.Limit(depth=depth), multipv=multipv)
+    candidates = []
+    for info in infos:
+        if not info.get("pv"):
+            continue
+        score = info["score"].relative
+        candidates.append({
+            "uci": info["pv"][0].uci(),
+            "cp": score.score(mate_score=MATE_SCORE),
+            "pv": [m.uci() for m in info["pv"][:pv_plies]],
+        })
+    return fen, candidates
+
+
+def band_moves(candidates: List[Dict], margins: Dict[int, int]) -> Dict[str, List[str]]:
+    if not candidates:
+        return {}
+    best = max(c["cp"] for c in candidates)
+    return {str(band): [c["uci"] for c in candidates if best - c["cp"] <= margin]
+            for band, margin in sorted(margins.items())}
+
+
+def _follow_positions(fen: str, candidates: List[Dict], plies: int, lines: int) -> Iterable[str]:
+    for candidate in candidates[:lines]:
+        board = chess.Board(fen)
+        for uci in candidate["pv"][:plies]:
+            board.push_uci(uci)
+            if board.is_game_over():
+                break
+            yield board.fen()
+
+
+def build_exit_table(trie: dict, targets: List[str], engine_path: str, depth: int = DEPTH,
+                     multipv: int = MULTIPV, workers: int = 1, threads: int = 1, hash_mb: int = 64,
+                     follow_plies: int = FOLLOW_PLIES, follow_lines: int = FOLLOW_LINES,
+                     margins: Dict[int, int] = BAND_MARGINS) -> Dict:
+    positions: Dict[str, Dict] = {}
+    wave = []
+    for line in repertoire_leaves(trie, targets):
+        board = chess.Board()
+        for uci in line:
+            board.push_uci(uci)
+        if not board.is_game_over():
+            wave.append(board.fen())
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(engine_path, threads, hash_mb)) as pool:
+        for round_ in range(2):
+            # round 0: repertoire exits, round 1: positions along their best lines
+            todo = []
+            for fen in wave:
+                epd = chess.Board(fen).epd()
+                if epd not in positions:
+                    positions[epd] = {}
+                    todo.append(fen)
+            n = len(todo)
+            results = list(pool.map(_analyse, todo, [depth] * n, [multipv] * n, [follow_plies + 1] * n,
+                                    chunksize=max(1, n // (workers * 4))))
+            wave = []
+            for fen, candidates in results:
+                positions[chess.Board(fen).epd()] = {
+                    "candidates": candidates,
+                    "bands": band_moves(candidates, margins),
+                }
+                if round_ == 0 and follow_plies:
+                    wave.extend(_follow_positions(fen, candidates, follow_plies, follow_lines))
+
+    return {
+        "format": EXITS_FORMAT,
+        "targets": targets,
+        "depth": depth,
+        "multipv": multipv,
+        "bands": sorted(margins),
+        "built_in_s": round(time.perf_counter() - started, 1),
+        "positions": positions,
+    }
+
+
+class ExitTable:
+    """Lookup of precomputed moves by position and Elo band."""
+
+    def __init__(self, data: Dict):
+        if data.get("format") != EXITS_FORMAT:
+            raise ValueError(f"not an exits table: format={data.get('format')!r}")
+        self.positions: Dict[str, Dict] = data["positions"]
+        self.bands = sorted(data["bands"])
+
+    @classmethod
+    def load(cls, path: str) -> 'ExitTable':
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def band_for(self, elo: int) -> int:
+        # Highest band not above ``elo``; weaker ratings use the lowest band
+        eligible = [b for b in self.bands if b <= elo]
+        return eligible[-1] if eligible else self.bands[0]
+
+    def moves(self, board: chess.Board, elo: int) -> List[str]:
+        entry = self.positions.get(board.epd())
+        if not entry:
+            return []
+        return entry["bands"].get(str(self.band_for(elo)), [])
+
+    def choose_move(self, board: chess.Board, elo: int, rng: Optional[random.Random] = None) -> Optional[str]:
+        moves = [uci for uci in self.moves(board, elo) if chess.Move.from_uci(uci) in board.legal_moves]
+        if not moves:
+            return None
+        return (rng or random).choice(moves)
+
+
+def load_exit_table(path: str) -> Optional[ExitTable]:
+    # None when the table hasn't been built; the trainer then always uses the engine
+    if not os.path.exists(path):
+        return None
+    return ExitTable.load(path)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Precompute engine moves for the end of the repertoire lines.')
+    parser.add_argument('--book', default=OPENING_BOOK_FILE)
+    parser.add_argument('--targets', nargs='+', help='opening names (default: every opening the bot offers)')
+    parser.add_argument('--output', default=EXITS_FILE)
+    parser.add_argument('--engine', help='UCI engine binary (default: STOCKFISH_PATH or stockfish on PATH)')
+    parser.add_argument('--depth', type=int, default=DEPTH)
+    parser.add_argument('--multipv', type=int, default=MULTIPV)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='engine processes (default: one per CPU)')
+    parser.add_argument('--threads', type=int, default=1, help='engine threads per worker')
+    parser.add_argument('--hash', type=int, default=64, help='engine hash per worker in MB')
+    parser.add_argument('--follow-plies', type=int, default=FOLLOW_PLIES)
+    args = parser.parse_args(argv)
+
+    targets = args.targets
+    if not targets:
+        from chess_trainer.bot_profile import BotProfile, black_openings, white_openings
+        targets = [BotProfile.strip_opening_name(o) for o in white_openings + black_openings]
+
+    trie = query_db.load_trie(args.book)
+    table = build_exit_table(trie, targets, args.engine or find_engine(), depth=args.depth,
+                             multipv=args.multipv, workers=args.workers, threads=args.threads,
+                             hash_mb=args.hash, follow_plies=args.follow_plies)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(table, f)
+    print(f"Analysed {len(table['positions'])} positions in {table['built_in_s']}s; written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
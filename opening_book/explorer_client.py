@@ -0,0 +1,251 @@
+"""Shared HTTP client for the Lichess opening explorer.
+
+Both the crawler and the live fallback in ``lichess_openings_explorer`` go
+through :class:`ExplorerClient`, which keeps one pooled keep-alive session,
+applies timeouts, persists responses in an on-disk TTL cache (so re-running
+the crawler after a restart does not re-fetch anything) and coalesces
+identical queries that are in flight at the same time.
+
+On a rate limit (429) the client waits out ``Retry-After`` and tries again,
+up to ``MAX_RATE_LIMIT_RETRIES`` times; that suits the crawler. Callers on
+a clock pass ``retries=0``: they get :class:`RateLimited` at once, and keep
+getting it without a request until the limit has passed.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+EXPLORER_BASE_URL = os.getenv("LICHESS_EXPLORER_URL", "https://explorer.lichess.ovh")
+DEFAULT_ENDPOINT = "masters"
+CACHE_PATH = os.getenv(
+    "EXPLORER_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "explorer_cache.sqlite3"),
+)
+CACHE_TTL = 30 * 24 * 3600  # the Masters database changes slowly
+NEGATIVE_CACHE_TTL = 7 * 24 * 3600  # empty positions are re-checked more often
+TIMEOUT = (3.05, 15)  # (connect, read) seconds
+RATE_LIMIT_SLEEP = 45
+MAX_RATE_LIMIT_RETRIES = 3
+POOL_SIZE = 8
+
+
+class RateLimited(requests.HTTPError):
+    """The explorer answered 429 and the caller allowed no (more) retries."""
+
+
+def cache_key(endpoint: str, play: Optional[str], top_n: Optional[int],
+              ratings: Optional[Sequence[int]] = None) -> str:
+    key = f"{endpoint}|{play or ''}|{top_n if top_n is not None else ''}"
+    # rating bands of the "lichess" endpoint are separate books; masters keys are unchanged
+    return f"{key}|{ratings_param(ratings)}" if ratings else key
+
+
+def ratings_param(ratings: Sequence[int]) -> str:
+    return ",".join(str(r) for r in sorted(set(ratings)))
+
+
+class ResponseCache:
+    # Small sqlite-backed store of explorer responses. sqlite handles locking
+    # so several crawler processes can share one cache file.
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " body TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " empty INTEGER NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[list, float]]:
+        # Return (moves, fetched_at) or None; freshness is decided by the caller
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        body, fetched_at = row
+        return json.loads(body), fetched_at
+
+    def put(self, key: str, moves: list, fetched_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, fetched_at, empty) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(moves, ensure_ascii=False), fetched_at, 0 if moves else 1),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ExplorerClient:
+    def __init__(self, base_url: str = EXPLORER_BASE_URL, cache_path: Optional[str] = CACHE_PATH,
+                 ttl: float = CACHE_TTL, negative_ttl: float = NEGATIVE_CACHE_TTL,
+                 timeout=TIMEOUT, session: Optional[requests.Session] = None,
+                 pool_size: int = POOL_SIZE, retries: int = MAX_RATE_LIMIT_RETRIES):
+        self.base_url = base_url.rstrip('/')
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.retries = retries
+        self.cache = ResponseCache(cache_path) if cache_path else None
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._limited_until = 0.0  # monotonic time the last Retry-After runs out
+        self.stats = {
+            'requests': 0,
+            'cache_hits': 0,
+            'negative_hits': 0,
+            'coalesced': 0,
+            'rate_limited': 0,
+        }
+
+    def fetch_moves(self, play: Optional[str], top_n: Optional[int],
+                    endpoint: str = DEFAULT_ENDPOINT, ratings: Optional[Sequence[int]] = None,
+                    retries: Optional[int] = None) -> List[dict]:
+        """Return the explorer ``moves`` list for ``play`` (comma separated UCI)."""
+        return self.fetch(play, top_n, endpoint, ratings=ratings, retries=retries)[0]
+
+    def fetch(self, play: Optional[str], top_n: Optional[int], endpoint: str = DEFAULT_ENDPOINT,
+              max_age: Optional[float] = None,
+              ratings: Optional[Sequence[int]] = None,
+              retries: Optional[int] = None) -> Tuple[List[dict], float]:
+        """Like :meth:`fetch_moves` but also return when the data was fetched.
+
+        ``max_age`` (seconds) tightens the cache TTL for this call, e.g. so a
+        refresh only accepts responses newer than the data it already has.
+        ``ratings`` picks the rating buckets of the ``lichess`` endpoint.
+        ``retries`` caps the rate-limit retries for this call (default: the
+        client's); with 0 a rate limit raises :class:`RateLimited` at once.
+        """
+        key = cache_key(endpoint, play, top_n, ratings)
+
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                moves, fetched_at = cached
+                ttl = self.ttl if moves else self.negative_ttl
+                if max_age is not None:
+                    ttl = min(ttl, max_age)
+                if time.time() - fetched_at < ttl:
+                    self._count('cache_hits' if moves else 'negative_hits')
+                    return moves, fetched_at
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats['coalesced'] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            moves = self._request(endpoint, play, top_n, ratings, self.retries if retries is None else retries)
+            fetched_at = time.time()
+            if self.cache is not None:
+                self.cache.put(key, moves, fetched_at)
+            future.set_result((moves, fetched_at))
+            return moves, fetched_at
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _request(self, endpoint: str, play: Optional[str], top_n: Optional[int],
+                 ratings: Optional[Sequence[int]] = None, retries: int = MAX_RATE_LIMIT_RETRIES) -> List[dict]:
+        remaining = self._limited_for()
+        if retries == 0 and remaining > 0:
+            # still inside the last Retry-After: asking again would only extend the limit
+            raise RateLimited(f"rate limited for another {remaining:.0f}s")
+        params = {}
+        if play:
+            params['play'] = play
+        if top_n is not None:
+            params['moves'] = top_n
+        if ratings:
+            params['ratings'] = ratings_param(ratings)
+        url = f"{self.base_url}/{endpoint}"
+
+        for attempt in range(retries + 1):
+            self._count('requests')
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            if response.status_code != 429:
+                break
+            self._count('rate_limited')
+            delay = _retry_after(response, RATE_LIMIT_SLEEP)
+            self._limit(delay)
+            if attempt == retries:
+                raise RateLimited(f"rate limited, retry after {delay}s", response=response)
+            logger.warning(f'Rate limit hit, sleeping {delay}s and retrying')
+            time.sleep(delay)
+        response.raise_for_status()
+        return response.json().get('moves', [])
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _limited_for(self) -> float:
+        with self._lock:
+            return self._limited_until - time.monotonic()
+
+    def _limit(self, delay: float) -> None:
+        # concurrent 429s: an earlier deadline must not cut a later one short
+        with self._lock:
+            self._limited_until = max(self._limited_until, time.monotonic() + delay)
+
+    def close(self) -> None:
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+def _retry_after(response, default: float) -> float:
+    value = response.headers.get('Retry-After')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+_client: Optional[ExplorerClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ExplorerClient:
+    # Process-wide client so every caller shares the same pool and cache
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ExplorerClient()
+        return _client
@@ -1,6 +1,10 @@
+import logging
 import random
 import os
 import sys
+import threading
+import weakref
+from collections import OrderedDict
 
 from opening_book.query_db import get_opening_name_for_moves
 
@@ -15,9 +19,9 @@ except Exception:  # pragma: no cover - optional dependency
     def load_dotenv() -> None:
         pass
 try:  # optional dependency for network requests
-    import requests
+    from opening_book import explorer_client
 except Exception:  # pragma: no cover - optional dependency
-    requests = None
+    explorer_client = None
 try:  # optional dependency for board representation
     import chess
 except Exception:  # pragma: no cover - optional dependency
@@ -33,6 +37,22 @@ try:
     from opening_book import query_db as local_db
 except Exception:  # pragma: no cover - optional dependency
     local_db = None
+try:  # Polyglot backend needs python-chess
+    from opening_book import polyglot
+except Exception:  # pragma: no cover - optional dependency
+    polyglot = None
+try:  # shared book served by opening_book.book_service
+    from opening_book import book_service
+except Exception:  # pragma: no cover - optional dependency
+    book_service = None
+try:  # hot reloading of the local trie
+    from opening_book import book_manager
+except Exception:  # pragma: no cover - optional dependency
+    book_manager = None
+try:  # rating-band books
+    from opening_book import book_registry
+except Exception:  # pragma: no cover - optional dependency
+    book_registry = None
 
 
 """Utilities for fetching and filtering opening moves from Lichess."""
@@ -40,19 +60,74 @@ except Exception:  # pragma: no cover - optional dependency
 # Use an absolute import so this module works when executed directly or as part
 # of the ``chess_trainer`` package.
 from chess_trainer.bot_profile import BotProfile
+from chess_trainer.game_log import verbose
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()  # read .env for API token if present
 API_TOKEN = os.getenv("LICHESS_BOT_TOKEN")
-lichess_explorer_url = "https://explorer.lichess.ovh/masters"
 
-LOCAL_BOOK_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "opening_book.json")
-if local_db is not None and os.path.exists(LOCAL_BOOK_PATH):
+# OPENING_BOOK_PATH may point at a compacted ``.json.gz`` book as well
+LOCAL_BOOK_PATH = os.getenv(
+    "OPENING_BOOK_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "opening_book.json")
+)
+POLYGLOT_BOOK_PATH = os.getenv(
+    "POLYGLOT_BOOK_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "opening_book.bin")
+)
+# "json" walks the local trie (supports opening preferences); "polyglot" uses a
+# memory-mapped .bin book instead (constant memory, no preference filtering)
+BOOK_BACKEND = os.getenv("OPENING_BOOK_BACKEND", "json").lower()
+# When set (http://host:port or unix:///path.sock) book lookups go to a shared
+# book service instead of a trie loaded into this process
+BOOK_SERVICE_URL = os.getenv("BOOK_SERVICE_URL")
+
+_BOOK_SERVICE = None
+if BOOK_SERVICE_URL and book_service is not None:
+    _BOOK_SERVICE = book_service.BookServiceClient(BOOK_SERVICE_URL)
+
+_POLYGLOT_BOOK = None
+if BOOK_BACKEND == "polyglot" and polyglot is not None and os.path.exists(POLYGLOT_BOOK_PATH):
     try:
-        _LOCAL_BOOK = local_db.load_trie(LOCAL_BOOK_PATH)
+        _POLYGLOT_BOOK = polyglot.PolyglotBook(POLYGLOT_BOOK_PATH)
     except Exception:  # pragma: no cover - optional dependency
-        _LOCAL_BOOK = None
-else:  # pragma: no cover - optional dependency
-    _LOCAL_BOOK = None
+        _POLYGLOT_BOOK = None
+
+# Seconds between checks for a refreshed book file; 0 turns hot reloading off
+BOOK_RELOAD_INTERVAL = float(os.getenv("OPENING_BOOK_RELOAD_INTERVAL", "5"))
+
+# Manifest of rating-band books (see opening_book/book_registry.py); when it exists
+# each game uses the book for its rating band instead of LOCAL_BOOK_PATH
+BOOK_REGISTRY_PATH = os.getenv(
+    "OPENING_BOOKS_MANIFEST", os.path.join(os.path.dirname(os.path.dirname(__file__)), "opening_books.json")
+)
+
+_BOOK_REGISTRY = None
+_BOOK_MANAGER = None
+if (_BOOK_SERVICE is None and BOOK_BACKEND == "json" and book_registry is not None
+        and os.path.exists(BOOK_REGISTRY_PATH)):
+    try:
+        _BOOK_REGISTRY = book_registry.BookRegistry.from_manifest(BOOK_REGISTRY_PATH,
+                                                                  poll_interval=BOOK_RELOAD_INTERVAL)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring book manifest {BOOK_REGISTRY_PATH}: {e}")
+    else:
+        if _BOOK_REGISTRY.load():
+            _BOOK_MANAGER = _BOOK_REGISTRY.default.manager  # rating-less lookups use the default book
+        else:  # pragma: no cover - unreadable default book
+            _BOOK_REGISTRY = None
+
+if (_BOOK_MANAGER is None and _BOOK_SERVICE is None and BOOK_BACKEND == "json" and book_manager is not None
+        and os.path.exists(LOCAL_BOOK_PATH)):
+    _BOOK_MANAGER = book_manager.BookManager(LOCAL_BOOK_PATH, poll_interval=BOOK_RELOAD_INTERVAL)
+    if _BOOK_MANAGER.load() is None:  # pragma: no cover - unreadable book
+        _BOOK_MANAGER = None
+
+# Compiled target lines (query_db.compile_targets) per book snapshot and repertoire, so
+# switching between trainees with different openings doesn't recompile on every move
+COMPILED_REPERTOIRES = int(os.getenv("COMPILED_REPERTOIRES", "64"))
+_COMPILED: "OrderedDict" = OrderedDict()  # (id(book), targets) -> (weakref to book, compiled)
+_COMPILED_LOCK = threading.Lock()
+_COMPILED_STATS = {"hits": 0, "misses": 0}
 
 if berserk is not None and API_TOKEN:
     session = berserk.TokenSession(API_TOKEN)
@@ -62,41 +137,76 @@ else:  # pragma: no cover - used when testing without network
     session = client = explorer = None
 
 def fetch_book_moves(play, top_n):
-    if requests is None:
+    if explorer_client is None:
         raise RuntimeError("requests library is required to fetch openings")
 
-    params = {"play": play, "moves": top_n}
-    resp = requests.get(lichess_explorer_url, params=params)
-    return resp.json().get("moves", [])
+    # called during games: a rate limit must not eat the clock, so it fails at once
+    return explorer_client.get_client().fetch_moves(play, top_n, retries=0)
 
-def get_local_book_moves(board, top_n):
+def current_book(opp_rating=None):
+    """The loaded book snapshot, or None; a game should keep the one it started with.
+
+    With rating-band books, ``opp_rating`` picks the band; without a rating
+    (or without bands) this is the default book.
+    """
+    if _BOOK_REGISTRY is not None and opp_rating is not None:
+        return _BOOK_REGISTRY.current(opp_rating)
+    return _BOOK_MANAGER.current() if _BOOK_MANAGER is not None else None
+
+
+def watch_book():
+    """Start reloading the local book(s) in the background whenever a file changes."""
+    if _BOOK_REGISTRY is not None:
+        _BOOK_REGISTRY.start()
+    elif _BOOK_MANAGER is not None:
+        _BOOK_MANAGER.start()
+
+
+def compiled_targets(book, targets):
+    """``query_db.compile_targets`` for ``book``, cached for the most recently used repertoires."""
+    # target order doesn't change the candidates, so differently ordered lists share an entry
+    key = (id(book), tuple(sorted(set(targets))))
+    with _COMPILED_LOCK:
+        entry = _COMPILED.get(key)
+        # a reloaded book can reuse a dropped snapshot's id; the weakref tells them apart
+        if entry is not None and entry[0]() is book:
+            _COMPILED.move_to_end(key)
+            _COMPILED_STATS["hits"] += 1
+            return entry[1]
+        _COMPILED_STATS["misses"] += 1
+    compiled = local_db.compile_targets(book.trie, list(key[1]), book.index)
+    with _COMPILED_LOCK:
+        _COMPILED[key] = (weakref.ref(book), compiled)
+        _COMPILED.move_to_end(key)
+        while len(_COMPILED) > COMPILED_REPERTOIRES:
+            _COMPILED.popitem(last=False)
+    return compiled
+
+
+def compiled_cache_info():
+    with _COMPILED_LOCK:
+        return {"size": len(_COMPILED), "max_size": COMPILED_REPERTOIRES, **_COMPILED_STATS}
+
+
+def get_local_book_moves(board, top_n, book=None):
     """Return moves from the local opening book for the given position."""
-    if _LOCAL_BOOK is None or local_db is None:
-        # print("local_db or _LOCAL_BOOK is None")
+    if _BOOK_SERVICE is not None:
+        try:
+            return _BOOK_SERVICE.moves([[m.uci() for m in board.move_stack]], top_n)[0]
+        except book_service.BookServiceError as e:
+            logger.warning(f"Book service lookup failed: {e}")
+            return []
+    book = book or current_book()
+    if book is None or local_db is None:
+        # print("local_db or book is None")
         return []
 
-    node = local_db.get_node_by_path(_LOCAL_BOOK, [m.uci() for m in board.move_stack])
-    children = node.get("children") or {}
-    moves = []
-    # print(f"CHILDREN {children}")
-    for uci, child in children.items():
-        stats = child.get("stats") or [0, 0, 0]
-        entry = {
-            "uci": uci,
-            "white": stats[0],
-            "draws": stats[1],
-            "black": stats[2],
-        }
-        name = child.get("opening_name")
-        if name:
-            entry["opening"] = {"name": name}
-        moves.append(entry)
+    return local_db.book_moves_at(book.trie, [m.uci() for m in board.move_stack], top_n)
 
-    if top_n is not None and len(moves) > top_n:
-        moves.sort(key=lambda m: m["white"] + m["draws"] + m["black"], reverse=True)
-        moves = moves[:top_n]
 
-    return moves
+def book_available():
+    """Whether any book backend (local trie, book service or Polyglot) is set up."""
+    return _BOOK_SERVICE is not None or _BOOK_MANAGER is not None or _POLYGLOT_BOOK is not None
 
 
 def filter_by_preferences(moves, prefs):
@@ -139,7 +249,7 @@ def filter_by_preferences(moves, prefs):
     # no named openings so just return everything sinc we can't filter
     return moves
 
-def get_book_move(board, bot_profile: BotProfile, max_ply=20, top_n=5):
+def get_book_move(board, bot_profile: BotProfile, max_ply=20, top_n=5, book=None):
     ply = len(board.move_stack)
     if ply >= max_ply:
         return None
@@ -165,20 +275,39 @@ def get_book_move(board, bot_profile: BotProfile, max_ply=20, top_n=5):
     # unfiltered UCIs for debug
     # unfiltered_moves = [m['uci'] for m in response]
 
+    # games pass the snapshot they started with so a reload can't change the book mid-game
+    book = book or current_book(bot_profile.opp_rating)
+
+    # the shared book service answers the same lookup without a local trie
+    if _BOOK_SERVICE is not None:
+        seq = [m.uci() for m in board.move_stack]
+        try:
+            targeted = _BOOK_SERVICE.choose_book_move(prefs, seq)
+            # the variation name costs another lookup, so only sampled moves get one
+            if targeted is not None and verbose(logger):
+                opening_name = _BOOK_SERVICE.names([seq])[0] if play is not None else None
+                logger.debug("Book service move", extra={"fields": {
+                    "sequence": seq, "variation": opening_name, "move": targeted}})
+            if targeted is not None:
+                return targeted
+        except book_service.BookServiceError as e:
+            logger.warning(f"Book service lookup failed: {e}")
+
     # try direct lookup in local database for preferred variation
-    if local_db is not None and _LOCAL_BOOK is not None:
+    elif local_db is not None and book is not None:
         seq = [m.uci() for m in board.move_stack]
-        print("*" * 20)
-        print("Using direct local DB lookup")
-        print(f"Current sequence: {seq}")
-        targeted = local_db.choose_book_move(_LOCAL_BOOK, prefs, seq)
+        targeted = local_db.choose_book_move(book.trie, prefs, seq, book.index, compiled_targets(book, prefs))
         if targeted is not None:
-            # print(f"Unfiltered: {unfiltered_moves}")
-
-            if play is not None:
-                opening_name = local_db.get_opening_name_for_moves(_LOCAL_BOOK, play.split(','))
-                if opening_name is not None:
-                    print(f"Current variation: {opening_name}")
-            print(f"Chosen move: {targeted}")
+            if verbose(logger):
+                opening_name = local_db.get_opening_name_for_moves(book.trie, seq) if play is not None else None
+                logger.debug("Local book move", extra={"fields": {
+                    "sequence": seq, "variation": opening_name, "move": targeted}})
             return targeted
+
+    # Polyglot books carry no opening names, so we can only follow their weights
+    if _POLYGLOT_BOOK is not None:
+        chosen = _POLYGLOT_BOOK.choose_move(board)
+        if chosen is not None:
+            logger.debug(f"Chosen move (polyglot): {chosen}")
+            return chosen
     return None
\ No newline at end of file
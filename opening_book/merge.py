@@ -0,0 +1,233 @@
+"""Merge partial books written by ``python -m opening_book.crawler --shard I/N``.
+
+Shard files are NDJSON lines of ``{"path": [...], "node": {...}}`` sorted by
+path. They are k-way merged line by line and the result is written one root
+subtree at a time. The optional base book is not loaded whole either: it is
+memory-mapped, its root moves are indexed by byte range, and each first-move
+subtree is decoded only when its turn comes. Only a single first-move subtree
+from each side is held in memory at once.
+
+    python -m opening_book.merge opening_book.shard-*.ndjson --base opening_book.json
+"""
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import mmap
+import os
+import re
+import sys
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+if __package__ is None or __package__ == "":
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from opening_book.crawler import OPENING_BOOK_FILE
+
+logger = logging.getLogger(__name__)
+
+STATS_MODES = ('replace', 'max', 'sum')
+
+
+def _total(stats) -> int:
+    return sum(stats) if stats else 0
+
+
+def merge_stats(ours, theirs, mode: str):
+    if theirs is None:
+        return ours
+    if ours is None or mode == 'replace':
+        return list(theirs)
+    if mode == 'sum':
+        return [a + b for a, b in zip(ours, theirs)]
+    # 'max': keep whichever count saw more games
+    return list(theirs) if _total(theirs) > _total(ours) else list(ours)
+
+
+def merge_node(into: Dict, other: Dict, mode: str) -> Dict:
+    """Fold ``other`` into ``into`` (in place) and return ``into``."""
+    into['stats'] = merge_stats(into.get('stats'), other.get('stats'), mode)
+    # Names/ECO: the newer (incoming) crawl wins unless it has nothing to say
+    for key in ('opening_name', 'eco'):
+        if other.get(key) is not None:
+            into[key] = other[key]
+        else:
+            into.setdefault(key, None)
+    fetched = [t for t in (into.get('fetched_at'), other.get('fetched_at')) if t is not None]
+    into['fetched_at'] = max(fetched) if fetched else None
+    children = into.setdefault('children', {})
+    for uci, child in (other.get('children') or {}).items():
+        if uci in children:
+            merge_node(children[uci], child, mode)
+        else:
+            children[uci] = child
+    return into
+
+
+def _empty_node() -> Dict:
+    return {'stats': None, 'opening_name': None, 'eco': None, 'fetched_at': None, 'children': {}}
+
+
+_WHITESPACE = re.compile(rb'\s*')
+_STRING_REST = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.S)  # from just after an opening quote
+# the next bracket outside a string, skipping everything before it in one match
+_BRACKET = re.compile(rb'(?:[^"\[\]{}]++|"[^"\\]*+(?:\\.[^"\\]*+)*+")*+([][{}])', re.S)
+_SCALAR = re.compile(rb'[^,}\]\s]*')
+
+
+def _skip_ws(buf, pos: int) -> int:
+    return _WHITESPACE.match(buf, pos).end()
+
+
+def _value_end(buf, pos: int) -> int:
+    # End offset of the JSON value starting at ``pos``, found without decoding it
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        return _STRING_REST.match(buf, pos + 1).end()
+    if first not in (b'{', b'['):
+        return _SCALAR.match(buf, pos).end()
+    depth = 0
+    for token in _BRACKET.finditer(buf, pos):
+        char = token.group(1)
+        if char in (b'{', b'['):
+            depth += 1
+        elif char in (b'}', b']'):
+            depth -= 1
+            if depth == 0:
+                return token.end()
+    raise ValueError('truncated JSON')
+
+
+def _members(buf, pos: int) -> Iterator[Tuple[str, int, int]]:
+    # (key, value start, value end) of the JSON object starting at ``pos``
+    pos = _skip_ws(buf, pos)
+    if buf[pos:pos + 1] != b'{':
+        raise ValueError(f'expected a JSON object at byte {pos}')
+    pos = _skip_ws(buf, pos + 1)
+    if buf[pos:pos + 1] == b'}':
+        return
+    while True:
+        key_end = _STRING_REST.match(buf, pos + 1).end()
+        key = json.loads(buf[pos:key_end])
+        pos = _skip_ws(buf, key_end)
+        if buf[pos:pos + 1] != b':':
+            raise ValueError(f'expected ":" at byte {pos}')
+        start = _skip_ws(buf, pos + 1)
+        end = _value_end(buf, start)
+        yield key, start, end
+        pos = _skip_ws(buf, end)
+        if buf[pos:pos + 1] == b'}':
+            return
+        pos = _skip_ws(buf, pos + 1)  # past the comma
+
+
+def index_book(buf) -> Tuple[Dict, Dict[str, Tuple[int, int]]]:
+    """The root's own fields and the byte range of each first-move subtree of a JSON book."""
+    root: Dict = {}
+    children: Dict[str, Tuple[int, int]] = {}
+    for key, start, end in _members(buf, 0):
+        if key == 'children':
+            if buf[start:start + 1] == b'{':
+                children = {uci: (s, e) for uci, s, e in _members(buf, start)}
+        else:
+            root[key] = json.loads(buf[start:end])
+    return root, children
+
+
+def read_shard(path: str) -> Iterator[Tuple[List[str], Dict]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry['path'], entry['node']
+
+
+def merged_shard_subtrees(lines: Iterator[Tuple[List[str], Dict]]) -> Iterator[Tuple[str, Dict]]:
+    # Yield (first_move, subtree) in sorted order, combining all shard lines below
+    # that first move. Lines from one crawl agree on stats, so duplicates (shared
+    # ancestors written by several shards) are reconciled with 'max'.
+    for first, group in itertools.groupby(lines, key=lambda entry: entry[0][0]):
+        subtree = _empty_node()
+        for path, node in group:
+            target = subtree
+            for uci in path[1:]:
+                target = target['children'].setdefault(uci, _empty_node())
+            merge_node(target, node, 'max')
+        yield first, subtree
+
+
+def merge_books(shard_paths: List[str], output_path: str, base_path: Optional[str] = None,
+                stats_mode: str = 'replace') -> int:
+    """Write the merged book to ``output_path``; return the number of root subtrees."""
+    if not (base_path and os.path.exists(base_path)):
+        return _merge_into(shard_paths, output_path, {}, {}, None, stats_mode)
+    with open(base_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as base_map:
+        base, base_children = index_book(base_map)
+        return _merge_into(shard_paths, output_path, base, base_children, base_map, stats_mode)
+
+
+def _merge_into(shard_paths: List[str], output_path: str, base: Dict, base_children: Dict[str, Tuple[int, int]],
+                base_map, stats_mode: str) -> int:
+    pending_base = deque(sorted(base_children))
+
+    def base_subtree(uci: str) -> Dict:
+        start, end = base_children[uci]
+        return json.loads(base_map[start:end])
+
+    lines = heapq.merge(*(read_shard(p) for p in shard_paths), key=lambda entry: entry[0])
+    # Root lines (empty path) sort first in every shard; fold them into the root fields
+    root = {k: base.get(k) for k in ('stats', 'opening_name', 'eco', 'fetched_at')}
+    first_line = next(lines, None)
+    while first_line is not None and not first_line[0]:
+        merge_node(root, first_line[1], 'max')
+        first_line = next(lines, None)
+    if first_line is not None:
+        lines = itertools.chain([first_line], lines)
+    root.pop('children', None)
+
+    tmp_path = output_path + '.tmp'
+    written = 0
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write(json.dumps(root, ensure_ascii=False)[:-1] + ', "children": {')
+
+        def emit(uci: str, subtree: Dict) -> None:
+            nonlocal written
+            if written:
+                out.write(', ')
+            out.write(json.dumps(uci) + ': ' + json.dumps(subtree, ensure_ascii=False))
+            written += 1
+
+        for first, subtree in merged_shard_subtrees(lines):
+            while pending_base and pending_base[0] < first:
+                uci = pending_base.popleft()
+                emit(uci, base_subtree(uci))
+            if pending_base and pending_base[0] == first:
+                pending_base.popleft()
+                subtree = merge_node(base_subtree(first), subtree, stats_mode)
+            emit(first, subtree)
+        for uci in pending_base:
+            emit(uci, base_subtree(uci))
+        out.write('}}')
+    os.replace(tmp_path, output_path)
+    return written
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Merge sharded crawler output into one opening book.')
+    parser.add_argument('shards', nargs='+', help='shard .ndjson files written by the crawler')
+    parser.add_argument('--base', default=OPENING_BOOK_FILE,
+                        help='existing book to merge into, if present (default: %(default)s)')
+    parser.add_argument('--output', default=OPENING_BOOK_FILE, help='merged book path (default: %(default)s)')
+    parser.add_argument('--stats', choices=STATS_MODES, default='replace',
+                        help='how shard stats combine with the base book: replace (newest crawl wins), '
+                             'max (larger sample wins) or sum (independent sources)')
+    args = parser.parse_args(argv)
+
+    count = merge_books(args.shards, args.output, base_path=args.base, stats_mode=args.stats)
+    logger.info(f'Merged {len(args.shards)} shard(s) into {args.output} ({count} root subtrees)')
+
+
+if __name__ == '__main__':
+    main()
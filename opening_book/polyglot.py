@@ -0,0 +1,151 @@
+"""Polyglot ``.bin`` export and lookup for the opening book.
+
+A Polyglot book is a flat file of 16-byte entries ``(zobrist key, move,
+weight, learn)`` sorted by key, so a position can be looked up by binary
+search without loading the file into memory. :func:`export_trie` writes our
+JSON trie in that format and :class:`PolyglotBook` reads any Polyglot book
+(ours or a third-party one) through python-chess's memory-mapped reader.
+
+    python -m opening_book.polyglot export --input opening_book.json --output opening_book.bin
+    python -m opening_book.polyglot probe --book opening_book.bin e2e4 e7e5
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import chess
+import chess.polyglot
+
+if __package__ is None or __package__ == "":
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from opening_book import query_db
+from opening_book.crawler import OPENING_BOOK_FILE
+
+POLYGLOT_BOOK_FILE = "opening_book.bin"
+ENTRY = struct.Struct(">QHHI")
+MAX_WEIGHT = 0xFFFF
+PROMOTION_CODES = {None: 0, chess.KNIGHT: 1, chess.BISHOP: 2, chess.ROOK: 3, chess.QUEEN: 4}
+
+
+def encode_move(board: chess.Board, move: chess.Move) -> int:
+    to_square = move.to_square
+    if board.is_castling(move):
+        # Polyglot encodes castling as "king takes own rook"
+        rook_file = 7 if chess.square_file(move.to_square) > chess.square_file(move.from_square) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    return (chess.square_file(to_square)
+            | chess.square_rank(to_square) << 3
+            | chess.square_file(move.from_square) << 6
+            | chess.square_rank(move.from_square) << 9
+            | PROMOTION_CODES[move.promotion] << 12)
+
+
+def collect_entries(trie: dict) -> Dict[int, Dict[int, int]]:
+    # zobrist key -> {encoded move: game count}. Transpositions reach the same
+    # explorer position, so counts are identical and we simply keep the max.
+    entries: Dict[int, Dict[int, int]] = {}
+    board = chess.Board()
+
+    def dfs(node: dict) -> None:
+        children = node.get('children') or {}
+        if not children:
+            return
+        moves = entries.setdefault(chess.polyglot.zobrist_hash(board), {})
+        for uci, child in children.items():
+            move = chess.Move.from_uci(uci)
+            encoded = encode_move(board, move)
+            total = sum(child.get('stats') or [0, 0, 0])
+            moves[encoded] = max(moves.get(encoded, 0), total)
+            board.push(move)
+            dfs(child)
+            board.pop()
+
+    dfs(trie)
+    return entries
+
+
+def scale_weights(moves: Dict[int, int]) -> List[Tuple[int, int]]:
+    # Polyglot weights are 16 bit; scale per position, keeping every move >= 1
+    top = max(moves.values(), default=0)
+    factor = MAX_WEIGHT / top if top > MAX_WEIGHT else 1
+    return [(move, max(1, int(total * factor))) for move, total in moves.items()]
+
+
+def export_trie(trie: dict, output_path: str) -> int:
+    """Write ``trie`` as a Polyglot book; return the number of entries."""
+    rows = []
+    for key, moves in collect_entries(trie).items():
+        for move, weight in scale_weights(moves):
+            rows.append((key, move, weight))
+    rows.sort(key=lambda row: (row[0], -row[2], row[1]))
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for key, move, weight in rows:
+            f.write(ENTRY.pack(key, move, weight, 0))
+    os.replace(tmp_path, output_path)
+    return len(rows)
+
+
+class PolyglotBook:
+    """Constant-memory book backend over any Polyglot ``.bin`` file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader = chess.polyglot.open_reader(path)
+
+    def book_moves(self, board: chess.Board) -> List[dict]:
+        # Same shape as the explorer/local-book move dicts, with the weight in 'games'
+        return [{'uci': entry.move.uci(), 'games': entry.weight}
+                for entry in self._reader.find_all(board)]
+
+    def choose_move(self, board: chess.Board, rng: Optional[random.Random] = None) -> Optional[str]:
+        # Weighted random choice among the book moves, or None when out of book
+        moves = self.book_moves(board)
+        if not moves:
+            return None
+        weights = [m['games'] for m in moves]
+        if not any(weights):
+            weights = [1] * len(moves)
+        return (rng or random).choices([m['uci'] for m in moves], weights=weights, k=1)[0]
+
+    def __len__(self) -> int:
+        return len(self._reader)
+
+    def close(self) -> None:
+        self._reader.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Export or probe Polyglot opening books.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    export = sub.add_parser('export', help='convert the JSON trie into a Polyglot .bin book')
+    export.add_argument('--input', default=OPENING_BOOK_FILE)
+    export.add_argument('--output', default=POLYGLOT_BOOK_FILE)
+
+    probe = sub.add_parser('probe', help='list book moves after a sequence of UCI moves')
+    probe.add_argument('--book', default=POLYGLOT_BOOK_FILE)
+    probe.add_argument('moves', nargs='*')
+
+    args = parser.parse_args(argv)
+    if args.command == 'export':
+        trie = query_db.load_trie(args.input)
+        count = export_trie(trie, args.output)
+        print(f"Wrote {count} entries to {args.output}")
+    else:
+        board = chess.Board()
+        for uci in args.moves:
+            board.push_uci(uci)
+        book = PolyglotBook(args.book)
+        for m in book.book_moves(board):
+            print(f"{m['uci']}\t{m['games']}")
+        book.close()
+
+
+if __name__ == '__main__':
+    main()
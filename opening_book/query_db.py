@@ -1,22 +1,81 @@
+import bisect
+import gzip
 import json
+import logging
+import os
 import random
 import re
+import sys
 from typing import List, Tuple, Dict, Any, Set, Optional
 
+# When run directly, add the repository root so ``chess_trainer`` can be imported
+if __package__ is None or __package__ == "":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chess_trainer.game_log import verbose
+
+logger = logging.getLogger(__name__)
+
+COMPACT_FORMAT = "compact-v1"
+
 
 def load_trie(path: str) -> dict:
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    # Accepts the crawler's plain JSON as well as the gzipped compact format
+    # written by ``opening_book.compact``
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('format') == COMPACT_FORMAT:
+        return expand_compact(data['root'])
+    return data
+
+
+def expand_compact(node: dict, parent_name: Optional[str] = None, parent_eco: Optional[str] = None) -> dict:
+    # Compact nodes use short keys and omit names/ECO inherited from the parent
+    name = node['n'] if 'n' in node else parent_name
+    eco = node['e'] if 'e' in node else parent_eco
+    return {
+        'stats': node.get('s'),
+        'opening_name': name,
+        'eco': eco,
+        'fetched_at': node.get('t'),
+        'children': {uci: expand_compact(child, name, eco) for uci, child in node.get('c', {}).items()},
+    }
+
+def build_name_index(trie: dict) -> List[Tuple[List[str], dict, str]]:
+    # (path, node, opening_name) of every named node, in the order find_matching_nodes
+    # visits them, so a lookup scans the named nodes instead of walking the whole trie
+    index: List[Tuple[List[str], dict, str]] = []
+    stack: List[Tuple[dict, List[str]]] = [(trie, [])]
+    while stack:
+        n, path = stack.pop()
+        if n.get('opening_name'):
+            index.append((path, n, n['opening_name']))
+        for uci, child in reversed(list(n.get('children', {}).items())):
+            stack.append((child, path + [uci]))
+    return index
 
 def find_matching_nodes(
     node: dict,
-    targets: List[str]
+    targets: List[str],
+    index: Optional[List[Tuple[List[str], dict, str]]] = None
 ) -> List[Tuple[List[str], dict, Set[str]]]:
     # Return (path, node, matched_targets), where matched_targets is the subset of `targets` whose substrings matched node['opening_name']
     out: List[Tuple[List[str], dict, Set[str]]] = []
     patterns = [(t, re.compile(re.escape(t), re.IGNORECASE))
                 for t in targets]
 
+    if index is not None:
+        # many nodes share a name; match each distinct name once
+        by_name: Dict[str, Set[str]] = {}
+        for path, n, name in index:
+            matched = by_name.get(name)
+            if matched is None:
+                matched = by_name[name] = {t for t, p in patterns if p.search(name)}
+            if matched:
+                out.append((list(path), n, set(matched)))
+        return out
+
     def dfs(n: dict, path: List[str]):
         name = n.get('opening_name')
         # skip any node that has no opening_name
@@ -56,10 +115,55 @@ def get_node_by_path(trie: dict, path: List[str]) -> dict:
         n = n.get('children', {}).get(move, {})
     return n
 
+class CompiledTargets:
+    # Every full continuation through a node matching the targets, with the targets it
+    # matched, in find_matching_nodes order. The lines are also kept sorted, so the
+    # ones passing through a position are found with a bisect instead of a scan.
+    __slots__ = ("lines", "_sorted")
+
+    def __init__(self, lines: List[Tuple[Tuple[str, ...], Set[str]]]):
+        self.lines = lines
+        self._sorted = sorted((line, i) for i, (line, _) in enumerate(lines))
+
+    def through(self, seq: List[str]) -> List[Tuple[Tuple[str, ...], Set[str]]]:
+        # lines that start with ``seq`` and go past it, in their original order
+        prefix = tuple(seq)
+        k = len(prefix)
+        hits = []
+        for line, i in self._sorted[bisect.bisect_left(self._sorted, (prefix,)):]:
+            if line[:k] != prefix:
+                break
+            if len(line) > k:
+                hits.append(i)
+        return [self.lines[i] for i in sorted(hits)]
+
+def _target_lines(
+    trie: dict,
+    targets: List[str],
+    index: Optional[List[Tuple[List[str], dict, str]]] = None
+) -> List[Tuple[List[str], Set[str]]]:
+    # (full_continuation_path, matched_targets) for every node matching the targets
+    lines: List[Tuple[List[str], Set[str]]] = []
+    for path, node, matched in find_matching_nodes(trie, targets, index):
+        for leaf in collect_full_continuations(path, node):
+            lines.append((leaf, matched))
+    return lines
+
+def compile_targets(
+    trie: dict,
+    targets: List[str],
+    index: Optional[List[Tuple[List[str], dict, str]]] = None
+) -> CompiledTargets:
+    # The part of candidate_moves_for_position that depends only on the book and the
+    # targets; compile once per repertoire and pass it as ``compiled`` on every move
+    return CompiledTargets([(tuple(line), matched) for line, matched in _target_lines(trie, targets, index)])
+
 def candidate_moves_for_position(
     trie: dict,
     targets: List[str],
-    current_seq: List[str]
+    current_seq: List[str],
+    index: Optional[List[Tuple[List[str], dict, str]]] = None,
+    compiled: Optional[CompiledTargets] = None
 ) -> Dict[str, Dict[str, Any]]:
     """
     Returns a mapping:
@@ -81,35 +185,31 @@ def candidate_moves_for_position(
       # ... etc. for any other transposed paths
     }
     """
-    matches = find_matching_nodes(trie, targets)
-
-    all_conts: List[Tuple[List[str], Set[str]]] = []
-    # build list of (full_continuation_path, matched_targets)
-    for path, node, matched in matches:
-        for leaf in collect_full_continuations(path, node):
-            all_conts.append((leaf, matched))
-
     k = len(current_seq)
-    resp: Dict[str, Dict[str, Any]] = {}
+    # only look at lines that begin with exactly current_seq
+    if compiled is not None:
+        lines = compiled.through(current_seq)
+    else:
+        lines = [(cont, matched) for cont, matched in _target_lines(trie, targets, index)
+                 if cont[:k] == current_seq and len(cont) > k]
 
-    for cont, matched in all_conts:
-        # only look at lines that begin with exactly current_seq
-        if cont[:k] == current_seq and len(cont) > k:
-            nxt = cont[k]
-            full_path = cont[:k+1]
-            child = get_node_by_path(trie, full_path)
-            stats = child.get('stats')
-            entry = resp.setdefault(nxt, {
-                'stats': stats,
-                'continuations': [],
-                'queried': set()
-            })
-            entry['stats'] = [x + y for x, y in zip(entry['stats'], stats)]
-            # record only those targets that actually matched here
-            entry['queried'].update(matched)
-            line = " ".join(cont)
-            if line not in entry['continuations']:
-                entry['continuations'].append(line)
+    resp: Dict[str, Dict[str, Any]] = {}
+    for cont, matched in lines:
+        nxt = cont[k]
+        full_path = cont[:k+1]
+        child = get_node_by_path(trie, full_path)
+        stats = child.get('stats')
+        entry = resp.setdefault(nxt, {
+            'stats': stats,
+            'continuations': [],
+            'queried': set()
+        })
+        entry['stats'] = [x + y for x, y in zip(entry['stats'], stats)]
+        # record only those targets that actually matched here
+        entry['queried'].update(matched)
+        line = " ".join(cont)
+        if line not in entry['continuations']:
+            entry['continuations'].append(line)
 
     # convert queried sets to sorted lists
     for info in resp.values():
@@ -117,11 +217,17 @@ def candidate_moves_for_position(
 
     return resp
 
-def choose_book_move(trie_: dict, targets: List[str], current_seq: List[str]) -> Optional[str]:
+def choose_book_move(trie_: dict, targets: List[str], current_seq: List[str],
+                     index: Optional[List[Tuple[List[str], dict, str]]] = None,
+                     compiled: Optional[CompiledTargets] = None) -> Optional[str]:
     # Return a weighted random book move leading toward the target openings
     # rather than a set of candidate moves
-    candidates_ = candidate_moves_for_position(trie_, targets, current_seq)
+    candidates_ = candidate_moves_for_position(trie_, targets, current_seq, index, compiled)
     # print(f"Candidate moves for position: {candidates_}")
+    return pick_weighted(candidates_)
+
+def pick_weighted(candidates_: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    # Weighted random choice over candidate_moves_for_position() output, by game count
     if not candidates_:
         return None
 
@@ -132,12 +238,35 @@ def choose_book_move(trie_: dict, targets: List[str], current_seq: List[str]) ->
         moves_.append(uci)
         weights.append(sum(stats))
 
-    print(f"Candidate moves for position: {moves_}")
+    if verbose(logger):
+        logger.debug("Candidate moves for position", extra={"fields": {"candidates": dict(zip(moves_, weights))}})
     if not any(weights):
         weights = [1] * len(moves_)
 
     return random.choices(moves_, weights=weights, k=1)[0]
 
+def book_moves_at(trie_: dict, seq: List[str], top_n: Optional[int] = None) -> List[Dict[str, Any]]:
+    # Explorer-shaped move list (uci, white, draws, black, opening) for the node at ``seq``
+    node = get_node_by_path(trie_, seq)
+    moves_ = []
+    for uci, child in (node.get("children") or {}).items():
+        stats = child.get("stats") or [0, 0, 0]
+        entry = {
+            "uci": uci,
+            "white": stats[0],
+            "draws": stats[1],
+            "black": stats[2],
+        }
+        name = child.get("opening_name")
+        if name:
+            entry["opening"] = {"name": name}
+        moves_.append(entry)
+
+    if top_n is not None and len(moves_) > top_n:
+        moves_.sort(key=lambda m: m["white"] + m["draws"] + m["black"], reverse=True)
+        moves_ = moves_[:top_n]
+    return moves_
+
 def get_opening_name_for_moves(trie_: dict, moves_: list[str]) -> Optional[str]:
     """
     Follow moves down the trie via get_node_by_path.
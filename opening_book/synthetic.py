@@ -0,0 +1,88 @@
+"""Synthetic opening books for tests and benchmarks.
+
+Builds a trie in the crawler's format from random legal moves, so it can be
+used anywhere a real ``opening_book.json`` is expected (query_db, Polyglot
+export, the fake explorer server, ...) without network access.
+
+    python -m opening_book.synthetic --depth 6 --branching 4 --output synthetic_book.json
+"""
+import argparse
+import json
+import random
+from typing import Dict, Optional
+
+import chess
+
+ROOT_GAMES = 1_000_000
+
+
+def make_synthetic_book(depth: int = 6, branching: int = 3, name_density: float = 0.3,
+                        seed: int = 0, root_games: int = ROOT_GAMES) -> Dict:
+    """Return a trie ``depth`` plies deep with up to ``branching`` moves per node.
+
+    First moves always name a family ("Synthetic Opening N"); deeper nodes
+    name a variation of their family with probability ``name_density``.
+    """
+    rng = random.Random(seed)
+    board = chess.Board()
+    counter = 0
+
+    def split(total: int, parts: int):
+        weights = sorted((rng.random() + 0.05 for _ in range(parts)), reverse=True)
+        scale = sum(weights)
+        return [max(1, int(total * w / scale)) for w in weights]
+
+    def build(ply: int, total: int, family: Optional[str]) -> Dict:
+        nonlocal counter
+        if ply >= depth:
+            return {}
+        legal = sorted(board.legal_moves, key=lambda m: m.uci())
+        if not legal:
+            return {}
+        moves = rng.sample(legal, min(branching, len(legal)))
+        children = {}
+        for move, games in zip(moves, split(total, len(moves))):
+            white = int(games * rng.uniform(0.3, 0.45))
+            black = int(games * rng.uniform(0.2, 0.35))
+            name = eco = None
+            child_family = family
+            if ply == 0:
+                counter += 1
+                name = child_family = f"Synthetic Opening {counter}"
+            elif rng.random() < name_density:
+                counter += 1
+                name = f"{family}: Variation {counter}"
+            if name:
+                eco = f"{'ABCDE'[counter % 5]}{counter % 100:02d}"
+            board.push(move)
+            children[move.uci()] = {
+                'stats': [white, games - white - black, black],
+                'opening_name': name,
+                'eco': eco,
+                'fetched_at': None,
+                'children': build(ply + 1, games, child_family),
+            }
+            board.pop()
+        return children
+
+    return {'stats': None, 'opening_name': None, 'eco': None, 'fetched_at': None,
+            'children': build(0, root_games, None)}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Write a synthetic opening book.')
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--branching', type=int, default=3)
+    parser.add_argument('--name-density', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='synthetic_book.json')
+    args = parser.parse_args(argv)
+
+    book = make_synthetic_book(args.depth, args.branching, args.name_density, args.seed)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(book, f, ensure_ascii=False)
+    print(f"Synthetic book written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
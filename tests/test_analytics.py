@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from opening_book import analytics
+from opening_book.synthetic import make_synthetic_book
+
+
+def _leaf(stats, name=None):
+    return {"stats": stats, "opening_name": name, "eco": None, "children": {}}
+
+
+BOOK = {
+    "stats": None, "opening_name": None, "eco": None,
+    "children": {
+        "e2e4": {
+            "stats": [60, 20, 20], "opening_name": "King's Pawn Game", "eco": "B00",
+            "children": {
+                "e7e5": {"stats": [30, 10, 10], "opening_name": None, "eco": None,
+                         "children": {"g1f3": _leaf([20, 5, 5])}},
+                "c7c5": {"stats": [20, 10, 20], "opening_name": "Sicilian Defense", "eco": "B20",
+                         "children": {"g1f3": _leaf([10, 5, 10]), "b1c3": _leaf([5, 5, 5])}},
+            },
+        },
+        "d2d4": _leaf([10, 10, 20], "Queen's Pawn Game"),
+    },
+}
+
+
+def test_per_opening_aggregates():
+    rows = {r["opening"]: r for r in analytics.analyse_book(BOOK, "unused.json", workers=1, split_plies=1)}
+
+    kp = rows["King's Pawn Game"]
+    assert kp["games"] == 100 and kp["entry_ply"] == 1 and kp["eco"] == "B00"
+    assert kp["white_score_pct"] == 70.0
+    assert kp["positions"] == 3  # e4, e4 e5, e4 e5 Nf3
+    assert kp["depth_hist"] == "3:1"
+    assert kp["branching_mean"] == 1.5  # e4 has two children, e4 e5 one
+
+    sicilian = rows["Sicilian Defense"]
+    assert sicilian["games"] == 50 and sicilian["black_score_pct"] == 50.0
+    assert sicilian["lines"] == 2 and sicilian["depth_mean"] == 3.0
+
+    qp = rows["Queen's Pawn Game"]
+    assert qp["black_score_pct"] == 62.5 and qp["branching_mean"] == ""
+
+
+def test_parallel_matches_serial_and_csv_round_trip(tmp_path):
+    book = make_synthetic_book(depth=4, branching=3, seed=9)
+    path = tmp_path / "book.json"
+    path.write_text(json.dumps(book))
+
+    serial = analytics.analyse_book(book, str(path), workers=1)
+    parallel = analytics.analyse_book(book, str(path), workers=2, split_plies=1)
+    assert serial == parallel
+    # every position below the root belongs to some opening
+    assert sum(r["positions"] for r in serial) == 3 + 9 + 27 + 81
+
+    out = tmp_path / "analytics.csv"
+    analytics.write_csv(serial, str(out))
+    rows = analytics.read_csv(str(out))
+    assert [r["opening"] for r in rows] == [r["opening"] for r in serial]
+    assert rows[0]["games"] == serial[0]["games"]
+    assert isinstance(rows[0]["white_score_pct"], float)
+
+
+def test_analytics_endpoint_clamps_the_limit(tmp_path, monkeypatch):
+    os.environ.setdefault("STOCKFISH_PATH", os.path.abspath(os.path.join(
+        os.path.dirname(__file__), "..", "loadtest", "random_engine.py")))  # the trainer looks for one at import
+    from chess_trainer import ui
+
+    path = str(tmp_path / "analytics.csv")
+    analytics.write_csv(analytics.analyse_book(BOOK, "unused.json", workers=1, split_plies=1), path)
+    monkeypatch.setattr(analytics, "ANALYTICS_FILE", path)
+    client = ui.app.test_client()
+    everything = client.get("/api/openings/analytics").get_json()["openings"]
+    assert len(everything) > 1
+    assert client.get("/api/openings/analytics?limit=abc").get_json()["openings"] == everything
+    assert len(client.get("/api/openings/analytics?limit=1").get_json()["openings"]) == 1
+    assert len(client.get("/api/openings/analytics?limit=-5").get_json()["openings"]) == 1
@@ -0,0 +1,110 @@
+import gc
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from opening_book import query_db
+from opening_book.book_manager import BookManager
+from opening_book.synthetic import make_synthetic_book
+
+
+def _write(path, book, mtime):
+    path.write_text(json.dumps(book))
+    os.utime(path, (mtime, mtime))
+
+
+def test_reload_swaps_book_and_releases_old_snapshot(tmp_path):
+    path = tmp_path / "book.json"
+    old_book = make_synthetic_book(depth=3, branching=2, seed=1)
+    new_book = make_synthetic_book(depth=3, branching=3, seed=2)
+    _write(path, old_book, 1_000_000)
+
+    manager = BookManager(str(path), poll_interval=0)
+    game_book = manager.load()
+    assert game_book.version == 1 and game_book.trie == old_book
+    assert not manager.check()  # unchanged file
+
+    _write(path, new_book, 2_000_000)
+    assert manager.check()
+    manager.wait_loaded(5)
+    assert manager.current().version == 2 and manager.current().trie == new_book
+    # the running game still sees the book it started with
+    assert game_book.trie == old_book
+    assert manager.retired_versions() == [1]
+
+    del game_book
+    gc.collect()
+    assert manager.retired_versions() == []
+
+    # a broken file (e.g. caught mid-write) keeps the current book
+    path.write_text("{")
+    os.utime(path, (3_000_000, 3_000_000))
+    assert manager.check()
+    manager.wait_loaded(5)
+    assert manager.current().version == 2
+    assert not manager.check()  # not retried until the file changes again
+
+
+def test_initial_load_waits_out_a_file_being_replaced(tmp_path, monkeypatch):
+    monkeypatch.setattr("opening_book.book_manager.SETTLE_DELAY", 0)
+    path = tmp_path / "book.json"
+    old_book = make_synthetic_book(depth=3, branching=2, seed=1)
+    new_book = make_synthetic_book(depth=3, branching=3, seed=2)
+    _write(path, old_book, 1_000_000)
+    loads = []
+
+    def loader(p):
+        loads.append(p)
+        trie = query_db.load_trie(p)
+        if len(loads) == 1:
+            _write(path, new_book, 2_000_000)  # replaced while the first read runs
+        elif len(loads) == 2:
+            _write(path, new_book, 3_000_000)  # then read mid-write, before the writer finished
+            raise ValueError("truncated")
+        return trie
+
+    manager = BookManager(str(path), poll_interval=0, loader=loader)
+    snapshot = manager.load()
+    assert len(loads) == 3
+    assert snapshot is manager.current() and snapshot.trie == new_book and snapshot.version == 1
+    assert not manager.check()
+
+    path.write_text("{")
+    assert BookManager(str(path), poll_interval=0).load() is None  # unreadable and not changing
+
+
+def test_name_index_gives_same_matches():
+    book = make_synthetic_book(depth=4, branching=3, name_density=0.5, seed=4)
+    index = query_db.build_name_index(book)
+    targets = sorted({child["opening_name"] for child in book["children"].values()})[:2]
+    assert query_db.find_matching_nodes(book, targets, index) == query_db.find_matching_nodes(book, targets)
+    seq = next(iter(book["children"].keys()))
+    assert (query_db.candidate_moves_for_position(book, targets, [seq], index)
+            == query_db.candidate_moves_for_position(book, targets, [seq]))
+
+
+def test_compiled_targets_match_and_are_cached(monkeypatch):
+    from opening_book import lichess_openings_explorer as oe
+
+    book = make_synthetic_book(depth=5, branching=3, name_density=0.5, seed=5)
+    names = sorted({child["opening_name"] for child in book["children"].values()})
+    snapshot = BookManager.from_trie(book).current()
+    compiled = query_db.compile_targets(book, names[:2], snapshot.index)
+    for seq in [[], [next(iter(book["children"]))], query_db.build_name_index(book)[-1][0][:2], ["a1a1"]]:
+        assert (query_db.candidate_moves_for_position(book, names[:2], seq, compiled=compiled)
+                == query_db.candidate_moves_for_position(book, names[:2], seq))
+
+    monkeypatch.setattr(oe, "COMPILED_REPERTOIRES", 2)
+    monkeypatch.setattr(oe, "_COMPILED", type(oe._COMPILED)())
+    monkeypatch.setattr(oe, "_COMPILED_STATS", {"hits": 0, "misses": 0})
+    first = oe.compiled_targets(snapshot, names[:2])
+    assert oe.compiled_targets(snapshot, list(reversed(names[:2]))) is first  # order doesn't matter
+    oe.compiled_targets(snapshot, names[1:3])
+    oe.compiled_targets(snapshot, names[:1])  # evicts the least recently used repertoire
+    assert oe.compiled_targets(snapshot, names[:2]) is not first
+    # a reloaded book never gets the old book's compiled lines
+    reloaded = BookManager.from_trie(book).current()
+    assert oe.compiled_targets(reloaded, names[:1]) is not oe.compiled_targets(snapshot, names[:1])
+    assert oe.compiled_cache_info() == {"size": 2, "max_size": 2, "hits": 1, "misses": 6}
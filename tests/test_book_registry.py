@@ -0,0 +1,76 @@
+import copy
+import json
+import os
+import sys
+
+import chess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer.bot_profile import BotProfile
+from opening_book import lichess_openings_explorer as oe
+from opening_book.book_registry import BookRegistry
+from opening_book.synthetic import make_synthetic_book
+
+
+def _manifest(tmp_path, books):
+    entries = []
+    for name, min_rating, trie in books:
+        (tmp_path / f"{name}.json").write_text(json.dumps(trie))
+        entries.append({"name": name, "path": f"{name}.json", "min_rating": min_rating})
+    path = tmp_path / "opening_books.json"
+    path.write_text(json.dumps({"books": entries}))
+    return str(path)
+
+
+def _node(name, stats, children=None):
+    return {"stats": stats, "opening_name": name, "eco": None, "fetched_at": None, "children": children or {}}
+
+
+def test_bands_share_identical_subtrees(tmp_path):
+    masters = make_synthetic_book(depth=4, branching=3, seed=5)
+    club = copy.deepcopy(masters)
+    # the bands differ near the root only
+    first = next(iter(club["children"].values()))
+    first["stats"] = [s + 1 for s in first["stats"]]
+    club["stats"] = [1, 2, 3]
+    club["fetched_at"] = 1_700_000_000.0
+
+    registry = BookRegistry.from_manifest(_manifest(tmp_path, [("1600", 1600, club), ("masters", 2200, masters)]),
+                                          poll_interval=0)
+    assert registry.load()
+    low, high = registry.current(1700).trie, registry.current(2400).trie
+    club["fetched_at"] = None
+    assert low == club and high == masters
+
+    uci = next(iter(masters["children"]))
+    assert low["children"][uci] is not high["children"][uci]
+    for reply in high["children"][uci]["children"]:
+        assert low["children"][uci]["children"][reply] is high["children"][uci]["children"][reply]
+    report = registry.sharing()
+    assert report["books"] == {"1600": report["nodes"] // 2, "masters": report["nodes"] // 2}
+    assert report["stored_nodes"] < report["nodes"] // 2 + 10
+
+    assert registry.band(1200).name == "1600"  # below every band: the lowest one
+    assert registry.band(2199).name == "1600"
+    assert registry.band(2200).name == "masters"
+    assert registry.current() is registry.current(3000)  # no rating: the default (last) book
+
+
+def test_book_move_comes_from_the_opponents_band(tmp_path, monkeypatch):
+    masters = _node(None, [0, 0, 0], {"e2e4": _node("Italian Game", [10, 5, 5])})
+    club = _node(None, [0, 0, 0], {"d2d4": _node("Italian Game", [10, 5, 5])})
+    registry = BookRegistry.from_manifest(_manifest(tmp_path, [("masters", 2200, masters), ("1600", 1600, club)]),
+                                          poll_interval=0)
+    registry.load()
+    monkeypatch.setattr(oe, "_BOOK_SERVICE", None)
+    monkeypatch.setattr(oe, "_BOOK_REGISTRY", registry)
+    monkeypatch.setattr(oe, "_BOOK_MANAGER", registry.default.manager)
+
+    profile = BotProfile(chosen_white=["Italian Game"], our_color=chess.WHITE)
+    profile.opp_rating = 1650
+    assert oe.get_book_move(chess.Board(), profile) == "d2d4"
+    profile.opp_rating = 2300
+    assert oe.get_book_move(chess.Board(), profile) == "e2e4"
+    # no rating: the default book, listed last
+    assert oe.current_book().trie["children"].keys() == {"d2d4"}
@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from opening_book import book_service, query_db
+from opening_book.synthetic import make_synthetic_book
+
+
+@pytest.fixture()
+def served_book():
+    book = make_synthetic_book(depth=4, branching=4, seed=5)
+    server = book_service.make_server(book_service.BookService(book), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield book, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _lines(book, plies):
+    lines = [[]]
+    for _ in range(plies):
+        lines = [line + [uci] for line in lines for uci in query_db.get_node_by_path(book, line)["children"]]
+    return lines
+
+
+def test_bulk_queries_match_direct_lookups(served_book):
+    book, url = served_book
+    client = book_service.BookServiceClient(url)
+    sequences = _lines(book, 2)
+    name = next(n["opening_name"] for n in book["children"].values() if n.get("opening_name"))
+
+    results = client.candidates([([name], seq) for seq in sequences])
+    assert results == [query_db.candidate_moves_for_position(book, [name], seq) for seq in sequences]
+    assert client.names(sequences) == [query_db.get_opening_name_for_moves(book, seq) for seq in sequences]
+    assert client.moves(sequences, top_n=2) == [query_db.book_moves_at(book, seq, 2) for seq in sequences]
+
+    node = client.subtree(sequences[0], depth=1)
+    assert set(node["children"]) == set(query_db.get_node_by_path(book, sequences[0])["children"])
+    assert all(child["children"] == {} for child in node["children"].values())
+
+
+def test_large_responses_are_compressed(served_book):
+    book, url = served_book
+    client = book_service.BookServiceClient(url)
+    conn = client._connection()
+    conn.request("GET", "/subtree?depth=3", headers={"Accept-Encoding": "gzip"})
+    response = conn.getresponse()
+    response.read()
+    assert response.getheader("Content-Encoding") == "gzip"
+    # the client decodes it transparently
+    assert len(client.subtree([], depth=3)["children"]) == len(book["children"])
+
+
+@pytest.mark.parametrize("depth", ["abc", "-1"])
+def test_bad_depth_is_a_bad_request(served_book, depth):
+    _, url = served_book
+    conn = book_service.BookServiceClient(url)._connection()
+    conn.request("GET", f"/subtree?depth={depth}")
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 400
+    conn.request("GET", "/health")  # the connection is still usable
+    assert conn.getresponse().status == 200
+
+
+def test_repertoires_are_compiled_once_against_the_name_index(monkeypatch):
+    book = make_synthetic_book(depth=4, branching=4, seed=5)
+    service = book_service.BookService(book)
+    names = sorted({n["opening_name"] for n in book["children"].values() if n.get("opening_name")})[:2]
+    compiled = []
+    real = query_db.compile_targets
+
+    def compile_targets(trie, targets, index=None):
+        compiled.append(index)
+        return real(trie, targets, index)
+
+    monkeypatch.setattr(query_db, "compile_targets", compile_targets)
+    for seq in _lines(book, 2):
+        assert service.candidates(names, seq) == query_db.candidate_moves_for_position(book, names, seq)
+        service.candidates(names[::-1], seq)
+    assert compiled == [service.index]
+
+
+@pytest.mark.parametrize("queries", [["e2e4"], [{"targets": "Italian Game"}], [{"moves": [1, 2]}], {"moves": []}])
+def test_malformed_queries_are_a_bad_request(served_book, queries):
+    _, url = served_book
+    conn = book_service.BookServiceClient(url)._connection()
+    body = json.dumps({"queries": queries})
+    conn.request("POST", "/candidates", body, {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 400
+    conn.request("GET", "/health")
+    assert conn.getresponse().status == 200
+
+
+def test_unavailable_service_raises():
+    client = book_service.BookServiceClient("http://127.0.0.1:9", timeout=0.5)
+    with pytest.raises(book_service.BookServiceError):
+        client.names([[]])
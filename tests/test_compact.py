@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from opening_book import compact, query_db
+
+
+def _node(stats, name=None, eco=None, children=None):
+    return {"stats": stats, "opening_name": name, "eco": eco, "fetched_at": None, "children": children or {}}
+
+
+TRIE = _node(None, children={
+    "e2e4": _node([500, 300, 200], "King's Pawn Game", "B00", {
+        "c7c5": _node([300, 200, 100], "Sicilian Defense", "B20", {
+            "g1f3": _node([200, 150, 50], "Sicilian Defense", "B20", {
+                "d7d6": _node([100, 50, 50]),
+                "a7a6": _node([2, 1, 1], "Sicilian Defense: O'Kelly Variation", "B28"),
+            }),
+        }),
+        "h7h5": _node([5, 3, 2]),
+    }),
+    "d2d4": _node([400, 300, 300], "Queen's Pawn Game", "A40"),
+})
+
+
+def test_prune_thresholds():
+    pruned = compact.prune(TRIE, min_games=50)
+    assert "h7h5" not in pruned["children"]["e2e4"]["children"]
+    assert "a7a6" not in pruned["children"]["e2e4"]["children"]["c7c5"]["children"]["g1f3"]["children"]
+
+    by_share = compact.prune(TRIE, min_share=0.5)
+    assert list(by_share["children"]["e2e4"]["children"]) == ["c7c5"]
+
+    shallow = compact.prune(TRIE, max_depth_per_opening=0)
+    assert "d7d6" not in shallow["children"]["e2e4"]["children"]["c7c5"]["children"]["g1f3"]["children"]
+    assert "a7a6" in shallow["children"]["e2e4"]["children"]["c7c5"]["children"]["g1f3"]["children"]
+    # the input is left untouched
+    assert "h7h5" in TRIE["children"]["e2e4"]["children"]
+
+
+def test_compact_roundtrip_preserves_queries(tmp_path):
+    path = str(tmp_path / "book.json.gz")
+    compact.write_compact(TRIE, path)
+    loaded = query_db.load_trie(path)
+    assert loaded == TRIE
+
+    g1f3 = compact.to_compact(TRIE)["c"]["e2e4"]["c"]["c7c5"]["c"]["g1f3"]
+    assert "n" not in g1f3 and "e" not in g1f3
+    assert g1f3["c"]["d7d6"]["n"] is None
+
+    seq = ["e2e4", "c7c5", "g1f3", "d7d6"]
+    assert query_db.get_opening_name_for_moves(loaded, seq) == "Sicilian Defense"
+    assert (query_db.candidate_moves_for_position(loaded, ["Sicilian"], ["e2e4"])
+            == query_db.candidate_moves_for_position(TRIE, ["Sicilian"], ["e2e4"]))
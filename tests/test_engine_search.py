@@ -0,0 +1,66 @@
+import os
+import sys
+from datetime import timedelta
+
+import chess
+import chess.engine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer import engine_search
+from chess_trainer.engine_search import EarlyStop, SearchStats, clock_budget
+
+RANDOM_ENGINE = os.path.join(os.path.dirname(__file__), "..", "loadtest", "random_engine.py")
+E4, D4 = chess.Move.from_uci("e2e4"), chess.Move.from_uci("d2d4")
+
+
+def _info(depth, move, cp, multipv=1, **extra):
+    return {"depth": depth, "multipv": multipv, "pv": [move],
+            "score": chess.engine.PovScore(chess.engine.Cp(cp), chess.WHITE), **extra}
+
+
+def test_clock_budget_accepts_millis_and_timedelta():
+    assert clock_budget({"wtime": 60_000, "winc": 2_000}, chess.WHITE, 5) == 60 / 30 + 1.5
+    assert clock_budget({"btime": timedelta(seconds=60), "binc": timedelta(seconds=2)}, chess.BLACK, 5) == 3.5
+    assert clock_budget({"wtime": 600_000}, chess.WHITE, 2) == 2  # capped by TIME_PER_MOVE
+    assert clock_budget({"wtime": 1_000, "winc": 10_000}, chess.WHITE, 2) == 0.5  # at most half of what's left
+    assert clock_budget({}, chess.WHITE, 2) == 2
+
+
+def test_stops_when_best_move_is_stable():
+    stop = EarlyStop(stable_depths=3, dominance_cp=1000, min_depth=4)
+    assert stop.update(_info(1, D4, 30)) is None
+    assert stop.update(_info(2, E4, 40)) is None
+    assert stop.update(_info(3, E4, 35, lowerbound=True)) is None  # fail-high lines don't count
+    assert stop.update(_info(3, E4, 35)) is None
+    assert stop.update(_info(4, E4, 35)) == "stable"
+    assert (stop.best, stop.depth, stop.stable) == (E4, 4, 3)
+
+
+def test_stops_when_one_move_dominates():
+    stop = EarlyStop(stable_depths=10, dominance_cp=150, min_depth=2)
+    assert stop.update(_info(2, E4, 300)) is None
+    assert stop.update(_info(2, D4, 200, multipv=2)) is None
+    assert stop.update(_info(3, E4, 400)) is None  # second line of depth 3 not in yet
+    assert stop.update(_info(3, D4, 100, multipv=2)) == "dominant"
+
+
+def test_search_with_uci_engine_and_forced_moves():
+    stats = SearchStats()
+    # one legal move: no engine needed
+    forced = chess.Board("7k/8/8/8/8/8/6q1/K7 w - - 0 1")
+    result = engine_search.search(None, forced, 1.0)
+    assert (result.move, result.reason) == (chess.Move.from_uci("a1b1"), "forced")
+    stats.add(result)
+
+    engine = chess.engine.SimpleEngine.popen_uci([sys.executable, RANDOM_ENGINE])
+    try:
+        board = chess.Board()
+        result = engine_search.search(engine, board, 1.0)
+        assert result.move in board.legal_moves
+        assert result.reason == "full" and result.saved > 0.5
+        stats.add(result)
+    finally:
+        engine.quit()
+    assert stats.moves == 2 and stats.reasons == {"forced": 1, "full": 1}
+    assert "saved per move" in stats.summary()
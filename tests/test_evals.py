@@ -0,0 +1,74 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer import evals
+from chess_trainer.engine_pool import EnginePool
+
+RANDOM_ENGINE = [sys.executable, os.path.join(os.path.dirname(__file__), "..", "loadtest", "random_engine.py")]
+
+
+def test_children_are_evaluated_in_parallel_then_cached(tmp_path):
+    cache = evals.EvalCache(str(tmp_path / "evals.sqlite3"))
+    pool = EnginePool(RANDOM_ENGINE, size=2)
+    children = ["g1f3", "b1c3", "f1c4", "d2d4", "e1e2"]
+    try:
+        first = list(evals.evaluate_children(["e2e4", "e7e5"], children + ["e2e4"], pool, cache, depth=2))
+        # the illegal move is skipped, the rest are searched
+        assert sorted(r["uci"] for r in first) == sorted(children)
+        assert not any(r["cached"] for r in first)
+        assert all(r["depth"] == 2 and r["best"] for r in first)
+        assert len(pool) == 2
+
+        second = list(evals.evaluate_children(["e2e4", "e7e5"], children, pool, cache, depth=2))
+        assert all(r["cached"] for r in second)
+        assert {r["uci"]: r["cp"] for r in second} == {r["uci"]: r["cp"] for r in first}
+        # a deeper request than what's stored is searched again
+        assert cache.get(_epd("e2e4", "e7e5", "g1f3"), 3) is None
+    finally:
+        pool.close()
+        cache.close()
+
+
+def test_cache_keeps_the_deepest_eval(tmp_path):
+    cache = evals.EvalCache(str(tmp_path / "evals.sqlite3"))
+    epd = _epd("d2d4")
+    cache.put(epd, {"depth": 20, "cp": 30, "mate": None, "best": "d7d5"})
+    cache.put(epd, {"depth": 10, "cp": 90, "mate": None, "best": "g8f6"})
+    assert cache.get(epd, 16) == {"depth": 20, "cp": 30, "mate": None, "best": "d7d5"}
+    cache.close()
+
+
+def test_pool_lends_each_engine_to_one_caller_at_a_time():
+    pool = EnginePool(RANDOM_ENGINE, size=1)
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.engine():
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(5)
+    try:
+        with pool.engine(timeout=0.2):
+            raise AssertionError("the only engine is busy")
+    except TimeoutError:
+        pass
+    release.set()
+    thread.join()
+    with pool.engine(timeout=1) as engine:
+        assert engine.id["name"] == "RandomMover"
+    pool.close()
+
+
+def _epd(*moves):
+    import chess
+    board = chess.Board()
+    for uci in moves:
+        board.push_uci(uci)
+    return board.epd()
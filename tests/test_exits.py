@@ -0,0 +1,43 @@
+import json
+import os
+import random
+import sys
+
+import chess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from opening_book import exits
+from opening_book.synthetic import make_synthetic_book
+
+RANDOM_ENGINE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "loadtest", "random_engine.py"))
+
+
+def test_band_moves_widen_for_lower_bands():
+    candidates = [{"uci": "e2e4", "cp": 30}, {"uci": "d2d4", "cp": 10}, {"uci": "a2a3", "cp": -100}]
+    bands = exits.band_moves(candidates, {1400: 150, 2000: 25, 2600: 0})
+    assert bands == {"1400": ["e2e4", "d2d4", "a2a3"], "2000": ["e2e4", "d2d4"], "2600": ["e2e4"]}
+
+
+def test_build_and_lookup(tmp_path):
+    book = make_synthetic_book(depth=2, branching=2, seed=4)
+    leaves = exits.repertoire_leaves(book, ["Synthetic Opening 1"])
+    assert leaves and all(len(line) == 2 for line in leaves)
+
+    table = exits.build_exit_table(book, ["Synthetic Opening 1"], RANDOM_ENGINE, depth=1, multipv=3,
+                                   workers=2, follow_plies=2, follow_lines=1)
+    path = tmp_path / "exits.json"
+    path.write_text(json.dumps(table))
+    loaded = exits.load_exit_table(str(path))
+
+    # the leaves plus up to two positions along each best line
+    assert len(leaves) < len(loaded) <= len(leaves) * 3
+    board = chess.Board()
+    for uci in leaves[0]:
+        board.push_uci(uci)
+    assert len(loaded.moves(board, 1500)) == 3  # random engine scores within 20cp
+    assert loaded.moves(board, 3000) == loaded.moves(board, 2600)
+    move = loaded.choose_move(board, 1500, random.Random(0))
+    assert chess.Move.from_uci(move) in board.legal_moves
+    assert loaded.choose_move(chess.Board(), 1500) is None
+    assert exits.load_exit_table(str(tmp_path / "missing.json")) is None
@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from opening_book.explorer_client import ExplorerClient, RateLimited
+
+
+class FakeResponse:
+    def __init__(self, moves, status_code=200, headers=None):
+        self._moves = moves
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def json(self):
+        return {"moves": self._moves}
+
+
+class FakeSession:
+    def __init__(self, responses, delay=0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append((url, params, timeout))
+        time.sleep(self.delay)
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+def _client(tmp_path, session, **kwargs):
+    return ExplorerClient(base_url="http://explorer.test", cache_path=str(tmp_path / "cache.sqlite3"),
+                          session=session, **kwargs)
+
+
+def test_responses_are_cached_on_disk(tmp_path):
+    session = FakeSession([FakeResponse([{"uci": "e2e4"}])])
+    client = _client(tmp_path, session)
+    assert client.fetch_moves(None, 5) == [{"uci": "e2e4"}]
+    client.close()
+
+    # a fresh client (e.g. after a restart) reads from the same cache file
+    reopened = _client(tmp_path, FakeSession([]))
+    assert reopened.fetch_moves(None, 5) == [{"uci": "e2e4"}]
+    assert reopened.stats["cache_hits"] == 1
+    assert session.calls[0][0] == "http://explorer.test/masters"
+    assert session.calls[0][2] is not None
+
+
+def test_empty_positions_are_negatively_cached(tmp_path):
+    session = FakeSession([FakeResponse([]), FakeResponse([{"uci": "a2a3"}])])
+    client = _client(tmp_path, session)
+    assert client.fetch_moves("e2e4", 5) == []
+    assert client.fetch_moves("e2e4", 5) == []
+    assert client.stats["negative_hits"] == 1
+
+    expired = _client(tmp_path, session, negative_ttl=0)
+    assert expired.fetch_moves("e2e4", 5) == [{"uci": "a2a3"}]
+
+
+def test_rating_bands_are_cached_separately(tmp_path):
+    session = FakeSession([FakeResponse([{"uci": "e2e4"}]), FakeResponse([{"uci": "d2d4"}])])
+    client = _client(tmp_path, session)
+    assert client.fetch_moves(None, 5, endpoint="lichess", ratings=[1800, 1600]) == [{"uci": "e2e4"}]
+    assert client.fetch_moves(None, 5, endpoint="lichess", ratings=[1600, 1800]) == [{"uci": "e2e4"}]
+    assert client.fetch_moves(None, 5, endpoint="lichess", ratings=[2000]) == [{"uci": "d2d4"}]
+    assert client.stats["cache_hits"] == 1
+    assert session.calls[0][0] == "http://explorer.test/lichess"
+    assert session.calls[0][1]["ratings"] == "1600,1800"
+
+
+def test_identical_inflight_queries_are_coalesced(tmp_path):
+    session = FakeSession([FakeResponse([{"uci": "d2d4"}])], delay=0.2)
+    client = _client(tmp_path, session)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.fetch_moves(None, 5)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(session.calls) == 1
+    assert results == [[{"uci": "d2d4"}]] * 4
+
+
+def test_rate_limit_honours_retry_after(tmp_path):
+    session = FakeSession([FakeResponse([], 429, {"Retry-After": "0"}), FakeResponse([{"uci": "c2c4"}])])
+    client = _client(tmp_path, session)
+    assert client.fetch_moves(None, 5) == [{"uci": "c2c4"}]
+    assert client.stats["rate_limited"] == 1
+
+
+def test_live_callers_fail_fast_on_rate_limit(tmp_path):
+    session = FakeSession([FakeResponse([], 429, {"Retry-After": "60"}), FakeResponse([{"uci": "c2c4"}])])
+    client = _client(tmp_path, session)
+    started = time.perf_counter()
+    with pytest.raises(RateLimited):
+        client.fetch_moves(None, 5, retries=0)
+    # within the Retry-After window no request is sent at all
+    with pytest.raises(RateLimited):
+        client.fetch_moves("e2e4", 5, retries=0)
+    assert time.perf_counter() - started < 1
+    assert len(session.calls) == 1 and client.stats["rate_limited"] == 1
+
+
+def test_a_shorter_retry_after_does_not_cut_the_limit_short(tmp_path):
+    client = _client(tmp_path, FakeSession([FakeResponse([], 429, {"Retry-After": "60"})]))
+    with pytest.raises(RateLimited):
+        client.fetch_moves(None, 5, retries=0)
+    # another thread's 429 with a shorter Retry-After lands afterwards: the later deadline stands
+    client._limit(1)
+    assert client._limited_for() > 59
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import chess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from loadtest.fake_explorer import FakeExplorer, explorer_response
+from opening_book import crawler, explorer_client
+from opening_book.explorer_client import ExplorerClient
+from opening_book.synthetic import make_synthetic_book
+
+
+def _strip(node):
+    return {uci: (tuple(child["stats"]), child["opening_name"], _strip(child["children"]))
+            for uci, child in node.items()}
+
+
+def test_response_shape_and_top_n():
+    book = make_synthetic_book(depth=2, branching=4, seed=3)
+    body = explorer_response(book, None, 2)
+    assert len(body["moves"]) == 2
+    totals = [m["white"] + m["draws"] + m["black"] for m in body["moves"]]
+    assert totals == sorted(totals, reverse=True)
+    assert body["moves"][0]["opening"]["name"].startswith("Synthetic Opening")
+    assert explorer_response(book, "a2a3,a7a6,b2b3", None)["moves"] == []
+
+
+def test_crawl_against_fake_with_rate_limits(monkeypatch):
+    book = make_synthetic_book(depth=3, branching=3, seed=5)
+    fake = FakeExplorer(book, rate_limit=0.3, retry_after=0, seed=2)
+    fake.start()
+    client = ExplorerClient(base_url=fake.url(), cache_path=None)
+    monkeypatch.setattr(explorer_client, "_client", client)
+    try:
+        root = crawler.Node()
+        crawler.crawl(root, chess.Board(), 0, max_ply=4, top_n=8, min_games=1)
+    finally:
+        fake.stop()
+        client.close()
+
+    assert _strip(root.to_dict()["children"]) == _strip(book["children"])
+    report = fake.report()
+    assert report["rate_limited"] == client.stats["rate_limited"] > 0
+    assert report["requests"] == client.stats["requests"]
+    assert report["duplicate_requests"] == 0
+    # every node of the book, leaves included, is queried exactly once
+    assert report["unique_queries"] == 1 + 3 + 9 + 27
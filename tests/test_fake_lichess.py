@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+
+import chess
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from loadtest.fake_lichess import FakeLichess
+
+
+def _play(base, game_id, bot_id):
+    """Play first-legal-move chess over the game stream, reconnecting on drops."""
+    status = "started"
+    while status == "started":
+        response = requests.get(f"{base}/api/bot/game/stream/{game_id}", stream=True, timeout=10)
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "gameFull":
+                    color = chess.WHITE if event["white"]["id"] == bot_id else chess.BLACK
+                    event = event["state"]
+                board = chess.Board()
+                for uci in event["moves"].split():
+                    board.push_uci(uci)
+                status = event["status"]
+                if status != "started":
+                    break
+                if board.turn == color:
+                    move = next(iter(board.legal_moves)).uci()
+                    assert requests.post(f"{base}/api/bot/game/{game_id}/move/{move}", timeout=10).ok
+        except requests.exceptions.ChunkedEncodingError:
+            pass  # injected disconnect
+    return status
+
+
+def test_scripted_game_with_disconnects():
+    fake = FakeLichess(bot_id="bot", games=1, think_time=(0, 0), max_plies=12, disconnect_rate=0.3, seed=1)
+    base = f"http://127.0.0.1:{fake.start()}"
+    try:
+        events = requests.get(f"{base}/api/stream/event", stream=True, timeout=10).iter_lines()
+        challenge = json.loads(next(events))
+        assert challenge["type"] == "challenge"
+        cid = challenge["challenge"]["id"]
+        assert requests.post(f"{base}/api/challenge/{cid}/accept", timeout=10).ok
+        game = json.loads(next(events))
+        assert game["type"] == "gameStart"
+
+        assert _play(base, game["game"]["id"], "bot") == "aborted"
+        assert fake.all_finished()
+
+        # moves are rejected once the game is over
+        assert requests.post(f"{base}/api/bot/game/{game['game']['id']}/move/e2e4", timeout=10).status_code == 400
+
+        report = fake.report()
+        assert report["finished"] == 1
+        assert report["bot_moves"] == 6
+        assert report["injected_disconnects"] > 0
+        assert report["stream_connects"] == 2 + report["injected_disconnects"]
+        assert report["move_latency_ms"]["p50"] is not None
+    finally:
+        fake.stop()
@@ -0,0 +1,98 @@
+import io
+import os
+import sys
+import types
+
+import chess
+import chess.pgn
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer.game_archive import GameArchive, GameRecord
+
+
+def _node(name, children=None):
+    return {"stats": [1, 1, 1], "opening_name": name, "eco": None, "fetched_at": None, "children": children or {}}
+
+
+BOOK = types.SimpleNamespace(trie=_node(None, {
+    "e2e4": _node("King's Pawn Game", {
+        "e7e5": _node("King's Pawn Game", {"g1f3": _node("King's Knight Opening", {
+            "b8c6": _node("King's Knight Opening", {"f1c4": _node("Italian Game")})})})}),
+    "d2d4": _node("Queen's Pawn Game"),
+}))
+
+
+def _record(game_id, opponent, moves, winner, started_at, our_color=chess.WHITE):
+    record = GameRecord(game_id)
+    me, them = {"id": "bot", "name": "Bot", "rating": 2000}, {"id": opponent.lower(), "name": opponent, "rating": 1500}
+    white, black = (me, them) if our_color else (them, me)
+    record.start({"white": white, "black": black, "speed": "rapid"}, our_color, 1700, BOOK)
+    for ply in range(len(moves)):
+        if ply % 2 == (0 if our_color else 1):
+            record.our_move(ply, moves[ply], "book", 0.004)
+        record.sync(moves[:ply + 1], {"wtime": 600000 - ply * 1000, "btime": 600000 - ply * 2000})
+    record.finish("resign" if winner else "draw", winner)
+    record.started_at = started_at
+    return record
+
+
+def test_games_are_written_in_batches_and_queried(tmp_path):
+    archive = GameArchive(str(tmp_path / "games.sqlite3"), batch_size=3, flush_interval=5)
+    italian = ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4"]
+    archive.add(_record("g1", "Alice", italian, "white", 1_000))
+    archive.add(_record("g2", "alice", ["d2d4"], None, 2_000))
+    archive.add(_record("g3", "Bob", italian[:3], "white", 3_000, our_color=chess.BLACK))
+    archive.add(_record("g4", "Bob", italian, "black", 4_000))
+    assert archive.flush(5)
+    assert archive.written == 4 and archive.batches == 2
+
+    assert [g["game_id"] for g in archive.games()] == ["g4", "g3", "g2", "g1"]
+    assert [g["game_id"] for g in archive.games(opponent="ALICE")] == ["g2", "g1"]
+    assert [g["game_id"] for g in archive.games(opening="King's")] == ["g3"]
+    assert [g["game_id"] for g in archive.games(opening="Italian Game", since=2_000)] == ["g4"]
+    assert [g["game_id"] for g in archive.games(since=2_000, until=4_000)] == ["g3", "g2"]
+
+    g1 = archive.games(opponent="alice")[-1]
+    assert (g1["result"], g1["our_color"], g1["opponent_rating"], g1["bot_rating"]) == ("1-0", "white", 1500, 1700)
+    moves = archive.moves(g1["id"])
+    assert [m["source"] for m in moves] == ["book", "opponent", "book", "opponent", "book"]
+    assert moves[0]["think_ms"] == 4.0 and moves[1]["btime"] == 598000
+
+    assert archive.results_by_opening() == [
+        {"opening": "Italian Game", "games": 2, "wins": 1, "draws": 0, "losses": 1},
+        {"opening": "King's Knight Opening", "games": 1, "wins": 0, "draws": 0, "losses": 1},
+        {"opening": "Queen's Pawn Game", "games": 1, "wins": 0, "draws": 1, "losses": 0},
+    ]
+    archive.close()
+
+
+def test_pgn_export_carries_sources_and_clocks(tmp_path):
+    archive = GameArchive(str(tmp_path / "games.sqlite3"))
+    archive.add(_record("abcd1234", "Alice", ["e2e4", "e7e5", "g1f3"], "white", 1_700_000_000))
+    archive.flush(5)
+    out = io.StringIO()
+    assert archive.export_pgn(out) == 1
+    archive.close()
+
+    game = chess.pgn.read_game(io.StringIO(out.getvalue()))
+    assert game.headers["Site"] == "https://lichess.org/abcd1234"
+    assert (game.headers["White"], game.headers["Black"], game.headers["Result"]) == ("Bot", "Alice", "1-0")
+    assert game.headers["Opening"] == "King's Knight Opening"
+    assert [m.uci() for m in game.mainline_moves()] == ["e2e4", "e7e5", "g1f3"]
+    first, second = list(game.mainline())[:2]
+    assert first.comment.startswith("book 4ms") and first.clock() == 600
+    assert second.comment.startswith("[%clk") and second.clock() == 598  # opponent move: clock only
+
+
+def test_a_bad_record_does_not_stop_the_writer(tmp_path):
+    archive = GameArchive(str(tmp_path / "games.sqlite3"))
+    broken = _record("bad", "Alice", ["e2e4"], "white", 1_000)
+    broken.book = types.SimpleNamespace(trie={"children": None})  # naming the opening raises
+    archive.add(broken)
+    archive.add(_record("good", "Bob", ["e2e4"], "white", 2_000))
+    assert archive.flush(5)
+    archive.add(_record("later", "Bob", ["d2d4"], None, 3_000))
+    assert archive.flush(5)
+    assert [g["game_id"] for g in archive.games()] == ["later", "good"]
+    archive.close()
@@ -0,0 +1,106 @@
+import io
+import json
+import logging
+import os
+import random
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer import game_log
+from opening_book import query_db
+
+logger = logging.getLogger("chess_trainer.trainer")
+
+
+def _configure(tmp_path, **kwargs):
+    stream = io.StringIO()
+    game_log.configure(log_dir=str(tmp_path), stream=stream, **kwargs)
+    return stream
+
+
+def test_records_go_to_the_console_and_the_games_file(tmp_path):
+    stream = _configure(tmp_path, level="INFO")
+    try:
+        with game_log.game_context("abc123", account="bot1"):
+            logger.info("-> (book) e2e4")
+            logger.debug("not at INFO")
+
+        def other_game():
+            with game_log.game_context("def456"):
+                logger.warning("Could not make move e7e5: 400")
+        thread = threading.Thread(target=other_game)
+        thread.start()
+        thread.join()
+        logger.info("Listening for events now...")
+    finally:
+        game_log.shutdown()
+
+    assert stream.getvalue().splitlines() == [
+        "[bot1-abc123] -> (book) e2e4",
+        "[def456] Could not make move e7e5: 400",
+        "Listening for events now...",
+    ]
+    first = (tmp_path / "bot1-abc123.log").read_text().splitlines()
+    assert len(first) == 1 and first[0].endswith("INFO chess_trainer.trainer: -> (book) e2e4")
+    assert "Could not make move" in (tmp_path / "def456.log").read_text()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["bot1-abc123.log", "def456.log"]
+
+
+def test_candidate_dumps_are_sampled(tmp_path):
+    stream = _configure(tmp_path, level="DEBUG", sample_rate=0)
+    try:
+        with game_log.game_context("abc123"):
+            assert query_db.pick_weighted({"e2e4": {"stats": [1, 1, 1]}}) == "e2e4"
+        game_log.configure(sample_rate=1)
+        with game_log.game_context("abc123"):
+            query_db.pick_weighted({"d2d4": {"stats": [1, 0, 0]}})
+    finally:
+        game_log.shutdown()
+        game_log.SAMPLE_RATE = 1.0
+
+    assert "e2e4" not in stream.getvalue()
+    assert '[abc123] Candidate moves for position {"candidates": {"d2d4": 1}}' in stream.getvalue()
+
+
+def test_a_move_logs_all_of_its_dumps_or_none(tmp_path, monkeypatch):
+    monkeypatch.setattr(game_log, "random", random.Random(7))
+    stream = _configure(tmp_path, level="DEBUG", sample_rate=0.5)
+    try:
+        with game_log.game_context("abc123"):
+            for _ in range(50):
+                with game_log.sampled_move():
+                    # e.g. the book lookup dump, then the weighted pick's
+                    query_db.pick_weighted({"e2e4": {"stats": [1, 1, 1]}})
+                    query_db.pick_weighted({"d2d4": {"stats": [1, 0, 0]}})
+    finally:
+        game_log.shutdown()
+        game_log.SAMPLE_RATE = 1.0
+
+    lines = stream.getvalue().splitlines()
+    assert 0 < len(lines) < 100  # some moves sampled, some not
+    assert ["e2e4" in line for line in lines] == [True, False] * (len(lines) // 2)
+
+
+def test_dumps_carry_their_data_as_fields(tmp_path):
+    records = []
+
+    class Keep(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+
+    _configure(tmp_path, level="DEBUG")
+    keep = Keep()
+    game_log._listener.handlers += (keep,)
+    try:
+        with game_log.game_context("abc123"), game_log.sampled_move():
+            query_db.pick_weighted({"e2e4": {"stats": [2, 1, 1]}, "d2d4": {"stats": [1, 0, 0]}})
+    finally:
+        game_log.shutdown()
+
+    dump = next(r for r in records if r.getMessage() == "Candidate moves for position")
+    assert dump.fields == {"candidates": {"e2e4": 4, "d2d4": 1}} and dump.game == "abc123"
+    line = (tmp_path / "abc123.log").read_text().splitlines()[0]
+    assert "DEBUG opening_book.query_db: Candidate moves for position" in line
+    assert json.loads(line[line.index("{"):]) == dump.fields
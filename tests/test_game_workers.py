@@ -0,0 +1,84 @@
+import json
+import os
+import signal
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer.bot_profile import BotProfile
+from chess_trainer.game_workers import GameWorkerPool
+from loadtest.fake_lichess import FakeLichess
+
+RANDOM_ENGINE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "loadtest", "random_engine.py"))
+
+
+def _start_games(base, count):
+    events = requests.get(f"{base}/api/stream/event", stream=True, timeout=10).iter_lines()
+    game_ids = []
+    while len(game_ids) < count:
+        line = next(events)
+        if not line:
+            continue
+        event = json.loads(line)
+        if event["type"] == "challenge":
+            assert requests.post(f"{base}/api/challenge/{event['challenge']['id']}/accept", timeout=10).ok
+        elif event["type"] == "gameStart":
+            game_ids.append(event["game"]["id"])
+    return game_ids
+
+
+def _wait(condition, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_games_survive_a_worker_crash(tmp_path, monkeypatch):
+    fake = FakeLichess(bot_id="bot", games=3, think_time=(0.05, 0.1), max_plies=40, seed=3)
+    base = f"http://127.0.0.1:{fake.start()}"
+    # the workers read these when they import the trainer
+    monkeypatch.setenv("LICHESS_BASE_URL", base)
+    monkeypatch.setenv("LICHESS_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("LICHESS_BOT_NAME", "bot")
+    monkeypatch.setenv("STOCKFISH_PATH", RANDOM_ENGINE)
+    monkeypatch.setenv("BOOK_PREFETCH_REPLIES", "0")
+    # everything the workers would write (or read) relative to the working directory goes to tmp_path
+    monkeypatch.setenv("CHESS_TRAINER_LOG_DIR", str(tmp_path / "logs"))
+    monkeypatch.setenv("CHESS_TRAINER_ARCHIVE", str(tmp_path / "games.sqlite3"))
+    monkeypatch.setenv("CHESS_TRAINER_METRICS_DIR", str(tmp_path / "metrics"))
+    monkeypatch.setenv("CHESS_TRAINER_PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setenv("OPENING_EXITS_PATH", str(tmp_path / "opening_exits.json"))
+    monkeypatch.setenv("EXPLORER_CACHE_PATH", str(tmp_path / "explorer_cache.sqlite3"))
+    monkeypatch.setenv("EVAL_CACHE_PATH", str(tmp_path / "eval_cache.sqlite3"))
+    pool = GameWorkerPool(2)
+    try:
+        for game_id in _start_games(base, 3):
+            pool.play(game_id, BotProfile())
+        # least loaded first: the third game goes to worker 0 again
+        assert pool.loads() == [2, 1]
+
+        assert _wait(lambda: fake.report()["bot_moves"] >= 4)
+        os.kill(pool._workers[0].process.pid, signal.SIGKILL)
+        # its games move to the surviving worker and resume from the game stream
+        assert _wait(lambda: pool.loads()[1] == 3, timeout=10)
+
+        assert _wait(fake.all_finished)
+        report = fake.report()
+        assert report["finished"] == 3
+        assert report["rejected_moves"] == 0
+        # every bot move of every game was made exactly once; a random game can end before max_plies
+        assert report["bot_moves"] == sum(len(g.board.move_stack[0 if g.bot_color else 1::2])
+                                          for g in fake.games.values())
+        assert all(len(g.board.move_stack) == 40 or g.status in ("mate", "draw") for g in fake.games.values())
+        assert _wait(lambda: pool.loads() == [0, 0], timeout=10)
+        assert pool._workers[0].process.is_alive()  # respawned
+        assert sorted(os.listdir(tmp_path / "metrics")) == ["g0000000.json", "g0000001.json", "g0000002.json"]
+    finally:
+        pool.close(timeout=5)
+        fake.stop()
@@ -0,0 +1,119 @@
+import json
+import os
+import sys
+
+import chess
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from opening_book import crawler, merge
+
+# tiny fake explorer: play -> moves
+EXPLORER = {
+    None: [
+        {"uci": "e2e4", "white": 300, "draws": 200, "black": 100, "opening": {"name": "King's Pawn Game", "eco": "B00"}},
+        {"uci": "d2d4", "white": 250, "draws": 250, "black": 100, "opening": {"name": "Queen's Pawn Game", "eco": "A40"}},
+        {"uci": "h2h4", "white": 1, "draws": 0, "black": 1},
+    ],
+    "e2e4": [{"uci": "c7c5", "white": 120, "draws": 100, "black": 110, "opening": {"name": "Sicilian Defense", "eco": "B20"}}],
+    "d2d4": [{"uci": "g8f6", "white": 150, "draws": 150, "black": 100}],
+}
+
+
+def _fake_fetch(play, top_n, max_age=None):
+    return EXPLORER.get(play, []), 1000.0
+
+
+def test_sharded_crawl_merges_to_full_crawl(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawler, "fetch_book_moves", _fake_fetch)
+    monkeypatch.setattr(crawler, "DEPTH", 3)
+
+    full = crawler.Node()
+    crawler.crawl(full, chess.Board(), 0, max_ply=3, top_n=8, min_games=100)
+
+    shards = []
+    for i in range(2):
+        out = str(tmp_path / f"shard-{i}.ndjson")
+        crawler.crawl_shard(i, 2, 1, out)
+        shards.append(out)
+
+    output = str(tmp_path / "book.json")
+    assert merge.merge_books(shards, output) == 2
+    with open(output, encoding="utf-8") as f:
+        merged = json.load(f)
+    assert merged == json.loads(json.dumps(full.to_dict()))
+
+
+@pytest.mark.parametrize("plies", [2, 3, 4])
+def test_sharded_crawl_keeps_lines_shorter_than_the_split(tmp_path, monkeypatch, plies):
+    # c2c4 has no replies with enough games, so its line ends above the split depth
+    explorer = dict(EXPLORER)
+    explorer[None] = EXPLORER[None] + [{"uci": "c2c4", "white": 60, "draws": 50, "black": 40,
+                                        "opening": {"name": "English Opening", "eco": "A10"}}]
+    monkeypatch.setattr(crawler, "fetch_book_moves", lambda play, top_n, max_age=None: (explorer.get(play, []), 1000.0))
+    monkeypatch.setattr(crawler, "DEPTH", 3)
+
+    full = crawler.Node()
+    crawler.crawl(full, chess.Board(), 0, max_ply=3, top_n=8, min_games=100)
+
+    shards = []
+    for i in range(3):
+        out = str(tmp_path / f"shard-{i}.ndjson")
+        crawler.crawl_shard(i, 3, plies, out)
+        shards.append(out)
+
+    output = str(tmp_path / "book.json")
+    assert merge.merge_books(shards, output) == 3
+    with open(output, encoding="utf-8") as f:
+        merged = json.load(f)
+    assert merged == json.loads(json.dumps(full.to_dict()))
+
+
+def test_merge_with_base_reconciles_stats_and_names(tmp_path):
+    base = {"stats": None, "opening_name": None, "eco": None, "children": {
+        "e2e4": {"stats": [10, 10, 10], "opening_name": "Old Name", "eco": "B00", "children": {}},
+        "c2c4": {"stats": [5, 5, 5], "opening_name": "English Opening", "eco": "A10", "children": {}},
+    }}
+    base_path = tmp_path / "base.json"
+    base_path.write_text(json.dumps(base))
+    shard = tmp_path / "shard.ndjson"
+    shard.write_text(json.dumps({"path": ["e2e4"], "node": {
+        "stats": [1, 2, 3], "opening_name": "King's Pawn Game", "eco": None, "children": {}}}) + "\n")
+
+    output = str(tmp_path / "out.json")
+    merge.merge_books([str(shard)], output, base_path=str(base_path), stats_mode="sum")
+    with open(output, encoding="utf-8") as f:
+        merged = json.load(f)
+    assert list(merged["children"]) == ["c2c4", "e2e4"]
+    e4 = merged["children"]["e2e4"]
+    assert e4["stats"] == [11, 12, 13]
+    assert e4["opening_name"] == "King's Pawn Game"
+    assert e4["eco"] == "B00"
+
+
+def test_base_book_is_read_one_root_subtree_at_a_time(tmp_path):
+    tricky = {"stats": [1, 1, 1], "opening_name": 'Odd "{name}" \\ [x]', "eco": None, "fetched_at": 5.0, "children": {
+        "g1f3": {"stats": [3, 3, 3], "opening_name": "Réti Opening", "eco": "A04", "children": {}}}}
+    children = {"g1f3": tricky, "c2c4": {"stats": [5, 5, 5], "opening_name": "English}", "eco": "A10",
+                                          "children": {}}}
+    # unsorted root moves, pretty-printed, root fields after the children
+    text = json.dumps({"children": children, "stats": None, "opening_name": None, "eco": None}, indent=2,
+                      ensure_ascii=False)
+    base_path = tmp_path / "base.json"
+    base_path.write_text(text, encoding="utf-8")
+
+    buf = text.encode("utf-8")
+    root, index = merge.index_book(buf)
+    assert root == {"stats": None, "opening_name": None, "eco": None}
+    assert {uci: json.loads(buf[s:e]) for uci, (s, e) in index.items()} == children
+
+    shard = tmp_path / "shard.ndjson"
+    shard.write_text(json.dumps({"path": ["e2e4"], "node": {
+        "stats": [1, 2, 3], "opening_name": "King's Pawn Game", "eco": None, "children": {}}}) + "\n")
+    output = str(tmp_path / "out.json")
+    assert merge.merge_books([str(shard)], output, base_path=str(base_path)) == 3
+    with open(output, encoding="utf-8") as f:
+        merged = json.load(f)
+    assert list(merged["children"]) == ["c2c4", "e2e4", "g1f3"]
+    assert merged["children"]["g1f3"] == tricky and merged["children"]["c2c4"] == children["c2c4"]
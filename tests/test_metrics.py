@@ -0,0 +1,57 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer import metrics
+
+
+def test_prometheus_rendering():
+    registry = metrics.MetricsRegistry()
+    counter = registry.counter("test_moves_total", "Moves")
+    hist = registry.histogram("test_seconds", "Latency", buckets=(0.1, 1.0))
+    counter.inc(source="book")
+    counter.inc(2, source="engine")
+    hist.observe(0.05, stage="book_lookup")
+    hist.observe(0.5, stage="book_lookup")
+
+    text = registry.render_prometheus()
+    assert "# TYPE test_moves_total counter" in text
+    assert 'test_moves_total{source="engine"} 2' in text
+    assert 'test_seconds_bucket{stage="book_lookup",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="book_lookup",le="1"} 2' in text
+    assert 'test_seconds_bucket{stage="book_lookup",le="+Inf"} 2' in text
+    assert 'test_seconds_count{stage="book_lookup"} 2' in text
+
+
+def test_game_summary_written_on_finish(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    game = metrics.start_game("abc123")
+    assert metrics.active_game("abc123") is game
+    with game.span("engine_play"):
+        pass
+    game.move_played("engine")
+    game.move_played("book")
+    game.reconnected()
+
+    summary = metrics.finish_game(game)
+    assert metrics.active_game("abc123") is None
+    assert summary["moves"] == {"engine": 1, "book": 1}
+    assert summary["stages"]["engine_play"]["count"] == 1
+    with open(tmp_path / "abc123.json", encoding="utf-8") as f:
+        assert json.load(f)["reconnects"] == 1
+    assert metrics.recent_summaries()[-1]["game_id"] == "abc123"
+
+
+def test_resume_latency_measured_from_first_drop():
+    game = metrics.GameMetrics("resume1")
+    game.resumed("resume_to_move")  # no reconnect yet: nothing recorded
+    game.reconnected()
+    game.reconnected()
+    game.resumed("resume_to_move")
+    game.resumed("resume_to_move")
+
+    summary = game.summary()
+    assert summary["reconnects"] == 2
+    assert summary["stages"]["resume_to_move"]["count"] == 1
@@ -0,0 +1,93 @@
+import os
+import sys
+import threading
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer import move_submitter
+from chess_trainer.move_submitter import MoveRejected, MoveSubmitter
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeSession:
+    # Replays a script of responses/exceptions; ``gate`` holds the first post
+    def __init__(self, script, gate=None):
+        self.script = list(script)
+        self.gate = gate
+        self.headers = {}
+        self.posts = []
+
+    def post(self, url, timeout=None):
+        self.posts.append(url)
+        if self.gate is not None and len(self.posts) == 1:
+            self.gate.wait(5)
+        item = self.script.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(move_submitter, "BACKOFF", 0)
+
+
+def test_duplicate_submissions_share_one_post():
+    gate = threading.Event()
+    session = FakeSession([FakeResponse(200)], gate=gate)
+    submitter = MoveSubmitter("http://fake", "token", session=session)
+    first = submitter.submit("g1", 0, "e2e4")
+    second = submitter.submit("g1", 0, "e2e4")
+    assert first is second
+    assert submitter.pending("g1", 0)
+    gate.set()
+    assert first.result(5) == "ok"
+    assert submitter.submit("g1", 0, "e2e4") is first
+    assert session.posts == ["http://fake/api/bot/game/g1/move/e2e4"]
+    assert session.headers["Authorization"] == "Bearer token"
+
+
+def test_retry_after_timeout_treats_400_as_duplicate():
+    session = FakeSession([requests.ReadTimeout(), FakeResponse(400, "Not your turn")])
+    submitter = MoveSubmitter("http://fake", "token", session=session)
+    assert submitter.submit("g1", 4, "g1f3").result(5) == "duplicate"
+    assert len(session.posts) == 2
+
+
+def test_retries_stop_once_stream_shows_the_move():
+    gate = threading.Event()
+    session = FakeSession([requests.ConnectionError()], gate=gate)
+    submitter = MoveSubmitter("http://fake", "token", session=session)
+    future = submitter.submit("g1", 2, "d2d4")
+    submitter.confirm("g1", 3)
+    gate.set()
+    assert future.result(5) == "superseded"
+    assert len(session.posts) == 1
+
+
+def test_rejection_is_raised_and_can_be_resubmitted():
+    session = FakeSession([FakeResponse(400, "Illegal move"), FakeResponse(200)])
+    submitter = MoveSubmitter("http://fake", "token", session=session)
+    with pytest.raises(MoveRejected):
+        submitter.submit("g1", 0, "e2e5").result(5)
+    assert not submitter.pending("g1", 0)
+    assert submitter.submit("g1", 0, "e2e4").result(5) == "ok"
+
+
+def test_gives_up_after_max_attempts():
+    session = FakeSession([FakeResponse(503)] * 3)
+    submitter = MoveSubmitter("http://fake", "token", session=session, max_attempts=3)
+    with pytest.raises(MoveRejected):
+        submitter.submit("g1", 0, "e2e4").result(5)
+    assert len(session.posts) == 3
@@ -0,0 +1,65 @@
+import os
+import sys
+
+import chess
+import chess.polyglot
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from opening_book import polyglot
+
+
+def _node(stats, children=None):
+    return {"stats": stats, "opening_name": None, "eco": None, "children": children or {}}
+
+
+# e4 e5 Nf3 Nc6 Bc4 Bc5 with both O-O and c3 available at the end
+TRIE = _node(None, {
+    "e2e4": _node([500, 300, 200], {
+        "e7e5": _node([200, 100, 100], {
+            "g1f3": _node([150, 80, 70], {
+                "b8c6": _node([100, 50, 50], {
+                    "f1c4": _node([60, 30, 30], {
+                        "f8c5": _node([40, 20, 20], {
+                            "e1g1": _node([30, 10, 10]),
+                            "c2c3": _node([10, 5, 5]),
+                        }),
+                    }),
+                }),
+            }),
+        }),
+    }),
+    "d2d4": _node([100000, 40000, 30000]),
+})
+
+
+def test_export_and_lookup_roundtrip(tmp_path):
+    path = str(tmp_path / "book.bin")
+    assert polyglot.export_trie(TRIE, path) == 9
+    book = polyglot.PolyglotBook(path)
+
+    root_moves = book.book_moves(chess.Board())
+    assert [m["uci"] for m in root_moves] == ["d2d4", "e2e4"]
+    # weights above 16 bits are scaled per position
+    assert root_moves[0]["games"] == polyglot.MAX_WEIGHT
+
+    board = chess.Board()
+    for uci in "e2e4 e7e5 g1f3 b8c6 f1c4 f8c5".split():
+        board.push_uci(uci)
+    # castling is stored king-takes-rook and decoded back to e1g1
+    assert [m["uci"] for m in book.book_moves(board)] == ["e1g1", "c2c3"]
+    assert book.choose_move(board) in {"e1g1", "c2c3"}
+
+    board.push_uci("e1g1")
+    assert book.choose_move(board) is None
+    book.close()
+
+
+def test_keys_match_python_chess_zobrist(tmp_path):
+    path = str(tmp_path / "book.bin")
+    polyglot.export_trie(TRIE, path)
+    with open(path, "rb") as f:
+        data = f.read()
+    keys = [polyglot.ENTRY.unpack_from(data, i)[0] for i in range(0, len(data), polyglot.ENTRY.size)]
+    assert keys == sorted(keys)
+    assert chess.polyglot.zobrist_hash(chess.Board()) in keys
@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+
+import chess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer import metrics, prefetch
+from chess_trainer.prefetch import BookPrefetcher
+
+
+def _board(*moves):
+    board = chess.Board()
+    for uci in moves:
+        board.push_uci(uci)
+    return board
+
+
+def _wait_for(prefetcher, n):
+    # the table fills in on the prefetch thread
+    for _ in range(200):
+        with prefetcher._lock:
+            futures = list(prefetcher._table.values())
+        if len(futures) == n and all(f.done() for f in futures):
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("prefetch did not finish")
+
+
+def test_ready_decisions_are_hits_and_unexpected_replies_are_misses():
+    answers = {("e2e4", "e7e5"): "g1f3", ("e2e4", "c7c5"): None}
+    decided = []
+
+    def decide(board):
+        key = tuple(m.uci() for m in board.move_stack)
+        decided.append(key)
+        return answers[key]
+
+    game = metrics.GameMetrics("prefetch-test")
+    prefetcher = BookPrefetcher(None, game, replies=2, decide=decide,
+                                rank=lambda board, n: ["e7e5", "c7c5", "d7d5"][:n])
+    try:
+        prefetcher.schedule(_board("e2e4"))
+        _wait_for(prefetcher, 2)
+        assert prefetcher.take(_board("e2e4", "e7e5")) == (True, "g1f3")
+        assert sorted(decided) == sorted(answers)
+
+        # "no book move" is a ready answer too
+        prefetcher.schedule(_board("e2e4"))
+        _wait_for(prefetcher, 2)
+        assert prefetcher.take(_board("e2e4", "c7c5")) == (True, None)
+
+        prefetcher.schedule(_board("e2e4"))
+        _wait_for(prefetcher, 2)
+        assert prefetcher.take(_board("e2e4", "d7d5")) == (False, None)
+        # nothing was prefetched for this position, so it isn't counted
+        assert prefetcher.take(_board("d2d4", "d7d5")) == (False, None)
+    finally:
+        prefetcher.close()
+
+    assert (prefetcher.hits, prefetcher.misses) == (2, 1)
+    assert game.summary()["prefetch"] == {"hits": 2, "misses": 1}
+    assert prefetch.PREFETCH_RESULTS.value(result="hit") >= 2
+
+
+def test_likely_replies_rank_by_games(monkeypatch):
+    local = [
+        {"uci": "c7c5", "white": 10, "draws": 5, "black": 10},
+        {"uci": "e7e5", "white": 30, "draws": 20, "black": 30},
+        {"uci": "e7e6", "white": 1, "draws": 1, "black": 1},
+    ]
+    monkeypatch.setattr(prefetch.lichess_openings_explorer, "get_local_book_moves",
+                        lambda board, top_n, book=None: local)
+    assert prefetch.likely_replies(_board("e2e4"), 2) == ["e7e5", "c7c5"]
+
+    # off the local book the explorer is asked instead
+    fetched = []
+    monkeypatch.setattr(prefetch.lichess_openings_explorer, "get_local_book_moves",
+                        lambda board, top_n, book=None: [])
+    monkeypatch.setattr(prefetch.lichess_openings_explorer, "fetch_book_moves",
+                        lambda play, top_n: fetched.append(play) or local)
+    assert prefetch.likely_replies(_board("e2e4"), 1) == ["e7e5"]
+    assert fetched == ["e2e4"]
+    assert prefetch.likely_replies(_board("e2e4"), 1, explorer=False) == []
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chess_trainer import profiling
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_disabled_profiling_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MODE", None)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    wrapped = profiling.profiled("game")(lambda x: x * 2)
+    assert wrapped(21) == 42
+    assert os.listdir(tmp_path) == []
+
+
+def test_sampler_writes_one_collapsed_file_per_outer_call(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MODE", "sample")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "SAMPLE_INTERVAL", 0.001)
+
+    @profiling.profiled("game", name_from=lambda game_id, depth: game_id)
+    def play(game_id, depth):
+        if depth:
+            return play(game_id, depth - 1)
+        _busy(0.05)
+        return "done"
+
+    assert play("abcd1234", 2) == "done"
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and files[0].startswith("game-abcd1234-") and files[0].endswith(".collapsed")
+    with open(tmp_path / files[0], encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) >= 1
+    assert any("test_profiling.py:_busy" in line for line in lines)
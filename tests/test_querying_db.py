@@ -4,12 +4,16 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from opening_book import query_db
+from opening_book.synthetic import make_synthetic_book
 
-BOOK_PATH = os.path.join(os.path.dirname(__file__), "..", "opening_book.json") # kinda depends on there being a .json already?
+BOOK_PATH = os.path.join(os.path.dirname(__file__), "..", "opening_book.json")
 
 
 def load_book():
-    return query_db.load_trie(BOOK_PATH)
+    # use the crawled book when present, otherwise a synthetic one of the same shape
+    if os.path.exists(BOOK_PATH):
+        return query_db.load_trie(BOOK_PATH)
+    return make_synthetic_book(depth=5, branching=3, seed=7)
 
 
 def test_load_trie_has_children():
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+
+import chess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from opening_book import crawler
+
+EXPLORER = {
+    None: [
+        {"uci": "e2e4", "white": 300, "draws": 200, "black": 100},
+        {"uci": "d2d4", "white": 250, "draws": 250, "black": 100},
+    ],
+    "e2e4": [{"uci": "c7c5", "white": 120, "draws": 100, "black": 110}],
+    "d2d4": [{"uci": "g8f6", "white": 150, "draws": 150, "black": 100}],
+}
+
+
+class FakeExplorer:
+    def __init__(self, data):
+        self.data = data
+        self.calls = []
+
+    def __call__(self, play, top_n, max_age=None):
+        self.calls.append(play)
+        return [dict(m) for m in self.data.get(play, [])], time.time()
+
+
+def _build(monkeypatch):
+    fake = FakeExplorer(EXPLORER)
+    monkeypatch.setattr(crawler, "fetch_book_moves", fake)
+    monkeypatch.setattr(crawler, "DEPTH", 3)
+    root = crawler.Node()
+    crawler.crawl(root, chess.Board(), 0, max_ply=3, top_n=8, min_games=100)
+    fake.calls.clear()
+    return root, fake
+
+
+def test_refresh_skips_fresh_unchanged_nodes(monkeypatch):
+    root, fake = _build(monkeypatch)
+    assert root.fetched_at is not None
+
+    report = crawler.refresh_book(root, ttl=3600, change_threshold=0.02)
+    assert fake.calls == [None]
+    assert report["refreshed"] == 1
+    assert report["new"] == [] and report["changed"] == []
+
+
+def test_refresh_follows_changed_counts_and_new_children(monkeypatch):
+    root, fake = _build(monkeypatch)
+    fake.data = dict(EXPLORER)
+    fake.data[None] = [
+        {"uci": "e2e4", "white": 400, "draws": 200, "black": 100},  # +17%: re-queried
+        {"uci": "d2d4", "white": 251, "draws": 250, "black": 100},  # tiny change: skipped
+        {"uci": "c2c4", "white": 100, "draws": 100, "black": 100},  # new: crawled
+    ]
+    fake.data["c2c4"] = [{"uci": "e7e5", "white": 50, "draws": 50, "black": 50}]
+    fake.data["e2e4"] = [
+        {"uci": "c7c5", "white": 120, "draws": 100, "black": 110},
+        {"uci": "e7e5", "white": 200, "draws": 100, "black": 100},
+    ]
+
+    report = crawler.refresh_book(root, ttl=3600, change_threshold=0.02)
+    assert sorted(c for c in fake.calls if c) == ["c2c4", "c2c4,e7e5", "e2e4", "e2e4,e7e5"]
+    assert set(report["new"]) == {"c2c4", "e2e4 e7e5"}
+    assert {c["line"] for c in report["changed"]} == {"e2e4", "d2d4"}
+    assert root.children["c2c4"].children["e7e5"].stats == (50, 50, 50)
+    assert "e7e5" in root.children["e2e4"].children
+
+
+def test_refresh_requeries_nodes_older_than_ttl(monkeypatch):
+    root, fake = _build(monkeypatch)
+    root.children["d2d4"].fetched_at = time.time() - 7200
+
+    crawler.refresh_book(root, ttl=3600, change_threshold=0.02)
+    assert fake.calls == [None, "d2d4"]
@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+RANDOM_ENGINE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "loadtest", "random_engine.py"))
+os.environ.setdefault("STOCKFISH_PATH", RANDOM_ENGINE)  # the trainer looks for an engine at import
+
+from chess_trainer import accounts, game_archive, metrics
+from chess_trainer.accounts import BotAccount
+from chess_trainer.supervisor import ConfigError, Supervisor, load_config
+from loadtest.fake_lichess import FakeLichess
+
+
+def _wait(condition, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_accounts_share_one_engine_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(game_archive, "ARCHIVE_PATH", str(tmp_path / "games.sqlite3"))
+    fakes = [FakeLichess(bot_id=f"bot{i}", games=2, think_time=(0.02, 0.05), max_plies=20, seed=i)
+             for i in (1, 2)]
+    bots = [BotAccount(f"bot{i}", f"token{i}", f"http://127.0.0.1:{fake.start()}")
+            for i, fake in zip((1, 2), fakes)]
+    supervisor = Supervisor(bots, engines=1, engine_path=RANDOM_ENGINE)  # four games, one engine
+    supervisor.start()
+    try:
+        assert _wait(lambda: all(fake.all_finished() for fake in fakes))
+        for fake in fakes:
+            report = fake.report()
+            assert report["finished"] == 2 and report["bot_moves"] == 20
+            assert report["rejected_moves"] == 0
+        assert len(supervisor.engines) <= 1
+        assert _wait(lambda: supervisor.games_in_progress() == 0, timeout=10)
+        # per-account metrics and request accounting
+        text = metrics.REGISTRY.render_prometheus()
+        assert 'account="bot1"' in text and 'account="bot2"' in text
+        assert all(usage["requests"] > 0 and usage["rate_limited"] == 0 for usage in supervisor.usage())
+        summaries = [json.loads(p.read_text()) for p in tmp_path.glob("*.json")]
+        assert sorted(s["account"] for s in summaries) == ["bot1", "bot1", "bot2", "bot2"]
+        # every game archived under its account, with the source of each of our moves
+        game_archive.close()
+        archive = game_archive.GameArchive(str(tmp_path / "games.sqlite3"))
+        games = archive.games()
+        assert sorted((g["account"], g["game_id"]) for g in games) == [
+            ("bot1", "g0000000"), ("bot1", "g0000001"), ("bot2", "g0000000"), ("bot2", "g0000001")]
+        moves = [m for g in games for m in archive.moves(g["id"])]
+        assert len(moves) == 80 and sum(m["source"] != "opponent" for m in moves) == 40
+        archive.close()
+    finally:
+        supervisor.stop()
+        for fake in fakes:
+            fake.stop()
+
+
+def test_rate_limit_pauses_only_that_account(monkeypatch):
+    monkeypatch.setattr(accounts, "RATE_LIMIT_PAUSE", 30)
+    limited = BotAccount("limited", "t1", "http://127.0.0.1:9")
+    other = BotAccount("other", "t2", "http://127.0.0.1:9")
+    try:
+        response = requests.Response()
+        response.status_code = 429
+        limited._on_response(response)
+        limited._on_response(response)  # still paused: not counted as a second pause
+        response.status_code = 200
+        other._on_response(response)
+
+        assert 29 < limited.pause_remaining() <= 30
+        assert other.pause_remaining() == 0
+        assert limited.usage()["rate_limited"] == 2
+        assert limited.requests_last_minute() == 2
+        assert accounts.RATE_LIMIT_PAUSES.value(account="limited") == 1
+    finally:
+        limited.close()
+        other.close()
+
+
+def test_config_needs_a_token_per_account(tmp_path, monkeypatch):
+    monkeypatch.setenv("BOT_A_TOKEN", "secret")
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps({"accounts": [
+        {"name": "a", "token_env": "BOT_A_TOKEN", "profile": {"challenge": 200}},
+        {"name": "b", "token_env": "MISSING_TOKEN"},
+    ]}))
+    with pytest.raises(ConfigError, match="no token for account b"):
+        load_config(str(path))
+
+    path.write_text(json.dumps({"accounts": [{"name": "a", "token_env": "BOT_A_TOKEN", "profile": {"challenge": 200}}]}))
+    config = load_config(str(path))
+    assert config["accounts"][0]["token"] == "secret"
+    assert config["accounts"][0]["profile"].challenge == 200
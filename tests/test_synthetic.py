@@ -0,0 +1,29 @@
+import os
+import sys
+
+import chess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from opening_book.synthetic import make_synthetic_book
+
+
+def test_synthetic_book_shape_and_legality():
+    book = make_synthetic_book(depth=4, branching=3, name_density=0.5, seed=3)
+    assert book == make_synthetic_book(depth=4, branching=3, name_density=0.5, seed=3)
+    assert len(book["children"]) == 3
+
+    def walk(node, board, ply):
+        for uci, child in node["children"].items():
+            move = chess.Move.from_uci(uci)
+            assert move in board.legal_moves
+            assert len(child["stats"]) == 3 and sum(child["stats"]) > 0
+            if ply == 0:
+                assert child["opening_name"].startswith("Synthetic Opening")
+            board.push(move)
+            walk(child, board, ply + 1)
+            board.pop()
+        if ply == 4:
+            assert not node["children"]
+
+    walk(book, chess.Board(), 0)
@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+import time
+
+from werkzeug.datastructures import ImmutableMultiDict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+RANDOM_ENGINE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "loadtest", "random_engine.py"))
+os.environ.setdefault("STOCKFISH_PATH", RANDOM_ENGINE)  # the trainer looks for an engine at import
+
+from chess_trainer import trainer, ui
+from chess_trainer.accounts import BotAccount
+from chess_trainer.bot_profile import BotProfile
+from loadtest.fake_lichess import FakeLichess
+
+
+def test_games_use_the_challengers_profile():
+    fake = FakeLichess(bot_id="bot", games=2, think_time=(0, 0))
+    account = BotAccount("bot", "token", f"http://127.0.0.1:{fake.start()}")
+    trainee = BotProfile(chosen_white=["Ruy Lopez"], chosen_black=["Sicilian Defense"], challenge=200,
+                         allowed_username="Sparring0")
+    started = []
+
+    def profile_for(username):
+        return trainee if username == "sparring0" else None
+
+    thread = threading.Thread(target=trainer.handle_events, daemon=True, kwargs=dict(
+        bot_profile=BotProfile(), game_runner=lambda game_id, profile: started.append((game_id, profile)),
+        account=account, profile_for=profile_for))
+    thread.start()
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline and (not started or fake.challenges):
+            time.sleep(0.05)
+        # sparring1 has no profile, so only sparring0's challenge was accepted
+        assert [game_id for game_id, _ in started] == ["g0000000"]
+        assert not fake.challenges
+        profile = started[0][1]
+        assert profile == trainee and profile is not trainee
+    finally:
+        fake.stop()
+        account.close()
+
+
+def test_profiles_are_saved_per_trainee(tmp_path, monkeypatch):
+    path = str(tmp_path / "profiles.json")
+    monkeypatch.setattr(ui, "PROFILES", {})
+    # the default profile is Alice's, so strangers get nothing unless it takes everyone
+    monkeypatch.setattr(ui, "PROFILE", BotProfile(allowed_username="Alice"))
+    ui.save_profile("Alice", BotProfile(chosen_white=["Italian Game"], allowed_username="Alice"), path)
+    ui.save_profile("bob", BotProfile(chosen_black=["French Defense"], allowed_username="bob"), path)
+
+    monkeypatch.setattr(ui, "PROFILES", {})
+    ui.load_profiles(path)
+    assert ui.profile_for("ALICE").chosen_white == ["Italian Game"]
+    assert ui.profile_for("bob").chosen_black == ["French Defense"]
+    assert ui.profile_for("carol") is None
+    ui.PROFILE.allow_all_challengers = True
+    assert ui.profile_for("carol") is ui.PROFILE
+
+
+def test_a_default_profile_without_a_username_takes_everyone(monkeypatch):
+    monkeypatch.setattr(ui, "PROFILES", {})
+    monkeypatch.setattr(ui, "PROFILE", BotProfile())
+    # the form saved with no username and "allow all" unticked
+    ui.store_profile(ui.profile_from_form(ImmutableMultiDict([("white", "Italian Game"), ("black", "French Defense")])))
+    assert not ui.PROFILE.allow_all_challengers
+    assert ui.profile_for("carol") is ui.PROFILE
+    assert ui.profile_for(None) is ui.PROFILE
+    assert ui.PROFILES == {}
+
+
+def test_listener_follows_the_current_default_profile(monkeypatch):
+    saved = threading.Event()
+
+    def events(account=None):
+        saved.wait(5)
+        yield {"type": "gameStart", "game": {"id": "g1", "opponent": {"id": "stranger"}}}
+
+    started = []
+    monkeypatch.setattr(trainer, "robust_stream_incoming_events", events)
+    monkeypatch.setattr(trainer, "default_account", BotAccount("bot", "token", "http://127.0.0.1:9"))
+    monkeypatch.setattr(ui, "PROFILES", {})
+    monkeypatch.setattr(ui, "PROFILE", BotProfile(chosen_white=["Ruy Lopez"]))
+    monkeypatch.setattr(ui, "EVENT_THREAD", None)
+    monkeypatch.setattr(ui, "run_game", lambda game_id, profile: started.append(profile))
+    ui.ensure_listener()
+    # saved from the web form while the listener runs; the stranger has no profile of their own
+    ui.store_profile(BotProfile(chosen_white=["Italian Game"]))
+    saved.set()
+    ui.EVENT_THREAD.join(5)
+    assert [p.chosen_white for p in started] == [["Italian Game"]]
@@ -0,0 +1,294 @@
+import os
+import random
+import sys
+import threading
+import types
+from concurrent.futures import Future
+
+import chess
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+RANDOM_ENGINE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "loadtest", "random_engine.py"))
+os.environ.setdefault("STOCKFISH_PATH", RANDOM_ENGINE)  # the trainer looks for an engine at import
+
+from chess_trainer import game_archive, metrics, trainer
+from chess_trainer.bot_profile import BotProfile
+from chess_trainer.engine_pool import EnginePool
+from opening_book import lichess_openings_explorer
+
+
+class FakeSubmitter:
+    # Records submissions; the test decides when (and how) each one resolves
+    def __init__(self, fail_at_once=False):
+        self.fail_at_once = fail_at_once
+        self.submits = []
+        self.checks = 0  # pending() calls, i.e. times the game loop wanted to move
+        self.changed = threading.Condition()
+
+    def submit(self, game_id, ply, uci, game_metrics=None):
+        future = Future()
+        with self.changed:
+            self.submits.append((ply, uci, future))
+            self.changed.notify_all()
+        if self.fail_at_once:
+            future.set_exception(RuntimeError("rejected"))
+        return future
+
+    def wait_for(self, count, timeout=5, checks=0):
+        with self.changed:
+            return self.changed.wait_for(lambda: len(self.submits) >= count and self.checks >= checks, timeout)
+
+    def pending(self, game_id, ply):
+        with self.changed:
+            self.checks += 1
+            self.changed.notify_all()
+        latest = [f for p, _, f in self.submits if p == ply][-1:]
+        return bool(latest) and (not latest[0].done() or latest[0].exception() is None)
+
+    def confirm(self, game_id, plies):
+        pass
+
+    def forget(self, game_id):
+        pass
+
+
+class FirstMoveEngine:
+    def configure(self, options):
+        pass
+
+    def play(self, board, limit):
+        return types.SimpleNamespace(move=next(iter(board.legal_moves)))
+
+
+def _full(moves=""):
+    return {"type": "gameFull", "id": "g1", "white": {"id": "bot", "rating": 2000},
+            "black": {"id": "opp", "rating": 1500}, "state": {"type": "gameState", "moves": moves,
+                                                               "status": "started"}}
+
+
+def _state(moves, status="started", **extra):
+    return {"type": "gameState", "moves": moves, "status": status, **extra}
+
+
+@pytest.fixture()
+def offline_game(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(game_archive, "ARCHIVE_PATH", "")
+    monkeypatch.setattr(trainer, "PREFETCH_REPLIES", 0)
+    monkeypatch.setattr(trainer, "exit_table", None)
+    monkeypatch.setattr(trainer, "ENGINE_MODE", "fixed")
+    monkeypatch.setattr(lichess_openings_explorer, "get_book_move", lambda *args, **kwargs: None)
+    monkeypatch.setattr(lichess_openings_explorer, "current_book", lambda *args, **kwargs: None)
+
+    def play(script, submitter, engine=None, engines=None):
+        # a script per connection; a reconnect past the last one gets nothing, so no
+        # fresh gameFull comes to the rescue
+        streams = [connection() for connection in (script if isinstance(script, list) else [script])]
+        account = types.SimpleNamespace(name="bot", submitter=submitter, client=types.SimpleNamespace(
+            bots=types.SimpleNamespace(stream_game_state=lambda game_id: streams.pop(0) if streams else iter(()))))
+        if engine is None and engines is None:
+            engine = FirstMoveEngine()
+        thread = threading.Thread(target=trainer.play_game, args=("g1", BotProfile(), engine, account, engines),
+                                  daemon=True)
+        thread.start()
+        thread.join(10)
+        assert not thread.is_alive()
+
+    return play
+
+
+def test_failed_submit_is_resent_after_a_mid_submit_game_state(offline_game):
+    submitter = FakeSubmitter()
+    first = next(iter(chess.Board().legal_moves)).uci()
+
+    def script():
+        yield _full()
+        assert submitter.wait_for(1)
+        # a draw offer while our move is in flight: the board drops the optimistic move,
+        # and the move isn't played again since it is still pending
+        checks = submitter.checks
+        yield _state("", bdraw=True)
+        assert submitter.wait_for(1, checks=checks + 1)
+        submitter.submits[0][2].set_exception(RuntimeError("connection reset"))
+        assert submitter.wait_for(2)
+        submitter.submits[1][2].set_result("ok")
+        yield _state(first, status="resign", winner="white")
+
+    offline_game(script, submitter)
+    assert [(ply, uci) for ply, uci, _ in submitter.submits] == [(0, first), (0, first)]
+
+
+def test_repeated_submit_failures_are_retried_after_a_delay(offline_game, monkeypatch):
+    monkeypatch.setattr(trainer, "SUBMIT_RETRY_DELAY", 0.05)
+    submitter = FakeSubmitter(fail_at_once=True)
+
+    def script():
+        yield _full()
+        # two failures are re-played at once, the next attempt waits SUBMIT_RETRY_DELAY
+        assert submitter.wait_for(trainer.MAX_SUBMIT_FAILURES + 1)
+        yield _state("", status="outoftime", winner="black")
+
+    offline_game(script, submitter)
+    assert len(submitter.submits) >= trainer.MAX_SUBMIT_FAILURES + 1
+    assert {ply for ply, _, _ in submitter.submits} == {0}
+
+
+def _board(*moves):
+    board = chess.Board()
+    for uci in moves:
+        board.push_uci(uci)
+    return board
+
+
+@pytest.mark.parametrize("ours, stream, pushed", [
+    (["e2e4", "e7e5", "g1f3"], ["e2e4", "e7e5"], 0),  # our optimistic move isn't on the stream yet
+    (["e2e4"], ["e2e4", "e7e5", "g1f3"], 2),  # moves made while we were disconnected
+    (["e2e4", "e7e5", "g1f3"], ["e2e4", "c7c5"], 1),  # a takeback, then another reply
+    ([], [], 0),
+])
+def test_sync_board_keeps_the_common_prefix(ours, stream, pushed):
+    board = _board(*ours)
+    kept = board.move_stack[:len(stream)]
+    assert trainer.sync_board(board, stream) == pushed
+    assert [m.uci() for m in board.move_stack] == stream
+    assert board == _board(*stream)
+    # the common prefix is the same move objects, not a replay
+    common = next((i for i, (a, b) in enumerate(zip(ours, stream)) if a != b), min(len(ours), len(stream)))
+    assert all(a is b for a, b in zip(board.move_stack[:common], kept[:common]))
+
+
+def test_game_resumes_from_the_gamefull_after_a_reconnect(offline_game):
+    submitter = FakeSubmitter()
+    first = next(iter(chess.Board().legal_moves)).uci()
+    second = next(iter(_board(first, "e7e5").legal_moves)).uci()
+
+    def before_drop():
+        yield _full()
+        assert submitter.wait_for(1)
+        submitter.submits[0][2].set_result("ok")
+        raise ConnectionError("stream dropped")
+
+    def after_drop():
+        # the opponent replied while we were away: the resumed gameFull has both moves
+        yield _full(f"{first} e7e5")
+        assert submitter.wait_for(2)
+        submitter.submits[1][2].set_result("ok")
+        yield _state(f"{first} e7e5 {second}", status="resign", winner="white")
+
+    offline_game([before_drop, after_drop], submitter)
+    assert [(ply, uci) for ply, uci, _ in submitter.submits] == [(0, first), (2, second)]
+
+
+def test_game_stream_reconnects_with_jittered_backoff(monkeypatch):
+    class Done(BaseException):  # gets past the stream's own error handling
+        pass
+
+    # seven failed connections, one that delivers an event before it drops, then one more failure
+    outcomes = ["fail"] * 7 + ["event", "fail"]
+
+    def stream_game_state(game_id):
+        if not outcomes:
+            raise Done()
+        if outcomes.pop(0) == "event":
+            yield {"type": "gameState"}
+        raise ConnectionError("reset")
+
+    delays = []
+    monkeypatch.setattr(trainer.time, "sleep", delays.append)
+    monkeypatch.setattr(trainer, "random", random.Random(1))
+    account = types.SimpleNamespace(name="bot", client=types.SimpleNamespace(
+        bots=types.SimpleNamespace(stream_game_state=stream_game_state)))
+    reconnects = []
+    stream = trainer.robust_stream_game_state("g1", on_reconnect=lambda: reconnects.append(1), account=account)
+    with pytest.raises(Done):
+        for _ in stream:
+            pass
+
+    assert len(delays) == len(reconnects) == 9
+    # the first reconnect is immediate; then GAME_STREAM_BACKOFF doubling up to the cap, times 0.5-1.5
+    assert delays[0] == 0
+    for attempt, delay in enumerate(delays[1:7], start=1):
+        base = min(trainer.GAME_STREAM_BACKOFF * 2 ** (attempt - 1), trainer.GAME_STREAM_MAX_BACKOFF)
+        assert 0.5 * base <= delay <= 1.5 * base
+    assert len({round(d / min(trainer.GAME_STREAM_BACKOFF * 2 ** i, trainer.GAME_STREAM_MAX_BACKOFF), 6)
+                for i, d in enumerate(delays[1:7])}) > 1  # jittered, not a fixed schedule
+    # an event came through, so the backoff starts over: at once, then the shortest delay
+    assert delays[7] == 0
+    assert 0.5 * trainer.GAME_STREAM_BACKOFF <= delays[8] <= 1.5 * trainer.GAME_STREAM_BACKOFF
+
+
+def test_backoff_keeps_growing_when_each_connection_only_sends_its_gamefull(monkeypatch):
+    class Done(BaseException):
+        pass
+
+    connections = []
+
+    def stream_game_state(game_id):
+        if len(connections) == 6:
+            raise Done()
+        connections.append(1)
+        yield {"type": "gameFull"}
+        raise ConnectionError("reset")
+
+    delays = []
+    monkeypatch.setattr(trainer.time, "sleep", delays.append)
+    account = types.SimpleNamespace(name="bot", client=types.SimpleNamespace(
+        bots=types.SimpleNamespace(stream_game_state=stream_game_state)))
+    with pytest.raises(Done):
+        for _ in trainer.robust_stream_game_state("g1", account=account):
+            pass
+
+    assert len(delays) == 6 and delays[0] == 0
+    for attempt, delay in enumerate(delays[1:], start=1):
+        base = min(trainer.GAME_STREAM_BACKOFF * 2 ** (attempt - 1), trainer.GAME_STREAM_MAX_BACKOFF)
+        assert 0.5 * base <= delay <= 1.5 * base
+
+
+def _one_move_game(submitter):
+    def script():
+        yield _full()
+        assert submitter.wait_for(1)
+        ply, uci, future = submitter.submits[0]
+        future.set_result("ok")
+        yield _state(uci, status="resign", winner="white")
+    return script
+
+
+def test_book_moves_do_not_wait_for_a_shared_engine(offline_game, monkeypatch):
+    monkeypatch.setattr(lichess_openings_explorer, "get_book_move", lambda *args, **kwargs: "e2e4")
+    monkeypatch.setattr(trainer, "ENGINE_WAIT", 30)
+    pool = EnginePool(RANDOM_ENGINE, size=1)
+    submitter = FakeSubmitter()
+    try:
+        with pool.engine():  # every engine busy with other games
+            offline_game(_one_move_game(submitter), submitter, engines=pool)
+    finally:
+        pool.close()
+    assert [(ply, uci) for ply, uci, _ in submitter.submits] == [(0, "e2e4")]
+
+
+def test_engine_moves_borrow_from_the_pool_per_move(offline_game):
+    pool = EnginePool(RANDOM_ENGINE, size=1)
+    submitter = FakeSubmitter()
+    try:
+        offline_game(_one_move_game(submitter), submitter, engines=pool)
+        # returned after the move, ready for the next game
+        with pool.engine(timeout=1):
+            assert len(pool) == 1
+    finally:
+        pool.close()
+    assert chess.Move.from_uci(submitter.submits[0][1]) in chess.Board().legal_moves
+
+
+def test_a_busy_pool_falls_back_to_a_legal_move(offline_game, monkeypatch):
+    monkeypatch.setattr(trainer, "ENGINE_WAIT", 0.05)
+    pool = EnginePool(RANDOM_ENGINE, size=1)
+    submitter = FakeSubmitter()
+    try:
+        with pool.engine():
+            offline_game(_one_move_game(submitter), submitter, engines=pool)
+    finally:
+        pool.close()
+    assert chess.Move.from_uci(submitter.submits[0][1]) in chess.Board().legal_moves